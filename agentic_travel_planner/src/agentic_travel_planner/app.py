@@ -1,7 +1,28 @@
+import os
+import time
+import uuid
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import redis.asyncio as aioredis
 from pydantic import BaseModel, Field
+from celery import chain, group
 from celery.result import AsyncResult
-from .worker import generate_plan_task, celery_app
+from .worker import (
+    generate_plan_task, warm_batch_task, celery_app, plan_cache, redis_client, redis_url,
+    INTERACTIVE_QUEUE, INTERACTIVE_PRIORITY, BATCH_QUEUE, BATCH_PRIORITY,
+)
+from .progress import has_events, mark_queued, stream_events, to_sse
+from .plan_cache import fingerprint, cached_task_id, fingerprint_from_task_id
+from .model_router import policy_names
+from .telemetry import get_telemetry, inject_context, setup_telemetry, start_prometheus_server
+
+# Largest number of trips accepted by one POST /plan/batch.
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50"))
+
+# Progress streams read Redis on the event loop instead of holding a threadpool thread each.
+async_redis = aioredis.Redis.from_url(redis_url)
 
 app = FastAPI(
     title="Async Agentic Travel Planner",
@@ -9,6 +30,11 @@ app = FastAPI(
     version="2.0.0"
 )
 
+@app.on_event("startup")
+def start_telemetry():
+    setup_telemetry("atp-api")
+    start_prometheus_server()
+
 class TravelPlanRequest(BaseModel):
     source: str = Field(..., description="Origin city/region/country")
     destination: str = Field(..., description="Trip destination city/region/country")
@@ -20,31 +46,186 @@ class TravelPlanRequest(BaseModel):
     group_category: str = Field(..., description="Group type")
     currency: str = Field(..., description="Currency")
 
+class BatchPlanRequest(BaseModel):
+    requests: List[TravelPlanRequest] = Field(..., min_length=1, description="Trips to plan")
+
+def _check_model_policy(model_policy: Optional[str]) -> None:
+    if model_policy is not None and model_policy not in policy_names():
+        raise HTTPException(status_code=422, detail=f"Unknown model_policy; expected one of {policy_names()}.")
+
 @app.post("/plan")
-def submit_plan(request: TravelPlanRequest):
+def submit_plan(request: TravelPlanRequest, refresh: bool = False, model_policy: Optional[str] = None):
     """
     Submits a job to the Redis Queue and returns a Task ID immediately.
+    Identical requests are served from the plan cache, or coalesced onto the task
+    already generating them; pass ?refresh=true to force a new run (which also skips
+    the agent LLM cache). ?model_policy=<name> picks the model routing policy for a run
+    this request starts (config/model_routing.yaml).
     """
-    # Convert Pydantic model to a standard dictionary
-    inputs = request.model_dump()
-    
-    # .delay() is the Magic Command.
-    # It sends the data to Redis instead of running the function here.
-    # This takes ~0.1 seconds.
-    task = generate_plan_task.delay(inputs)
-    
+    _check_model_policy(model_policy)
+    telemetry = get_telemetry()
+    with telemetry.span("plan submit", refresh=refresh) as span:
+        # Convert Pydantic model to a standard dictionary
+        inputs = request.model_dump()
+        fp = fingerprint(inputs)
+
+        if not refresh:
+            cached = plan_cache.get_result(fp)
+            if cached is not None:
+                span.set_attribute("outcome", "cached")
+                telemetry.plan_requests.add(1, {"outcome": "cached"})
+                return {
+                    "status": "completed",
+                    "task_id": cached_task_id(fp),
+                    "plan": cached,
+                    "message": "Served from plan cache."
+                }
+
+        task_id = str(uuid.uuid4())
+        existing_task_id = plan_cache.claim_inflight(fp, task_id, force=refresh)
+        if existing_task_id:
+            span.set_attribute("outcome", "deduplicated")
+            telemetry.plan_requests.add(1, {"outcome": "deduplicated"})
+            return {
+                "status": "queued",
+                "task_id": existing_task_id,
+                "deduplicated": True,
+                "message": "An identical plan is already generating. Poll /plan/status/{task_id}"
+            }
+
+        mark_queued(redis_client, task_id)
+        # .apply_async() is the Magic Command.
+        # It sends the data to Redis instead of running the function here.
+        # This takes ~0.1 seconds.
+        # The headers carry the enqueue time (queue wait metric) and the trace context.
+        task = generate_plan_task.apply_async(
+            args=[inputs],
+            kwargs={"fingerprint": fp, "refresh": refresh, "model_policy": model_policy},
+            task_id=task_id,
+            queue=INTERACTIVE_QUEUE,
+            priority=INTERACTIVE_PRIORITY,
+            headers={"enqueued_at": time.time(), **inject_context()},
+        )
+        span.set_attribute("outcome", "queued")
+        telemetry.plan_requests.add(1, {"outcome": "queued"})
+
+        return {
+            "status": "queued",
+            "task_id": task.id,
+            "message": "Plan is generating in the background. Poll /plan/status/{task_id}"
+        }
+
+@app.post("/plan/batch")
+def submit_batch(batch: BatchPlanRequest, refresh: bool = False, model_policy: Optional[str] = None):
+    """
+    Submits many trips at once and returns a batch id; poll /plan/batch/{batch_id}.
+    Each member goes through the same cache/dedup path as /plan (identical members share
+    one task). The tasks that still need to run are fanned out as one Celery group, behind
+    a warm-up task that fetches their shared upstream data (geocodes, hotel lists,
+    flight legs) once into the shared response cache.
+    """
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=422, detail=f"A batch holds at most {BATCH_MAX_REQUESTS} requests.")
+    _check_model_policy(model_policy)
+
+    telemetry = get_telemetry()
+    with telemetry.span("plan submit batch", size=len(batch.requests), refresh=refresh) as span:
+        batch_id = str(uuid.uuid4())
+        members, to_run = [], {}  # to_run: fingerprint -> (task_id, inputs)
+        for index, request in enumerate(batch.requests):
+            inputs = request.model_dump()
+            fp = fingerprint(inputs)
+            if fp in to_run:
+                outcome, task_id = "deduplicated", to_run[fp][0]
+            elif not refresh and plan_cache.get_result(fp) is not None:
+                outcome, task_id = "cached", cached_task_id(fp)
+            else:
+                task_id = str(uuid.uuid4())
+                existing_task_id = plan_cache.claim_inflight(fp, task_id, force=refresh)
+                if existing_task_id:
+                    outcome, task_id = "deduplicated", existing_task_id
+                else:
+                    outcome = "queued"
+                    to_run[fp] = (task_id, inputs)
+                    mark_queued(redis_client, task_id)
+            telemetry.plan_requests.add(1, {"outcome": outcome})
+            members.append({"index": index, "task_id": task_id, "outcome": outcome})
+
+        if not plan_cache.set_batch(batch_id, members):
+            # Nothing was enqueued yet; free the claims so the trips can be resubmitted.
+            for fp, (task_id, _) in to_run.items():
+                plan_cache.release_inflight(fp, task_id)
+            raise HTTPException(status_code=503, detail="Could not record the batch; please retry.")
+        if to_run:
+            headers = {"enqueued_at": time.time(), **inject_context()}
+            plans = group(
+                generate_plan_task.si(inputs, fingerprint=fp, refresh=refresh, model_policy=model_policy).set(
+                    task_id=task_id, queue=BATCH_QUEUE, priority=BATCH_PRIORITY, headers=headers
+                )
+                for fp, (task_id, inputs) in to_run.items()
+            )
+            warm_up = warm_batch_task.si([inputs for _, inputs in to_run.values()]).set(
+                queue=BATCH_QUEUE, priority=BATCH_PRIORITY, headers=headers
+            )
+            chain(warm_up, plans).apply_async()
+        span.set_attribute("batch_id", batch_id)
+        span.set_attribute("queued", len(to_run))
+
+    # With nothing new to run, every member is cached or joined a running task.
+    status = "queued" if to_run else _member_states(members)[2]
     return {
-        "status": "queued",
-        "task_id": task.id,
-        "message": "Plan is generating in the background. Poll /plan/status/{task_id}"
+        "batch_id": batch_id,
+        "status": status,
+        "members": members,
+        "message": "Poll /plan/batch/{batch_id} for aggregate status and results."
     }
 
+@app.get("/plan/batch/{batch_id}")
+def get_batch_status(batch_id: str):
+    """
+    Aggregate status of a batch: counts per status plus each member's status and plan,
+    in submission order. The batch is 'completed' once no member is still running.
+    """
+    members = plan_cache.get_batch(batch_id)
+    if members is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired batch id.")
+
+    results, counts, status = _member_states(members)
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "counts": counts,
+        "results": results,
+    }
+
+def _member_states(members: list):
+    """Each member's status and plan, counts per status, and 'processing' while any still runs."""
+    results, counts = [], {}
+    for member in members:
+        try:
+            state = get_status(member["task_id"])
+        except HTTPException as e:
+            state = {"status": "failed", "error": e.detail}
+        counts[state["status"]] = counts.get(state["status"], 0) + 1
+        results.append({"index": member["index"], "task_id": member["task_id"], **state})
+
+    running = len(results) - counts.get("completed", 0) - counts.get("failed", 0)
+    return results, counts, "processing" if running else "completed"
+
 # --- 3. The Status Check Endpoint ---
 @app.get("/plan/status/{task_id}")
 def get_status(task_id: str):
     """
     Check the status of the background job using the Task ID.
     """
+    # Plans served from the cache have a synthetic task id
+    fp = fingerprint_from_task_id(task_id)
+    if fp:
+        cached = plan_cache.get_result(fp)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Cached plan expired; please resubmit.")
+        return {"status": "completed", "plan": cached}
+
     # Look up the task in Redis
     task_result = AsyncResult(task_id, app=celery_app)
 
@@ -65,4 +246,49 @@ def get_status(task_id: str):
         }
     
     # Catch-all for other states (STARTED, RETRY, etc.)
-    return {"status": task_result.state}
\ No newline at end of file
+    return {"status": task_result.state}
+
+# --- 4. The Progress Stream Endpoint ---
+@app.get("/plan/stream/{task_id}")
+async def stream_plan(task_id: str):
+    """
+    Server-Sent Events stream of a plan's progress: 'queued', 'started', one 'step' event
+    per finished crew step (with its structured output), then 'completed' or 'failed'.
+    Replaces polling /plan/status; late subscribers get the earlier events replayed.
+    When the event log is gone (expired), a finished task's outcome is sent directly and
+    an unknown task id is a 404.
+    """
+    fp = fingerprint_from_task_id(task_id)
+    if fp:
+        cached = await run_in_threadpool(plan_cache.get_result, fp)
+        if cached is None:
+            final = {"event": "failed", "task_id": task_id, "error": "Cached plan expired; please resubmit."}
+        else:
+            final = {"event": "completed", "task_id": task_id, "plan": cached}
+        return _sse_response(_single(final))
+
+    if not await has_events(async_redis, task_id):
+        task_result = AsyncResult(task_id, app=celery_app)
+        state = await run_in_threadpool(lambda: task_result.state)
+        if state == "SUCCESS":
+            return _sse_response(_single({"event": "completed", "task_id": task_id, "plan": task_result.result}))
+        if state == "FAILURE":
+            return _sse_response(_single({"event": "failed", "task_id": task_id, "error": str(task_result.result)}))
+        if state == "PENDING":
+            raise HTTPException(status_code=404, detail="Unknown or expired task id.")
+
+    async def events():
+        async for event in stream_events(async_redis, task_id):
+            yield to_sse(event)
+
+    return _sse_response(events())
+
+async def _single(event: dict):
+    yield to_sse(event)
+
+def _sse_response(body) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
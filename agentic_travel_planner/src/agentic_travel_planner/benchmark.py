@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+Offline benchmark for the full crew.
+
+    benchmark record                      # live run per trip, saves cassettes (needs API keys)
+    benchmark run --iterations 5          # replays cassettes, reports p50/p95 per task
+    benchmark run --latency-scale 1.0     # replay with the recorded upstream latencies
+    benchmark run --pipeline both         # hierarchical vs sequential, side by side
+
+Trips come from config/benchmark_trips.yaml; cassettes live in BENCHMARK_FIXTURES_DIR
+(default benchmarks/fixtures).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from agentic_travel_planner.stats import percentile
+
+TRIPS_PATH = Path(__file__).parent / "config" / "benchmark_trips.yaml"
+CREW_SCOPE = "(crew)"
+PIPELINES = ("hierarchical", "sequential")
+
+
+@dataclass
+class TaskMetrics:
+    wall_s: float = 0.0
+    tool_s: float = 0.0
+    tool_calls: int = 0
+    llm_s: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+@dataclass
+class RunMetrics:
+    trip_id: str
+    iteration: int
+    pipeline: str = "hierarchical"
+    wall_s: float = 0.0
+    crew_build_s: float = 0.0
+    ok: bool = True
+    error: Optional[str] = None
+    replay_misses: int = 0
+    tasks: Dict[str, TaskMetrics] = field(default_factory=dict)
+
+
+class _Collector:
+    """Attributes tool time (crewai tool events) and LLM time/tokens (offline hook) to the running task."""
+
+    def __init__(self, run: RunMetrics):
+        self.run = run
+        self.current = CREW_SCOPE
+        self._task_started: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _task(self, name: str) -> TaskMetrics:
+        return self.run.tasks.setdefault(name, TaskMetrics())
+
+    def task_started(self, source, event):
+        name = getattr(event.task, "name", None) or "task"
+        with self._lock:
+            self.current = name
+            self._task_started[name] = time.perf_counter()
+
+    def task_finished(self, source, event):
+        name = getattr(event.task, "name", None) or "task"
+        with self._lock:
+            started = self._task_started.pop(name, None)
+            if started is not None:
+                self._task(name).wall_s += time.perf_counter() - started
+            self.current = CREW_SCOPE
+
+    def tool_finished(self, source, event):
+        with self._lock:
+            metrics = self._task(self.current)
+            metrics.tool_calls += 1
+            metrics.tool_s += (event.finished_at - event.started_at).total_seconds()
+
+    def llm_call(self, elapsed: float, usage: Dict[str, int]):
+        with self._lock:
+            metrics = self._task(self.current)
+            metrics.llm_calls += 1
+            metrics.llm_s += elapsed
+            metrics.prompt_tokens += usage["prompt_tokens"]
+            metrics.completion_tokens += usage["completion_tokens"]
+
+
+def load_trips(path: Path = TRIPS_PATH, only: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        trips = yaml.safe_load(f)["trips"]
+    if only:
+        trips = [t for t in trips if t["id"] in only]
+    return trips
+
+
+def _prepare_environment(mode: str) -> None:
+    # Every run must make the same upstream calls: no shared Redis tier, no LLM cache, and a
+    # throwaway geocode store (emptied by run_once before each run) so recorded lookups are
+    # replayed, not skipped, and a user's real store is never touched.
+    os.environ["TOOL_CACHE_REDIS_URL"] = ""
+    os.environ["LLM_CACHE_BACKEND"] = "none"
+    # Cassettes are keyed by model: route every agent to its agents.yaml model, without hedged
+    # duplicates, unless a policy is chosen explicitly (record and replay with the same one).
+    os.environ.setdefault("PLANNER_MODEL_POLICY", "none")
+    os.environ["GEOCODE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="atp-bench-"), "geocodes.sqlite3")
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    # Suppresses crewai's interactive first-run trace prompt, which would stall unattended runs.
+    os.environ.setdefault("CREWAI_TESTING", "true")
+    if mode == "replay":
+        os.environ["LITELLM_LOCAL_MODEL_COST_MAP"] = "True"
+        # Agents and tools read keys at construction; any placeholder works offline.
+        for var in ("OPENAI_API_KEY", "RAPIDAPI_KEY", "GEOAPIFY_API_KEY", "SERPER_API_KEY"):
+            os.environ.setdefault(var, "offline")
+
+
+def cassette_path(fixtures: Path, trip_id: str, pipeline: str) -> Path:
+    """Hierarchical runs keep the original <id>.json; other pipelines make different LLM calls."""
+    suffix = "" if pipeline == "hierarchical" else f".{pipeline}"
+    return fixtures / f"{trip_id}{suffix}.json"
+
+
+def _planner(pipeline: str):
+    from agentic_travel_planner.crew import AgenticTravelPlanner
+
+    # Read when the planner first builds its crew template, hence a new planner per pipeline.
+    os.environ["PLANNER_PIPELINE_MODE"] = pipeline
+    return AgenticTravelPlanner()
+
+
+def run_once(planner, trip: Dict[str, Any], iteration: int, session) -> RunMetrics:
+    from crewai.events import crewai_event_bus
+    from crewai.events.types.task_events import TaskCompletedEvent, TaskFailedEvent, TaskStartedEvent
+    from crewai.events.types.tool_usage_events import ToolUsageFinishedEvent
+    from agentic_travel_planner.tools.geocode_store import get_geocode_store
+    from agentic_travel_planner.tools.response_cache import get_response_cache
+
+    inputs = {k: v for k, v in trip.items() if k != "id"}
+    run = RunMetrics(trip_id=trip["id"], iteration=iteration, pipeline=os.environ["PLANNER_PIPELINE_MODE"])
+    collector = _Collector(run)
+    get_response_cache().clear()
+    # Geocodes and Booking.com destination ids learned by the previous trip or iteration
+    # would otherwise turn this run's recorded lookups into local hits.
+    get_geocode_store().clear()
+    session.cassette.rewind()
+    session.on_llm_call = collector.llm_call
+
+    with crewai_event_bus.scoped_handlers():
+        crewai_event_bus.register_handler(TaskStartedEvent, collector.task_started)
+        crewai_event_bus.register_handler(TaskCompletedEvent, collector.task_finished)
+        crewai_event_bus.register_handler(TaskFailedEvent, collector.task_finished)
+        crewai_event_bus.register_handler(ToolUsageFinishedEvent, collector.tool_finished)
+
+        start = time.perf_counter()
+        crew_instance = planner.fresh_crew()
+        run.crew_build_s = time.perf_counter() - start
+        try:
+            crew_instance.kickoff(inputs=inputs)
+        except Exception as e:
+            run.ok = False
+            run.error = str(e)
+        run.wall_s = time.perf_counter() - start
+
+    run.replay_misses = len(session.misses)
+    session.misses.clear()
+    return run
+
+
+def record(trips: List[Dict[str, Any]], fixtures: Path, pipeline: str = "hierarchical") -> List[RunMetrics]:
+    from agentic_travel_planner.offline import recording
+
+    planner = _planner(pipeline)
+    runs = []
+    for trip in trips:
+        print(f"[Benchmark] Recording {trip['id']} ({pipeline})...")
+        with recording(cassette_path(fixtures, trip["id"], pipeline)) as session:
+            runs.append(run_once(planner, trip, 0, session))
+    return runs
+
+
+def replay(
+    trips: List[Dict[str, Any]], fixtures: Path, iterations: int, latency_scale: float, pipeline: str = "hierarchical"
+) -> List[RunMetrics]:
+    from agentic_travel_planner.offline import replaying
+
+    planner = _planner(pipeline)
+    runs = []
+    for trip in trips:
+        path = cassette_path(fixtures, trip["id"], pipeline)
+        if not path.exists():
+            print(f"[Benchmark] Skipping {trip['id']}: no cassette at {path} (run 'benchmark record' first)")
+            continue
+        with replaying(path, latency_scale) as session:
+            for i in range(iterations):
+                print(f"[Benchmark] Replaying {trip['id']} {pipeline} ({i + 1}/{iterations})...")
+                runs.append(run_once(planner, trip, i, session))
+    return runs
+
+
+def summarize(runs: List[RunMetrics]) -> Dict[str, Any]:
+    ok = [r for r in runs if r.ok]
+    total_wall = sum(r.wall_s for r in runs)
+    task_names = sorted({name for r in ok for name in r.tasks}, key=lambda n: (n == CREW_SCOPE, n))
+    tasks = {}
+    for name in task_names:
+        samples = [r.tasks[name] for r in ok if name in r.tasks]
+        walls = [t.wall_s for t in samples]
+        tasks[name] = {
+            "wall_p50_s": round(percentile(walls, 50), 3),
+            "wall_p95_s": round(percentile(walls, 95), 3),
+            "tool_mean_s": round(sum(t.tool_s for t in samples) / len(samples), 3),
+            "llm_mean_s": round(sum(t.llm_s for t in samples) / len(samples), 3),
+            "llm_calls_mean": round(sum(t.llm_calls for t in samples) / len(samples), 1),
+            "prompt_tokens_mean": round(sum(t.prompt_tokens for t in samples) / len(samples)),
+            "completion_tokens_mean": round(sum(t.completion_tokens for t in samples) / len(samples)),
+        }
+    walls = [r.wall_s for r in ok]
+    per_plan = [list(r.tasks.values()) for r in ok]
+    return {
+        "runs": len(runs),
+        "failed": len(runs) - len(ok),
+        "replay_misses": sum(r.replay_misses for r in runs),
+        "wall_p50_s": round(percentile(walls, 50), 3),
+        "wall_p95_s": round(percentile(walls, 95), 3),
+        "crew_build_p50_ms": round(percentile([r.crew_build_s * 1000 for r in ok], 50), 1),
+        "throughput_plans_per_min": round(len(ok) / total_wall * 60, 2) if total_wall else 0.0,
+        "llm_calls_per_plan": round(_mean([sum(t.llm_calls for t in p) for p in per_plan]), 1),
+        "prompt_tokens_per_plan": round(_mean([sum(t.prompt_tokens for t in p) for p in per_plan])),
+        "completion_tokens_per_plan": round(_mean([sum(t.completion_tokens for t in p) for p in per_plan])),
+        "llm_s_per_plan": round(_mean([sum(t.llm_s for t in p) for p in per_plan]), 3),
+        "tasks": tasks,
+    }
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+COMPARED = (
+    ("llm_calls_per_plan", "LLM calls / plan"),
+    ("prompt_tokens_per_plan", "prompt tokens / plan"),
+    ("completion_tokens_per_plan", "completion tokens / plan"),
+    ("llm_s_per_plan", "LLM s / plan"),
+    ("wall_p50_s", "wall p50 s"),
+    ("wall_p95_s", "wall p95 s"),
+    ("failed", "failed runs"),
+)
+
+
+def compare(summaries: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-plan cost of each pipeline on the same trips; the delta is sequential minus hierarchical."""
+    rows = {}
+    for key, _ in COMPARED:
+        row = {pipeline: summary[key] for pipeline, summary in summaries.items()}
+        if len(row) == 2:
+            row["delta"] = round(row["sequential"] - row["hierarchical"], 3)
+        rows[key] = row
+    return rows
+
+
+def print_comparison(rows: Dict[str, Dict[str, float]]) -> None:
+    print("\n=== PIPELINE COMPARISON ===")
+    header = f"{'metric':<28}{'hierarchical':>14}{'sequential':>14}{'delta':>12}"
+    print(header)
+    print("-" * len(header))
+    for key, label in COMPARED:
+        row = rows[key]
+        cells = [row.get(name, "-") for name in ("hierarchical", "sequential", "delta")]
+        print(f"{label:<28}{cells[0]:>14}{cells[1]:>14}{cells[2]:>12}")
+
+
+def print_report(summary: Dict[str, Any]) -> None:
+    print("\n=== BENCHMARK ===")
+    print(
+        f"runs={summary['runs']} failed={summary['failed']} replay_misses={summary['replay_misses']} "
+        f"wall p50={summary['wall_p50_s']}s p95={summary['wall_p95_s']}s "
+        f"crew build p50={summary['crew_build_p50_ms']}ms "
+        f"throughput={summary['throughput_plans_per_min']} plans/min "
+        f"llm calls/plan={summary['llm_calls_per_plan']}"
+    )
+    header = f"{'task':<26}{'p50 s':>8}{'p95 s':>8}{'tool s':>8}{'llm s':>8}{'calls':>7}{'prompt tok':>12}{'compl tok':>11}"
+    print(header)
+    print("-" * len(header))
+    for name, t in summary["tasks"].items():
+        print(
+            f"{name:<26}{t['wall_p50_s']:>8}{t['wall_p95_s']:>8}{t['tool_mean_s']:>8}{t['llm_mean_s']:>8}"
+            f"{t['llm_calls_mean']:>7}{t['prompt_tokens_mean']:>12}{t['completion_tokens_mean']:>11}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay full crew runs for benchmarking.")
+    parser.add_argument("mode", choices=["record", "run"])
+    parser.add_argument("--trips", nargs="*", help="Trip ids from benchmark_trips.yaml (default: all)")
+    parser.add_argument("--fixtures", type=Path, help="Cassette directory (default: BENCHMARK_FIXTURES_DIR)")
+    parser.add_argument("--iterations", type=int, default=3, help="Replays per trip")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="Multiplier on recorded upstream latency")
+    parser.add_argument(
+        "--pipeline", choices=[*PIPELINES, "both"], default="hierarchical",
+        help="Crew process to run (PLANNER_PIPELINE_MODE); 'both' adds a side-by-side comparison",
+    )
+    parser.add_argument("--json", type=Path, help="Also write raw runs and the summary to this file")
+    args = parser.parse_args()
+
+    _prepare_environment("record" if args.mode == "record" else "replay")
+    from agentic_travel_planner.offline import fixtures_dir
+
+    fixtures = args.fixtures or fixtures_dir()
+    trips = load_trips(only=args.trips)
+    pipelines = PIPELINES if args.pipeline == "both" else (args.pipeline,)
+    runs, summaries = [], {}
+    for pipeline in pipelines:
+        if args.mode == "record":
+            pipeline_runs = record(trips, fixtures, pipeline)
+        else:
+            pipeline_runs = replay(trips, fixtures, args.iterations, args.latency_scale, pipeline)
+        if pipeline_runs:
+            print(f"\n[Benchmark] Pipeline: {pipeline}")
+            summaries[pipeline] = summarize(pipeline_runs)
+            print_report(summaries[pipeline])
+            runs += pipeline_runs
+    if not runs:
+        sys.exit("No runs completed.")
+
+    report: Dict[str, Any] = {"summary": summaries[pipelines[0]] if len(pipelines) == 1 else summaries}
+    if len(summaries) > 1:
+        report["comparison"] = compare(summaries)
+        print_comparison(report["comparison"])
+    from agentic_travel_planner.model_router import get_model_router
+    report["routing"] = get_model_router().stats()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({**report, "runs": [asdict(r) for r in runs]}, f, indent=2)
+        print(f"[Benchmark] Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+from agentic_travel_planner.crew import GroupCategory, InitialPlanningTaskOutput
+from agentic_travel_planner.tools.airport_index import get_airport_index
+from agentic_travel_planner.tools.geocode_store import normalize_text
+
+RULES_PATH = Path(__file__).parent / "config" / "budget_rules.yaml"
+
+Ratios = Tuple[float, float, float]
+
+
+def allocation_mode() -> str:
+    """'rules' (default) computes the initial plan in Python, 'llm' keeps the Budgeting_Agent task."""
+    return os.getenv("PLANNER_ALLOCATION_MODE", "rules").strip().lower()
+
+
+def load_rules(path: Path = RULES_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def parse_group_category(value: Any) -> GroupCategory:
+    """Match a free-text group label ('Boys only', 'Couple', 'girls_only') to GroupCategory."""
+    if isinstance(value, GroupCategory):
+        return value
+    text = str(value or "").strip().lower()
+    for category in GroupCategory:
+        if text in (category.value.lower(), category.name.lower(), category.name.replace("_", " ")):
+            return category
+    return GroupCategory.other
+
+
+def parse_interests(value: Any) -> list:
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [part.strip() for part in str(value or "").split(",") if part.strip()]
+
+
+def _country(place: str) -> Optional[str]:
+    """
+    Normalized country of a place: its airport's country from the local airport index
+    ("Delhi", "Paris", "BOM"), else a trailing ', Country' part naming a known country.
+    """
+    index = get_airport_index()
+    airport = index.lookup(str(place or ""))
+    if airport is not None:
+        return normalize_text(airport.country)
+    parts = [normalize_text(p) for p in str(place or "").split(",") if normalize_text(p)]
+    return index.country_named(parts[-1]) if len(parts) > 1 else None
+
+
+def is_international(source: str, destination: str) -> bool:
+    """True when the countries of both places are known and differ."""
+    src, dst = _country(source), _country(destination)
+    return bool(src and dst and src != dst)
+
+
+def compute_ratios(
+    group: GroupCategory,
+    nights: int,
+    international: bool,
+    rules: Dict[str, Any],
+) -> Ratios:
+    base = rules["group_ratios"].get(group.name) or rules["group_ratios"]["other"]
+    flight, hotel, activity = float(base["flight"]), float(base["hotel"]), float(base["activity"])
+
+    length = rules.get("trip_length", {})
+    extra_nights = max(0, nights - int(length.get("base_nights", 3)))
+    shift = min(
+        extra_nights * float(length.get("hotel_shift_per_extra_night", 0.0)),
+        float(length.get("max_hotel_shift", 0.0)),
+        flight,
+    )
+    flight, hotel = flight - shift, hotel + shift
+
+    if international:
+        shift = float(rules.get("international", {}).get("flight_shift", 0.0))
+        rest = hotel + activity
+        if rest > 0:
+            shift = min(shift, rest)
+            hotel -= shift * hotel / rest
+            activity -= shift * activity / rest
+            flight += shift
+
+    total = flight + hotel + activity
+    return flight / total, hotel / total, activity / total
+
+
+def allocate_budget(inputs: Dict[str, Any], rules: Optional[Dict[str, Any]] = None) -> InitialPlanningTaskOutput:
+    """
+    Deterministic replacement for i_planning_task: echo the request fields and split
+    the budget by group category, trip length and domestic/international ratios.
+    Amounts are rounded to cents and always sum exactly to the total budget.
+    """
+    rules = rules or load_rules()
+    start = date.fromisoformat(str(inputs["start_date"]))
+    end = date.fromisoformat(str(inputs["end_date"]))
+    budget = float(inputs["budget"])
+    group = parse_group_category(inputs.get("group_category"))
+
+    flight_r, hotel_r, _ = compute_ratios(
+        group,
+        nights=max(0, (end - start).days),
+        international=is_international(inputs.get("source", ""), inputs.get("destination", "")),
+        rules=rules,
+    )
+    flight_budget = round(budget * flight_r, 2)
+    hotel_budget = round(budget * hotel_r, 2)
+    activity_budget = round(budget - flight_budget - hotel_budget, 2)
+
+    return InitialPlanningTaskOutput(
+        source=inputs["source"],
+        destination=inputs["destination"],
+        start_date=start,
+        end_date=end,
+        num_travelers=int(inputs["num_travelers"]),
+        interests=parse_interests(inputs.get("interests")),
+        budget=budget,
+        group_category=group,
+        allocated_flight_budget=flight_budget,
+        allocated_hotel_budget=hotel_budget,
+        allocated_activity_budget=activity_budget,
+    )
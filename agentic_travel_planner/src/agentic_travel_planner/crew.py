@@ -2,17 +2,41 @@
 from __future__ import annotations
 from crewai import Agent, Crew, Process, Task
 from enum import Enum
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, agent, crew, task, before_kickoff, after_kickoff
+from crewai.crews.crew_output import CrewOutput
+from crewai.tasks.conditional_task import ConditionalTask
+from crewai.tasks.task_output import TaskOutput
+from crewai.tasks.output_format import OutputFormat
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from pydantic import BaseModel, Field, PositiveFloat, PositiveInt, root_validator, validator, conlist, model_validator
 from agentic_travel_planner.tools import FlightSearchTool, ActivitySearchTool, HotelSearchTool
+from agentic_travel_planner.telemetry import get_telemetry
+from agentic_travel_planner.tools.background import submit_background
+from agentic_travel_planner.tools.geocode_store import geocode_text
+from agentic_travel_planner.tools.airport_index import resolve_airport
+from agentic_travel_planner.llm_cache import install_llm_cache
+from agentic_travel_planner.model_router import routed_llm
 from crewai_tools import SerperDevTool
 from datetime import date, datetime
 from typing import List, Optional, Union, Literal, Dict
 
+import os
 import re
 
 _SAFE = re.compile(r"^[A-Za-z0-9_-]+$")
+_IATA = re.compile(r"^[A-Za-z]{3}$")
+
+# Specialist steps of the sequential pipeline and the output field holding their results;
+# an error string (or nothing) there means the step failed and the manager is called in.
+PIPELINE_STEPS = {
+    "flight_research_task": "flights",
+    "hotel_research_task": "hotels",
+    "activity_planning_task": "activities",
+}
+
+def pipeline_mode() -> str:
+    """'hierarchical' (default) routes every step through the manager, 'sequential' runs the task DAG directly."""
+    return os.getenv("PLANNER_PIPELINE_MODE", "hierarchical").strip().lower()
 
 def assert_tool_names_safe(agents):
     offenders = []
@@ -380,7 +404,7 @@ class DayPlan(BaseModel):
 
 class AssemblyFailure(BaseModel):
     """If any specialist step failed and could not be resolved."""
-    component: Literal["flights", "hotel", "activities"] = Field(..., description="Which component failed")
+    component: Literal["flights", "hotel", "activities", "dates"] = Field(..., description="Which component failed")
     reason: str = Field(..., description="Why assembly failed")
     tool_error: Optional[str] = Field(None, description="Original error message from tool if available")
 
@@ -493,6 +517,7 @@ class AgenticTravelPlanner():
     def Flight_Researcher(self) -> Agent:
         return Agent(
             config=self.agents_config['Flight_Researcher'], 
+            llm=routed_llm('Flight_Researcher', self.agents_config['Flight_Researcher']),
             tools=[FlightSearchTool()],
             verbose=True
         )
@@ -501,6 +526,7 @@ class AgenticTravelPlanner():
     def Hotel_Researcher(self) -> Agent:
         return Agent(
             config=self.agents_config['Hotel_Researcher'], 
+            llm=routed_llm('Hotel_Researcher', self.agents_config['Hotel_Researcher']),
             tools=[HotelSearchTool()],
             verbose=True
         )
@@ -509,6 +535,7 @@ class AgenticTravelPlanner():
     def Activity_Booker(self) -> Agent:
         return Agent(
             config=self.agents_config['Activity_Booker'], 
+            llm=routed_llm('Activity_Booker', self.agents_config['Activity_Booker']),
             tools=[ActivitySearchTool(), SerperDevTool()],
             verbose=True
         )
@@ -517,6 +544,7 @@ class AgenticTravelPlanner():
     def Budgeting_Agent(self) -> Agent:
         return Agent(
             config=self.agents_config['Budgeting_Agent'], 
+            llm=routed_llm('Budgeting_Agent', self.agents_config['Budgeting_Agent']),
             verbose=True
         )
     
@@ -524,6 +552,7 @@ class AgenticTravelPlanner():
     def Manager_and_Itinerary_Planner(self) -> Agent:
         return Agent(
             config=self.agents_config['Manager_and_Itinerary_Planner'],
+            llm=routed_llm('Manager_and_Itinerary_Planner', self.agents_config['Manager_and_Itinerary_Planner']),
             allow_delegation=True,
             verbose=True
         )
@@ -564,15 +593,261 @@ class AgenticTravelPlanner():
             output_pydantic = FinalItineraryOutput,
         )
 
+    @before_kickoff
+    def inject_initial_plan(self, inputs):
+        """
+        In 'rules' allocation mode the initial plan is computed in Python and set as the
+        i_planning_task output, so downstream tasks still receive it as context.
+        """
+        return self._inject_plan_into(self.i_planning_task(), inputs)
+
+    def _inject_plan_into(self, planning_task: Task, inputs):
+        # Imported here: budget_allocator imports the models defined in this module.
+        from agentic_travel_planner.budget_allocator import allocate_budget, allocation_mode
+
+        if allocation_mode() == "llm":
+            return inputs
+        with get_telemetry().span("task i_planning_task", task="i_planning_task", mode="rules"):
+            plan = allocate_budget(inputs)
+        planning_task.output = TaskOutput(
+            description="Rule-based budget allocation",
+            name="i_planning_task",
+            raw=plan.model_dump_json(),
+            pydantic=plan,
+            agent="Budgeting_Agent",
+            output_format=OutputFormat.PYDANTIC,
+        )
+        return inputs
+
+    @after_kickoff
+    def assemble_final_itinerary(self, result: CrewOutput) -> CrewOutput:
+        """
+        In 'rules' assembly mode final_assembly_task is not run: the itinerary and its budget
+        audit are built in Python from the step outputs and become the crew's result.
+        """
+        steps = [self.i_planning_task(), self.flight_research_task(), self.hotel_research_task(), self.activity_planning_task()]
+        return self._assemble_from({t.name: t for t in steps}, result)
+
+    def _assemble_from(self, steps: Dict[str, Task], result: CrewOutput, task_callback=None) -> CrewOutput:
+        # Imported here: itinerary_assembler imports the models defined in this module.
+        from agentic_travel_planner.itinerary_assembler import assemble_itinerary, assembly_mode
+
+        if assembly_mode() == "llm":
+            return result
+        plan = steps["i_planning_task"].output
+        if plan is None or plan.pydantic is None:
+            print("[Crew] No initial plan output; returning the crew result unassembled")
+            return result
+        with get_telemetry().span("task final_assembly_task", task="final_assembly_task", mode="rules"):
+            itinerary = assemble_itinerary(plan.pydantic, *(steps[name].output for name in PIPELINE_STEPS))
+        output = TaskOutput(
+            description="Deterministic itinerary assembly",
+            name="final_assembly_task",
+            raw=itinerary.model_dump_json(),
+            pydantic=itinerary,
+            agent="Budgeting_Agent",
+            output_format=OutputFormat.PYDANTIC,
+        )
+        if task_callback is not None:
+            task_callback(output)
+        return CrewOutput(
+            raw=output.raw,
+            pydantic=itinerary,
+            tasks_output=[*result.tasks_output, output],
+            token_usage=result.token_usage,
+        )
+
+    @before_kickoff
+    def resolve_airports(self, inputs):
+        """Add source_airport / destination_airport (IATA) so the flight agent does not guess codes."""
+        return resolve_trip_airports(inputs)
+
+    @before_kickoff
+    def start_prefetch(self, inputs):
+        """
+        Start the upstream searches that do not depend on earlier crew steps:
+        the destination geocode, the hotel candidate list (budget filtering happens later,
+        in the tool) and, once the route is resolved to airports, both flight legs. Results
+        land in the tools' response cache, so the agents' own tool calls become cache hits.
+        """
+        prefetch_upstream(inputs)
+        return inputs
+
     @crew
     def crew(self) -> Crew:
         """Creates the AgenticTravelPlanner crew"""
+        from agentic_travel_planner.budget_allocator import allocation_mode
+        from agentic_travel_planner.itinerary_assembler import assembly_mode
+
+        install_llm_cache()
         manager = self.Manager_and_Itinerary_Planner()
         agents_wo_manager = [a for a in self.agents if a.id != manager.id]
+        tasks = self.tasks
+        if allocation_mode() != "llm":
+            # Skip the LLM allocation round-trip; its output is injected before kickoff.
+            planning_task = self.i_planning_task()
+            tasks = [t for t in tasks if t is not planning_task]
+        if assembly_mode() != "llm":
+            # Assembled in Python after kickoff (assemble_final_itinerary).
+            assembly_task = self.final_assembly_task()
+            tasks = [t for t in tasks if t is not assembly_task]
+        if pipeline_mode() == "sequential":
+            return Crew(
+                agents=self.agents,
+                tasks=self._sequential_tasks(tasks, manager),
+                process=Process.sequential,
+                verbose=False,
+            )
         return Crew(
             agents=agents_wo_manager, 
-            tasks=self.tasks, 
+            tasks=tasks, 
             process=Process.hierarchical, 
             verbose=False,
             manager_agent=manager, 
-        )
\ No newline at end of file
+        )
+
+    def _sequential_tasks(self, tasks: List[Task], manager: Agent) -> List[Task]:
+        """
+        The fixed DAG (planning -> flights -> hotels -> activities -> assembly) run in order by
+        the task owners. Each specialist step is followed by a recovery task for the manager
+        that only runs when the step reports a failure.
+        """
+        recovery = self.tasks_config['step_recovery_task']
+        pipeline = []
+        for t in tasks:
+            t.callback = typed_handoff
+            pipeline.append(t)
+            if t.name not in PIPELINE_STEPS:
+                continue
+            step_recovery = ConditionalTask(
+                name=f"{t.name}_recovery",
+                description=f"{recovery['description']}\nFailed step: {t.name} (owned by {t.agent.role}).",
+                expected_output=recovery['expected_output'],
+                agent=manager,
+                context=[self.i_planning_task(), t],
+                output_pydantic=t.output_pydantic,
+                condition=step_failed,
+            )
+            link_recovery(step_recovery)
+            pipeline.append(step_recovery)
+        return pipeline
+
+    def fresh_crew(self) -> Crew:
+        """
+        Per-run crew that reuses this instance's already-built agents, tools and LLM clients.
+        Agents and tasks are cloned (as Crew.copy does), so no state leaks between runs;
+        unlike Crew.copy this also clones context-only tasks such as the injected initial plan.
+        """
+        template = self.crew()
+        agents = [a.copy() for a in template.agents]
+        manager = template.manager_agent.copy() if template.manager_agent else None
+
+        task_mapping: Dict[str, Task] = {}
+        planning_task = self.i_planning_task()
+        if all(t is not planning_task for t in template.tasks):
+            task_mapping[planning_task.key] = planning_task.copy(agents, task_mapping)
+        tasks = []
+        for t in template.tasks:
+            cloned = t.copy(agents, task_mapping)
+            task_mapping[t.key] = cloned
+            tasks.append(cloned)
+
+        for t in tasks:
+            if isinstance(t, ConditionalTask):
+                link_recovery(t)
+
+        run_crew = Crew(
+            agents=agents,
+            tasks=tasks,
+            process=template.process,
+            verbose=template.verbose,
+            manager_agent=manager,
+        )
+        cloned_planning = task_mapping[planning_task.key]
+        run_crew.before_kickoff_callbacks.extend([
+            lambda inputs: self._inject_plan_into(cloned_planning, inputs),
+            self.resolve_airports,
+            self.start_prefetch,
+        ])
+        steps = {t.name: t for t in task_mapping.values()}
+        run_crew.after_kickoff_callbacks.append(
+            lambda result: self._assemble_from(steps, result, run_crew.task_callback)
+        )
+        return run_crew
+
+
+def resolve_trip_airports(inputs: dict) -> dict:
+    """
+    Resolve the trip's source and destination to airports from the local index (or the
+    nearest airport to their geocode) before the crew starts. Unresolved places get a
+    note asking the agent for the code instead.
+    """
+    geoapify_key = os.getenv("GEOAPIFY_KEY") or os.getenv("GEOAPIFY_API_KEY")
+    for field in ("source", "destination"):
+        if inputs.get(f"{field}_airport"):
+            continue
+        text = str(inputs.get(field, "")).strip()
+        airport = resolve_airport(text, geoapify_key)
+        inputs[f"{field}_airport"] = airport.iata if airport else f"not resolved; use the IATA code of the airport serving {text}"
+    return inputs
+
+
+def prefetch_upstream(inputs: dict) -> list:
+    """
+    Submit the request-independent upstream fetches for one trip (destination geocode,
+    hotel candidates, and both flight legs once resolved to airports) to the prefetch pool.
+    Returns their futures; results land in the tools' response cache.
+    """
+    inputs = resolve_trip_airports(dict(inputs))
+    source = str(inputs.get("source_airport", "")).strip()
+    destination = str(inputs.get("destination", "")).strip()
+    start_date, end_date = inputs.get("start_date"), inputs.get("end_date")
+    num_travelers = int(inputs.get("num_travelers") or 1)
+
+    futures = [
+        submit_background(geocode_text, destination, os.getenv("GEOAPIFY_KEY") or os.getenv("GEOAPIFY_API_KEY"),
+                          label=f"geocode {destination}"),
+        HotelSearchTool().prefetch(
+            destination, start_date, end_date, num_travelers, inputs.get("currency") or "USD"
+        ),
+    ]
+    destination_airport = str(inputs.get("destination_airport", "")).strip()
+    if _IATA.match(source) and _IATA.match(destination_airport):
+        futures += FlightSearchTool().prefetch(source, destination_airport, start_date, end_date, num_travelers)
+    return [f for f in futures if f is not None]
+
+
+def step_failed(output: TaskOutput) -> bool:
+    """True when a specialist step's output did not validate or carries an error instead of results."""
+    if output.pydantic is None:
+        return True
+    results = getattr(output.pydantic, PIPELINE_STEPS.get(output.name, ""), None)
+    return isinstance(results, str) or not results
+
+
+def typed_handoff(output: TaskOutput) -> None:
+    """Hand the next step the validated model as canonical JSON instead of the agent's free text."""
+    if output.pydantic is not None:
+        output.raw = output.pydantic.model_dump_json()
+
+
+def link_recovery(recovery: Task) -> None:
+    """A recovery result replaces the failed step's output, so downstream context reads the fix."""
+    step = recovery.context[-1]
+
+    def promote(output: TaskOutput) -> None:
+        typed_handoff(output)
+        step.output = output
+
+    recovery.callback = promote
+
+
+def find_task(crew_instance: Crew, name: str) -> Optional[Task]:
+    """Find a task by name, including context-only tasks (e.g. the injected i_planning_task)."""
+    for t in crew_instance.tasks:
+        if t.name == name:
+            return t
+        for ctx in (t.context if isinstance(t.context, list) else []):
+            if ctx.name == name:
+                return ctx
+    return None
@@ -0,0 +1,81 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Door-to-door city average (traffic, stops); straight-line km are scaled by DETOUR_FACTOR.
+CITY_SPEED_KMH = 22.0
+DETOUR_FACTOR = 1.3
+
+
+def haversine_matrix(
+    lat_a: Sequence[float],
+    lon_a: Sequence[float],
+    lat_b: Optional[Sequence[float]] = None,
+    lon_b: Optional[Sequence[float]] = None,
+) -> np.ndarray:
+    """
+    Great-circle distances (km) between every point in A and every point in B, in one
+    vectorized pass. With B omitted, returns the symmetric A x A matrix.
+    """
+    lat1 = np.radians(np.asarray(lat_a, dtype=float))[:, None]
+    lon1 = np.radians(np.asarray(lon_a, dtype=float))[:, None]
+    if lat_b is None:
+        lat2, lon2 = lat1.T, lon1.T
+    else:
+        lat2 = np.radians(np.asarray(lat_b, dtype=float))[None, :]
+        lon2 = np.radians(np.asarray(lon_b, dtype=float))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def travel_minutes(km: np.ndarray, speed_kmh: float = CITY_SPEED_KMH) -> np.ndarray:
+    """Estimated door-to-door minutes for straight-line distances."""
+    return np.ceil(np.asarray(km) * DETOUR_FACTOR / speed_kmh * 60.0)
+
+
+def mean_nearest_km(dist: np.ndarray, k: int) -> np.ndarray:
+    """Per row, the mean of its k smallest distances (every column if there are fewer)."""
+    k = max(1, min(k, dist.shape[1]))
+    return np.partition(dist, k - 1, axis=1)[:, :k].mean(axis=1)
+
+
+def route_length(order: Sequence[int], dist: np.ndarray, start: int) -> float:
+    """Length of start -> order... -> start over a distance matrix."""
+    path = [start, *order, start]
+    return float(sum(dist[path[i], path[i + 1]] for i in range(len(path) - 1)))
+
+
+def nearest_neighbor_route(dist: np.ndarray, start: int, stops: Sequence[int]) -> List[int]:
+    """Greedy tour from start over stops (indices into dist)."""
+    remaining = list(stops)
+    route, current = [], start
+    while remaining:
+        nxt = min(remaining, key=lambda j: dist[current, j])
+        route.append(nxt)
+        remaining.remove(nxt)
+        current = nxt
+    return route
+
+
+def two_opt(route: List[int], dist: np.ndarray, start: int, max_passes: int = 20) -> List[int]:
+    """Improve a closed tour (start -> route -> start) by reversing segments while it shortens."""
+    path = [start, *route, start]
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(path) - 2):
+            for j in range(i + 1, len(path) - 1):
+                delta = (
+                    dist[path[i - 1], path[j]] + dist[path[i], path[j + 1]]
+                    - dist[path[i - 1], path[i]] - dist[path[j], path[j + 1]]
+                )
+                if delta < -1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return path[1:-1]
+
+
+def shortest_route(dist: np.ndarray, start: int, stops: Sequence[int]) -> List[int]:
+    return two_opt(nearest_neighbor_route(dist, start, stops), dist, start)
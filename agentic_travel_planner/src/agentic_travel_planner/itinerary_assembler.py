@@ -0,0 +1,208 @@
+import os
+import json
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from crewai.tasks.task_output import TaskOutput
+from pydantic import BaseModel, ValidationError
+
+from agentic_travel_planner.crew import (
+    ActivitySummary,
+    AssemblyFailure,
+    DayPlan,
+    FinalItineraryOutput,
+    FlightSummary,
+    HotelSummary,
+    InitialPlanningTaskOutput,
+)
+
+CENT = Decimal("0.01")
+# Model for the optional day-notes narrative, written in one batched call per plan.
+# Empty (default) keeps the deterministic notes and makes no LLM call at all.
+NOTES_MODEL = os.getenv("ASSEMBLY_NOTES_MODEL", "")
+
+
+def assembly_mode() -> str:
+    """'rules' (default) assembles the final itinerary in Python, 'llm' keeps final_assembly_task."""
+    return os.getenv("PLANNER_ASSEMBLY_MODE", "rules").strip().lower()
+
+
+def money(value: Any) -> Decimal:
+    """Exact amount in cents; floats go through str so 0.1 stays 0.1."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _results(output: Optional[TaskOutput], field: str) -> Tuple[Optional[list], Optional[str]]:
+    """(results, None) for a usable step output, else (None, the step's error)."""
+    if output is None:
+        return None, "step did not run"
+    if output.pydantic is None:
+        return None, (output.raw or "output did not match its model")[:500]
+    value = getattr(output.pydantic, field, None)
+    if isinstance(value, str):
+        return None, value
+    if not value:
+        return None, f"no {field} returned"
+    return list(value), None
+
+
+def _pick(
+    output: Optional[TaskOutput],
+    field: str,
+    component: str,
+    summary: type,
+    failures: List[AssemblyFailure],
+) -> Optional[List[BaseModel]]:
+    """Summaries of a step's results (first = the agent's choice); a failure is recorded instead."""
+    items, error = _results(output, field)
+    if items is None:
+        failures.append(AssemblyFailure(component=component, reason=f"No usable {field}", tool_error=error))
+        return None
+    try:
+        return [summary.model_validate(item.model_dump()) for item in items]
+    except ValidationError as e:
+        failures.append(AssemblyFailure(component=component, reason=f"Invalid {field} fields", tool_error=str(e)[:500]))
+        return None
+
+
+def _naive(value: datetime) -> datetime:
+    return value.replace(tzinfo=None)
+
+
+def _flight_label(airline: str, number: str) -> str:
+    return number if number and number not in ("Unknown", "N/A") else airline
+
+
+def build_days(
+    start: date,
+    end: date,
+    activities: List[ActivitySummary],
+    flight: Optional[FlightSummary] = None,
+) -> List[DayPlan]:
+    """
+    One DayPlan per trip date. Scheduled activities go to their date (clamped to the trip),
+    unscheduled ones to the lightest day (travel days last); flight times become the day notes.
+    Raises ValueError if end is before start.
+    """
+    if end < start:
+        raise ValueError(f"Trip ends ({end}) before it starts ({start})")
+    dates = [start + timedelta(days=d) for d in range((end - start).days + 1)]
+    by_day: Dict[date, List[ActivitySummary]] = {d: [] for d in dates}
+    unscheduled = []
+    for activity in activities:
+        if activity.scheduled_time is None:
+            unscheduled.append(activity)
+        else:
+            by_day[min(max(activity.scheduled_time.date(), start), end)].append(activity)
+    for activity in unscheduled:
+        by_day[min(dates, key=lambda d: (len(by_day[d]), d in (start, end)))].append(activity)
+
+    days = []
+    for d in dates:
+        planned = sorted(by_day[d], key=lambda a: (a.scheduled_time is None, _naive(a.scheduled_time or datetime.max)))
+        notes = []
+        if flight is not None and d == start:
+            notes.append(f"Arrive {flight.outbound_arrival_time:%H:%M} on {_flight_label(flight.outbound_airline, flight.outbound_flight_number)}.")
+        if flight is not None and d == end:
+            notes.append(f"Return flight {_flight_label(flight.return_airline, flight.return_flight_number)} departs {flight.return_departure_time:%H:%M}.")
+        if not planned:
+            notes.append("Free day.")
+        days.append(DayPlan(day=d, activities=planned, notes=" ".join(notes) or None))
+    return days
+
+
+def assemble_itinerary(
+    plan: InitialPlanningTaskOutput,
+    flight_output: Optional[TaskOutput],
+    hotel_output: Optional[TaskOutput],
+    activity_output: Optional[TaskOutput],
+    notes_model: str = NOTES_MODEL,
+) -> FinalItineraryOutput:
+    """
+    Deterministic replacement for final_assembly_task and the budget audit: the agents'
+    chosen flight and hotel (first result) and all planned activities, summed in Decimal.
+    Any unusable step yields `failures` instead of components.
+    """
+    failures: List[AssemblyFailure] = []
+    if plan.end_date < plan.start_date:
+        failures.append(AssemblyFailure(
+            component="dates",
+            reason=f"End date {plan.end_date} is before start date {plan.start_date}",
+        ))
+    flights = _pick(flight_output, "flights", "flights", FlightSummary, failures)
+    hotels = _pick(hotel_output, "hotels", "hotel", HotelSummary, failures)
+    activities = _pick(activity_output, "activities", "activities", ActivitySummary, failures)
+
+    context = dict(
+        source=plan.source,
+        destination=plan.destination,
+        start_date=plan.start_date,
+        end_date=plan.end_date,
+        num_travelers=plan.num_travelers,
+        group_category=plan.group_category.value,
+        interests=list(plan.interests),
+    )
+    if failures:
+        return FinalItineraryOutput(**context, failures=failures, trace={"budgeting": "not audited: incomplete plan"})
+
+    flight, hotel = flights[0], hotels[0]
+    flight_cost, hotel_cost = money(flight.total_price), money(hotel.total_cost)
+    activity_cost = sum((money(a.cost) for a in activities), Decimal("0.00"))
+    total = flight_cost + hotel_cost + activity_cost
+    remaining = money(plan.budget) - total
+
+    itinerary = FinalItineraryOutput(
+        **context,
+        flights=flight,
+        hotel=hotel,
+        itinerary_by_day=build_days(plan.start_date, plan.end_date, activities, flight),
+        total_cost=float(total) if total > 0 else None,
+        remaining_budget=float(remaining),
+        trace={
+            "flight_component": "flight_research_task",
+            "hotel_component": "hotel_research_task",
+            "activity_component": "activity_planning_task",
+            "budgeting": (
+                f"{flight_cost} flights + {hotel_cost} hotel + {activity_cost} activities = {total}; "
+                f"budget {money(plan.budget)} - total = {remaining}"
+            ),
+        },
+    )
+    if notes_model:
+        write_day_notes(itinerary, notes_model)
+    return itinerary
+
+
+def write_day_notes(itinerary: FinalItineraryOutput, model: str) -> None:
+    """Replace the day notes with a short narrative, all days in one prompt; keeps the old notes on any error."""
+    from crewai import LLM
+
+    days = [
+        {
+            "day": d.day.isoformat(),
+            "notes": d.notes,
+            "activities": [
+                {"name": a.name, "time": a.scheduled_time.strftime("%H:%M") if a.scheduled_time else None, "location": a.location}
+                for a in d.activities
+            ],
+        }
+        for d in itinerary.itinerary_by_day or []
+    ]
+    prompt = (
+        f"Trip to {itinerary.destination} for a {itinerary.group_category} group "
+        f"(interests: {', '.join(itinerary.interests) or 'none'}), staying at {itinerary.hotel.name}.\n"
+        "For each day below write 1-2 sentences of practical logistics (order, timing, getting around). "
+        "Keep any arrival or departure facts. Return ONLY a JSON object mapping each day (YYYY-MM-DD) to its notes.\n"
+        + json.dumps(days)
+    )
+    try:
+        text = LLM(model=model, temperature=0.3).call([{"role": "user", "content": prompt}])
+        notes = json.loads(str(text).strip().removeprefix("```json").removeprefix("```").removesuffix("```"))
+    except Exception as e:
+        print(f"[Assembler] Day notes skipped: {e}")
+        return
+    for d in itinerary.itinerary_by_day or []:
+        note = notes.get(d.day.isoformat()) if isinstance(notes, dict) else None
+        if isinstance(note, str) and note.strip():
+            d.notes = note.strip()
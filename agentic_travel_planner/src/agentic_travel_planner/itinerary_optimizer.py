@@ -0,0 +1,252 @@
+import math
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+from agentic_travel_planner.crew import ActivityItem, ActivitySummary, DayPlan
+from agentic_travel_planner.geo import haversine_matrix, shortest_route, travel_minutes
+
+RULES_PATH = Path(__file__).parent / "config" / "activity_rules.yaml"
+# Budget is discretized into this many steps for the knapsack; costs round up, so the
+# selection never exceeds the budget.
+KNAPSACK_RESOLUTION = 1000
+
+
+@dataclass
+class ItineraryPlan:
+    activities: List[ActivityItem]
+    days: List[DayPlan]
+    total_cost: float
+    remaining_budget: float
+    skipped: List[str] = field(default_factory=list)
+
+
+def load_rules(path: Path = RULES_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def category_rule(category: Optional[str], rules: Dict[str, Any]) -> Dict[str, Any]:
+    """Rule for the longest category prefix matching a Geoapify category."""
+    table = rules["categories"]
+    category = category or ""
+    matches = [prefix for prefix in table if prefix != "default" and category.startswith(prefix)]
+    return table[max(matches, key=len)] if matches else table["default"]
+
+
+def estimate_cost(category: Optional[str], num_travelers: int, rules: Dict[str, Any]) -> float:
+    return round(float(category_rule(category, rules)["cost_per_person"]) * max(1, num_travelers), 2)
+
+
+def categories_for_interests(interests: Any, rules: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Category prefixes named by free-text interests ('clubs, food, forts' or a list)."""
+    rules = rules or load_rules()
+    if isinstance(interests, str):
+        interests = interests.split(",")
+    categories: List[str] = []
+    for interest in interests:
+        text = interest.strip().lower()
+        for keyword, prefixes in rules["interests"].items():
+            if keyword in text:
+                categories += [p for p in prefixes if p not in categories]
+    return categories
+
+
+def interest_matches(category: Optional[str], interests: Sequence[str], rules: Dict[str, Any]) -> int:
+    """How many of the traveller's interests point at this category."""
+    category = category or ""
+    count = 0
+    for interest in interests:
+        text = interest.strip().lower()
+        for keyword, prefixes in rules["interests"].items():
+            if keyword in text and any(category.startswith(p) for p in prefixes):
+                count += 1
+                break
+    return count
+
+
+def knapsack(values: Sequence[float], costs: Sequence[float], capacity: float, max_items: int) -> List[int]:
+    """
+    0/1 knapsack with an item-count cap: indices maximizing total value with
+    sum(costs) <= capacity and at most max_items picks. Each item is one vectorized DP row update.
+    """
+    n = len(values)
+    if n == 0 or max_items <= 0 or capacity < 0:
+        return []
+    unit = max(capacity / KNAPSACK_RESOLUTION, 0.01)
+    width = int(math.floor(capacity / unit + 1e-9))
+    weights = np.ceil(np.asarray(costs, dtype=float) / unit - 1e-9).astype(int)
+    k_max = min(max_items, n)
+
+    # dp[k, c]: best value using exactly k items with total weight <= c
+    dp = np.full((k_max + 1, width + 1), -np.inf)
+    dp[0, :] = 0.0
+    keep = np.zeros((n, k_max + 1, width + 1), dtype=bool)
+    for i in range(n):
+        w = weights[i]
+        if w > width:
+            continue
+        candidate = np.full_like(dp, -np.inf)
+        candidate[1:, w:] = dp[:-1, :width + 1 - w] + values[i]
+        better = candidate > dp
+        keep[i] = better
+        dp = np.where(better, candidate, dp)
+
+    k, c = int(np.argmax(dp[:, width])), width
+    chosen = []
+    for i in range(n - 1, -1, -1):
+        if k > 0 and keep[i, k, c]:
+            chosen.append(i)
+            c -= weights[i]
+            k -= 1
+    return sorted(chosen)
+
+
+def _clock(value: str) -> time:
+    hours, minutes = str(value).split(":")
+    return time(int(hours), int(minutes))
+
+
+def _day_windows(start: date, end: date, schedule: Dict[str, Any]) -> List[Tuple[date, datetime, datetime]]:
+    """(day, window start, window end) for every trip day; arrival/departure days are shortened."""
+    days = []
+    n_days = max(1, (end - start).days + 1)
+    for offset in range(n_days):
+        day = start + timedelta(days=offset)
+        opens = _clock(schedule["day_start"])
+        closes = _clock(schedule["day_end"])
+        if n_days > 1 and offset == 0:
+            opens = max(opens, _clock(schedule["arrival_day_start"]))
+        if n_days > 1 and offset == n_days - 1:
+            closes = min(closes, _clock(schedule["departure_day_end"]))
+        days.append((day, datetime.combine(day, opens), datetime.combine(day, closes)))
+    return days
+
+
+def plan_itinerary(
+    candidates: List[Dict[str, Any]],
+    hotel_lat: float,
+    hotel_lon: float,
+    start_date: date,
+    end_date: date,
+    budget: float,
+    interests: Sequence[str],
+    num_travelers: int = 1,
+    rules: Optional[Dict[str, Any]] = None,
+) -> ItineraryPlan:
+    """
+    Pick and schedule activities without an LLM:
+    1. value = interest matches, discounted by distance from the hotel;
+    2. knapsack selection under the budget and the trip's total activity slots;
+    3. nearest-neighbour + 2-opt route over the picks, split into day-sized runs;
+    4. per day, re-route from the hotel and assign start times within the day window,
+       evening categories (bars, clubs) last and not before evening_start.
+
+    Candidates are dicts with name, category, latitude, longitude and optionally
+    description, location, cost, booking_url, discount_info.
+    """
+    rules = rules or load_rules()
+    schedule, scoring = rules["schedule"], rules["scoring"]
+    usable = [c for c in candidates if c.get("latitude") is not None and c.get("longitude") is not None]
+    if not usable:
+        return ItineraryPlan([], [], 0.0, round(budget, 2))
+
+    lats = [hotel_lat] + [c["latitude"] for c in usable]
+    lons = [hotel_lon] + [c["longitude"] for c in usable]
+    dist = haversine_matrix(lats, lons)  # index 0 is the hotel
+    minutes = travel_minutes(dist)
+
+    skipped = []
+    pool, values, costs = [], [], []
+    for i, cand in enumerate(usable, start=1):
+        if minutes[0, i] > schedule["max_leg_minutes"]:
+            skipped.append(cand["name"])
+            continue
+        cost = cand.get("cost") or estimate_cost(cand.get("category"), num_travelers, rules)
+        matches = interest_matches(cand.get("category"), interests, rules)
+        value = (scoring["base"] + scoring["per_interest_match"] * matches) / (1 + dist[0, i] / scoring["proximity_km"])
+        pool.append(i)
+        values.append(value)
+        costs.append(cost)
+
+    windows = _day_windows(start_date, end_date, schedule)
+    capacities = [
+        min(schedule["max_activities_per_day"], max(0, int((closes - opens).total_seconds() // 60) // 120))
+        for _, opens, closes in windows
+    ]
+    picks = knapsack(values, costs, budget, sum(capacities))
+    chosen = {pool[p]: costs[p] for p in picks}
+    skipped += [usable[pool[p] - 1]["name"] for p in range(len(pool)) if p not in picks]
+
+    # Evening venues get one slot per day that reaches evening_start; the rest follow the route.
+    evening_start = _clock(schedule["evening_start"])
+    is_evening = {i: bool(category_rule(usable[i - 1].get("category"), rules).get("evening")) for i in chosen}
+    route = shortest_route(dist, 0, [i for i in chosen if not is_evening[i]])
+    evenings = sorted((i for i in chosen if is_evening[i]), key=lambda i: -values[pool.index(i)])
+
+    per_day: List[List[int]] = [[] for _ in windows]
+    for d, (day, opens, closes) in enumerate(windows):
+        if evenings and closes.time() > evening_start and capacities[d] > 0:
+            per_day[d].append(evenings.pop(0))
+    skipped += [usable[i - 1]["name"] for i in evenings]
+    cursor = 0
+    for d in range(len(windows)):
+        free = capacities[d] - len(per_day[d])
+        per_day[d] = route[cursor:cursor + free] + per_day[d]
+        cursor += max(0, free)
+    skipped += [usable[i - 1]["name"] for i in route[cursor:]]
+
+    activities, days, total = [], [], 0.0
+    for d, (day, opens, closes) in enumerate(windows):
+        daytime = shortest_route(dist, 0, [i for i in per_day[d] if not is_evening[i]])
+        ordered = daytime + [i for i in per_day[d] if is_evening[i]]
+        clock, here, summaries, travel = opens, 0, [], 0
+        for i in ordered:
+            cand = usable[i - 1]
+            rule = category_rule(cand.get("category"), rules)
+            leg = int(minutes[here, i])
+            begin = clock + timedelta(minutes=leg)
+            if is_evening[i]:
+                begin = max(begin, datetime.combine(day, evening_start))
+            finish = begin + timedelta(minutes=int(rule["visit_minutes"]))
+            if finish > closes:
+                skipped.append(cand["name"])
+                continue
+            cost = round(float(chosen[i]), 2)
+            description = cand.get("description") or cand.get("location") or cand["name"]
+            location = cand.get("location") or description
+            activities.append(ActivityItem(
+                name=cand["name"],
+                description=description,
+                category=cand.get("category"),
+                cost=cost,
+                location=location,
+                latitude=cand["latitude"],
+                longitude=cand["longitude"],
+                scheduled_time=begin,
+                estimated_travel_time_minutes=int(minutes[0, i]),
+                booking_url=cand.get("booking_url"),
+                discount_info=cand.get("discount_info"),
+            ))
+            summaries.append(ActivitySummary(
+                name=cand["name"],
+                description=description,
+                category=cand.get("category"),
+                cost=cost,
+                location=location,
+                scheduled_time=begin,
+                booking_url=cand.get("booking_url"),
+                discount_info=cand.get("discount_info"),
+            ))
+            total += cost
+            travel += leg
+            clock, here = finish, i
+        notes = f"About {travel} min of travel between stops." if summaries else "Free day."
+        days.append(DayPlan(day=day, activities=summaries, notes=notes))
+
+    total = round(total, 2)
+    return ItineraryPlan(activities, days, total, round(budget - total, 2), skipped)
@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+"""
+Completion cache in front of the agents in config/agents.yaml.
+
+Agent LLM calls go through litellm.completion; identical calls (same agent, model,
+sampling params and normalized messages) are answered from SQLite or Redis instead.
+
+    llm_cache stats                           # entries and hit rate per agent
+    llm_cache invalidate Flight_Researcher    # drop one agent's entries
+    llm_cache clear
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import yaml
+from dotenv import load_dotenv
+
+from agentic_travel_planner.telemetry import get_telemetry
+from agentic_travel_planner.tools.geocode_store import normalize_text
+
+load_dotenv()
+
+AGENTS_PATH = Path(__file__).parent / "config" / "agents.yaml"
+DEFAULT_DB_PATH = os.path.join(".cache", "llm_cache.sqlite3")
+# Request params besides the messages that change the completion.
+KEY_PARAMS = ("model", "temperature", "top_p", "max_tokens", "max_completion_tokens", "stop", "seed",
+              "response_format", "tools", "tool_choice", "reasoning_effort")
+CACHEABLE_FINISH = {"stop", "tool_calls"}
+
+# Signed and decimal numbers ("-120.0", "+5.5", "1,200") are kept verbatim in semantic keys.
+_NUMBER = re.compile(r"([-+]?\d+(?:,\d{3})*(?:\.\d+)?)")
+
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+def load_agent_roles(path: Path = AGENTS_PATH) -> Dict[str, str]:
+    """agents.yaml key -> role, e.g. 'Flight_Researcher' -> 'Resourceful Flight Researcher'."""
+    with open(path, "r", encoding="utf-8") as f:
+        return {name: " ".join(str(cfg["role"]).split()) for name, cfg in yaml.safe_load(f).items()}
+
+
+def agent_for(messages: List[Dict[str, Any]], roles: Dict[str, str]) -> Optional[str]:
+    """
+    The agents.yaml key whose persona opens the conversation (crewai's 'You are {role}.'),
+    or None for calls that no configured agent makes (output converters, assembler notes).
+    """
+    if not messages:
+        return None
+    first = " ".join(str(messages[0].get("content") or "").split())
+    for name, role in roles.items():
+        if first.startswith(f"You are {role}."):
+            return name
+    return None
+
+
+def _canonical(content: Any, semantic: bool) -> Any:
+    if not isinstance(content, str):
+        return content
+    if semantic:
+        # JSON blocks compare by value, prose by normalize_text (case, accents, punctuation)
+        # around numbers, which stay as written: "-120.0" and "120.0" are different prompts.
+        try:
+            return json.dumps(json.loads(content), sort_keys=True)
+        except ValueError:
+            pieces = [p if i % 2 else normalize_text(p) for i, p in enumerate(_NUMBER.split(content))]
+            return " ".join(p for p in pieces if p)
+    return " ".join(content.split())
+
+
+def make_llm_key(agent: str, params: Dict[str, Any], semantic: bool = False) -> str:
+    """
+    Exact mode: messages with whitespace collapsed, plus model and sampling params.
+    Semantic mode also ignores case, accents and punctuation in prose and key order in
+    JSON, so prompts that differ only in formatting share an entry. Numbers always count.
+    """
+    messages = [
+        [m.get("role"), _canonical(m.get("content"), semantic), m.get("name"), m.get("tool_call_id")]
+        for m in params.get("messages") or []
+    ]
+    relevant = {k: params.get(k) for k in KEY_PARAMS if params.get(k) is not None}
+    raw = json.dumps([agent, "semantic" if semantic else "exact", relevant, messages], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SQLiteLLMCacheBackend:
+    """Local completion store with per-entry expiry and LRU trimming to max_entries."""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " agent TEXT NOT NULL,"
+                " model TEXT,"
+                " response TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_agent ON llm_cache (agent)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache_stats ("
+                " agent TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, agent: str, model: str, value: Dict[str, Any], ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, agent, model, response, expires_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, model, json.dumps(value, default=str), now + ttl, now),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            excess = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            self._conn.commit()
+
+    def count(self, agent: str, hit: bool) -> None:
+        column = "hits" if hit else "misses"
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO llm_cache_stats (agent, {column}) VALUES (?, 1) "
+                f"ON CONFLICT(agent) DO UPDATE SET {column} = {column} + 1",
+                (agent,),
+            )
+            self._conn.commit()
+
+    def invalidate(self, agent: Optional[str] = None) -> int:
+        """Delete one agent's entries, or all of them; returns how many were removed."""
+        with self._lock:
+            if agent is None:
+                cur = self._conn.execute("DELETE FROM llm_cache")
+                self._conn.execute("DELETE FROM llm_cache_stats")
+            else:
+                cur = self._conn.execute("DELETE FROM llm_cache WHERE agent = ?", (agent,))
+                self._conn.execute("DELETE FROM llm_cache_stats WHERE agent = ?", (agent,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT agent, COUNT(*) FROM llm_cache WHERE expires_at > ? GROUP BY agent", (time.time(),)
+            ).fetchall()
+            counts = self._conn.execute("SELECT agent, hits, misses FROM llm_cache_stats").fetchall()
+        rows = {agent: {"entries": n, "hits": 0, "misses": 0} for agent, n in entries}
+        for agent, hits, misses in counts:
+            rows.setdefault(agent, {"entries": 0})
+            rows[agent].update(hits=hits, misses=misses)
+        return rows
+
+
+class RedisLLMCacheBackend:
+    """
+    Shared store on Redis: entries expire by TTL, a time-ordered index trims the cache to
+    max_entries, and a per-agent set allows invalidation by agent.
+    Redis failures are treated as misses; the cache must never break an agent call.
+    """
+
+    def __init__(self, redis_url: str, max_entries: int = 10000, namespace: str = "atp:llm"):
+        import redis
+
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.namespace, *parts))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self._client.get(self._key("entry", key))
+        except Exception as e:
+            print(f"[LLMCache] Redis get failed: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, agent: str, model: str, value: Dict[str, Any], ttl: int) -> None:
+        now = time.time()
+        index = self._key("index")
+        try:
+            pipe = self._client.pipeline()
+            pipe.set(self._key("entry", key), json.dumps(value, default=str), ex=ttl)
+            pipe.sadd(self._key("agent", agent), key)
+            pipe.zadd(index, {f"{agent}|{key}": now})
+            pipe.zremrangebyscore(index, "-inf", now - ttl)
+            pipe.zcard(index)
+            excess = pipe.execute()[-1] - self.max_entries
+            if excess > 0:
+                for member, _ in self._client.zpopmin(index, excess):
+                    old_agent, old_key = member.decode().split("|", 1)
+                    self._client.delete(self._key("entry", old_key))
+                    self._client.srem(self._key("agent", old_agent), old_key)
+        except Exception as e:
+            print(f"[LLMCache] Redis set failed: {e}")
+
+    def count(self, agent: str, hit: bool) -> None:
+        try:
+            self._client.hincrby(self._key("stats"), f"{agent}|{'hits' if hit else 'misses'}", 1)
+        except Exception as e:
+            print(f"[LLMCache] Redis stats failed: {e}")
+
+    def invalidate(self, agent: Optional[str] = None) -> int:
+        agents = [agent] if agent else [k.decode().rsplit(":", 1)[-1] for k in self._client.scan_iter(self._key("agent", "*"))]
+        removed = 0
+        for name in agents:
+            keys = [k.decode() for k in self._client.smembers(self._key("agent", name))]
+            if keys:
+                removed += self._client.delete(*(self._key("entry", k) for k in keys))
+                self._client.zrem(self._key("index"), *(f"{name}|{k}" for k in keys))
+            self._client.delete(self._key("agent", name))
+            self._client.hdel(self._key("stats"), f"{name}|hits", f"{name}|misses")
+        return removed
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        rows: Dict[str, Dict[str, int]] = {}
+        for member, _ in self._client.zscan_iter(self._key("index")):
+            agent = member.decode().split("|", 1)[0]
+            rows.setdefault(agent, {"entries": 0, "hits": 0, "misses": 0})["entries"] += 1
+        for field, value in self._client.hgetall(self._key("stats")).items():
+            agent, kind = field.decode().split("|", 1)
+            rows.setdefault(agent, {"entries": 0, "hits": 0, "misses": 0})[kind] = int(value)
+        return rows
+
+
+class LLMCache:
+    """Looks up and stores agent completions; counts hits, misses and uncached calls."""
+
+    def __init__(self, backend, ttl: int, semantic: bool = False, agents: Optional[List[str]] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.semantic = semantic
+        roles = load_agent_roles()
+        self.roles = {name: role for name, role in roles.items() if not agents or name in agents}
+        self._lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, agent: str, result: str, model: str) -> None:
+        with self._lock:
+            per_agent = self.counts.setdefault(agent, {"hit": 0, "miss": 0, "bypass": 0})
+            per_agent[result] += 1
+        get_telemetry().llm_cache.add(1, {"agent": agent, "model": model, "result": result})
+        if result != "bypass":
+            self.backend.count(agent, hit=result == "hit")
+
+    def completion(self, original, *args, **params) -> Any:
+        import litellm
+
+        agent = agent_for(params.get("messages") or [], self.roles)
+        model = str(params.get("model") or "unknown")
+        if agent is None or args or params.get("stream"):
+            return original(*args, **params)
+        key = make_llm_key(agent, params, self.semantic)
+
+        if _bypass.get():
+            self._count(agent, "bypass", model)
+        else:
+            cached = self.backend.get(key)
+            if cached is not None:
+                self._count(agent, "hit", model)
+                # No tokens were spent on a hit; usage says so for crew and benchmark accounting.
+                cached["usage"] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                return litellm.ModelResponse(**cached)
+            self._count(agent, "miss", model)
+
+        response = original(*args, **params)
+        choices = getattr(response, "choices", None) or []
+        if choices and all(getattr(c, "finish_reason", None) in CACHEABLE_FINISH for c in choices):
+            self.backend.set(key, agent, model, response.model_dump(), self.ttl)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """This process's lookups per agent with hit rate (bypassed calls excluded)."""
+        with self._lock:
+            rows = {agent: dict(c) for agent, c in self.counts.items()}
+        for row in rows.values():
+            looked_up = row["hit"] + row["miss"]
+            row["hit_rate"] = round(row["hit"] / looked_up, 3) if looked_up else 0.0
+        return rows
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+_installed = False
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Process-wide cache configured from the environment, or None when disabled:
+    - LLM_CACHE_BACKEND: sqlite (default, LLM_CACHE_DB_PATH), redis (LLM_CACHE_REDIS_URL,
+      defaults to REDIS_URL) or none
+    - LLM_CACHE_TTL (default 86400 s), LLM_CACHE_MAX_ENTRIES (default 10000)
+    - LLM_CACHE_KEY_MODE: exact (default) or semantic
+    - LLM_CACHE_AGENTS: comma-separated agents.yaml keys to cache (default: all)
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                kind = os.getenv("LLM_CACHE_BACKEND", "sqlite").strip().lower()
+                if kind in ("", "none", "off"):
+                    return None
+                max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+                try:
+                    if kind == "redis":
+                        redis_url = os.getenv("LLM_CACHE_REDIS_URL", os.getenv("REDIS_URL", ""))
+                        backend = RedisLLMCacheBackend(redis_url, max_entries)
+                    else:
+                        backend = SQLiteLLMCacheBackend(os.getenv("LLM_CACHE_DB_PATH", DEFAULT_DB_PATH), max_entries)
+                except Exception as e:
+                    print(f"[LLMCache] Disabled: {e}")
+                    return None
+                agents = [a.strip() for a in os.getenv("LLM_CACHE_AGENTS", "").split(",") if a.strip()]
+                _cache = LLMCache(
+                    backend,
+                    ttl=int(os.getenv("LLM_CACHE_TTL", str(24 * 3600))),
+                    semantic=os.getenv("LLM_CACHE_KEY_MODE", "exact").strip().lower() == "semantic",
+                    agents=agents,
+                )
+    return _cache
+
+
+def install_llm_cache() -> None:
+    """
+    Put the cache in front of litellm.completion (what crewai's LLM calls). Installed after
+    telemetry's wrapper, so hits never show up as LLM spans or token counts.
+    """
+    global _installed
+    cache = get_llm_cache()
+    if _installed or cache is None:
+        return
+    _installed = True
+
+    import litellm
+
+    original = litellm.completion
+
+    def completion(*args, **params):
+        return cache.completion(original, *args, **params)
+
+    litellm.completion = completion
+
+
+@contextmanager
+def bypassed(active: bool = True) -> Iterator[None]:
+    """Within this block agent calls skip cache lookups (fresh answers still refresh the cache)."""
+    token = _bypass.set(active)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the agent LLM completion cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Entries, hits and misses per agent")
+    invalidate = sub.add_parser("invalidate", help="Drop one agent's entries")
+    invalidate.add_argument("agent", help="agents.yaml key, e.g. Flight_Researcher")
+    sub.add_parser("clear", help="Drop every entry")
+    args = parser.parse_args()
+
+    cache = get_llm_cache()
+    if cache is None:
+        sys.exit("LLM cache is disabled (LLM_CACHE_BACKEND=none).")
+    if args.command == "stats":
+        for agent, row in sorted(cache.backend.summary().items()):
+            looked_up = row.get("hits", 0) + row.get("misses", 0)
+            rate = row.get("hits", 0) / looked_up if looked_up else 0.0
+            print(f"{agent:<32} entries={row.get('entries', 0):<6} hits={row.get('hits', 0):<6} "
+                  f"misses={row.get('misses', 0):<6} hit_rate={rate:.2f}")
+    elif args.command == "invalidate":
+        if args.agent not in load_agent_roles():
+            sys.exit(f"Unknown agent {args.agent!r}; expected a key from {AGENTS_PATH.name}.")
+        print(f"Removed {cache.backend.invalidate(args.agent)} entries for {args.agent}.")
+    else:
+        print(f"Removed {cache.backend.invalidate()} entries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Queueing-delay load test against a running broker and worker pool.
+
+Each job is a loadtest_probe_task that holds a worker slot for --task-seconds (a
+stand-in for a plan run, without LLM or API cost) and reports how long it waited in
+the queue. A burst of batch jobs is enqueued first, then interactive jobs arrive at a
+steady rate, and the p50/p95 queueing delay of each class is reported:
+
+    loadtest --batch 40 --interactive 20 --task-seconds 5 --interval 1
+
+--single-queue sends everything to the interactive queue at one priority, which is
+the behaviour before the queues were split, for comparison.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from agentic_travel_planner.stats import percentile
+from agentic_travel_planner.worker import (
+    BATCH_PRIORITY,
+    BATCH_QUEUE,
+    INTERACTIVE_PRIORITY,
+    INTERACTIVE_QUEUE,
+    loadtest_probe_task,
+)
+
+
+def submit(kind: str, seconds: float, single_queue: bool):
+    queue, priority = (INTERACTIVE_QUEUE, INTERACTIVE_PRIORITY)
+    if kind == "batch" and not single_queue:
+        queue, priority = BATCH_QUEUE, BATCH_PRIORITY
+    return loadtest_probe_task.apply_async(
+        args=[seconds], queue=queue, priority=priority, headers={"enqueued_at": time.time()}
+    )
+
+
+def run(batch: int, interactive: int, seconds: float, interval: float, single_queue: bool) -> Dict[str, List[float]]:
+    jobs = [("batch", submit("batch", seconds, single_queue)) for _ in range(batch)]
+    print(f"[LoadTest] Enqueued {batch} batch jobs; sending {interactive} interactive jobs every {interval}s")
+    for _ in range(interactive):
+        jobs.append(("interactive", submit("interactive", seconds, single_queue)))
+        time.sleep(interval)
+
+    waits: Dict[str, List[float]] = {"batch": [], "interactive": []}
+    timeout = (batch + interactive) * seconds + 60
+    for kind, job in jobs:
+        result = job.get(timeout=timeout)
+        if result.get("queue_wait_s") is not None:
+            waits[kind].append(result["queue_wait_s"])
+    return waits
+
+
+def summarize(waits: Dict[str, List[float]]) -> Dict[str, Any]:
+    return {
+        kind: {
+            "jobs": len(values),
+            "p50_s": round(percentile(values, 50), 2),
+            "p95_s": round(percentile(values, 95), 2),
+            "max_s": round(max(values), 2) if values else 0.0,
+        }
+        for kind, values in waits.items()
+    }
+
+
+def print_report(summary: Dict[str, Any]) -> None:
+    print("\n=== QUEUEING DELAY ===")
+    header = f"{'class':<12} {'jobs':>5} {'p50 s':>8} {'p95 s':>8} {'max s':>8}"
+    print(header)
+    print("-" * len(header))
+    for kind, row in summary.items():
+        print(f"{kind:<12} {row['jobs']:>5} {row['p50_s']:>8.2f} {row['p95_s']:>8.2f} {row['max_s']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure plan-queue waiting time under mixed interactive/batch load.")
+    parser.add_argument("--batch", type=int, default=40, help="Batch jobs enqueued as one burst")
+    parser.add_argument("--interactive", type=int, default=20, help="Interactive jobs sent after the burst")
+    parser.add_argument("--task-seconds", type=float, default=5.0, help="How long each job holds a worker slot")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between interactive jobs")
+    parser.add_argument("--single-queue", action="store_true", help="Baseline: one queue, one priority")
+    parser.add_argument("--json", type=Path, help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    waits = run(args.batch, args.interactive, args.task_seconds, args.interval, args.single_queue)
+    summary = summarize(waits)
+    print_report(summary)
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=2))
+        print(f"[LoadTest] Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+from crewai import LLM
+from crewai.llms.base_llm import BaseLLM
+
+from agentic_travel_planner.stats import percentile
+from agentic_travel_planner.telemetry import get_telemetry
+
+RULES_PATH = Path(__file__).parent / "config" / "model_routing.yaml"
+# Latencies kept per (agent, model) for the p95 hedge delay and stats().
+LATENCY_WINDOW = 500
+# Threads for primary calls, and the most hedges in flight at once. A running LLM call
+# can't be interrupted, so the loser of a hedge race keeps its thread until it answers;
+# the primary pool has one extra thread per hedge slot for primaries that lost, and no
+# new hedge starts while every slot is still held by a race (including its loser).
+ROUTER_WORKERS = int(os.getenv("MODEL_ROUTER_WORKERS", "8"))
+HEDGE_WORKERS = int(os.getenv("MODEL_ROUTER_HEDGE_WORKERS", "4"))
+DISABLED_POLICIES = ("none", "off")
+
+_policy: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("model_policy", default=None)
+
+
+@dataclass(frozen=True)
+class Route:
+    primary: str
+    hedge: Optional[str]
+    timeout_s: Optional[float]
+    hedge_after_s: Any
+    hedge_min_s: float
+    hedge_cold_s: float
+    min_samples: int
+
+
+def load_rules(path: Path = RULES_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def policy_names(rules: Optional[Dict[str, Any]] = None) -> List[str]:
+    return sorted((rules or load_rules())["policies"])
+
+
+def current_policy(rules: Dict[str, Any]) -> str:
+    """Per-request override, else PLANNER_MODEL_POLICY, else the file's default_policy."""
+    return (_policy.get() or os.getenv("PLANNER_MODEL_POLICY") or rules["default_policy"]).strip().lower()
+
+
+@contextmanager
+def model_policy(name: Optional[str]) -> Iterator[None]:
+    """Route the agent calls made within this block with policy `name` (None keeps the default)."""
+    token = _policy.set(name)
+    try:
+        yield
+    finally:
+        _policy.reset(token)
+
+
+def resolve_route(rules: Dict[str, Any], policy: str, agent: str, task: Optional[str], default_model: str) -> Route:
+    """
+    File defaults < policy defaults < agent rule < task rule; tiers resolve to model names.
+    A hedge on the primary's own model is dropped: it would double tokens without adding a fallback.
+    """
+    if policy in DISABLED_POLICIES:
+        return Route(default_model, None, None, None, 0.0, 0.0, 0)
+    chosen = rules["policies"].get(policy)
+    if chosen is None:
+        raise ValueError(f"Unknown model policy {policy!r}; expected one of {policy_names(rules)}")
+    merged = {**rules.get("defaults", {}), **chosen.get("defaults", {})}
+    merged.update(chosen.get("agents", {}).get(agent, {}))
+    merged.update(chosen.get("tasks", {}).get(task or "", {}))
+    tiers = rules.get("tiers", {})
+    primary = tiers.get(merged.get("tier"), merged.get("tier")) or default_model
+    hedge = tiers.get(merged.get("hedge"), merged.get("hedge")) or None
+    return Route(
+        primary=primary,
+        hedge=hedge if hedge != primary else None,
+        timeout_s=merged.get("timeout_s"),
+        hedge_after_s=merged.get("hedge_after_s"),
+        hedge_min_s=float(merged.get("hedge_min_s", 0.0)),
+        hedge_cold_s=float(merged.get("hedge_cold_s", 0.0)),
+        min_samples=int(merged.get("min_samples", 1)),
+    )
+
+
+class ModelRouter:
+    """
+    Picks the model for each agent call from the routing policy, sends a hedged copy to the
+    secondary model once the primary is slower than its hedge delay (or falls back to it
+    when the primary fails), and keeps latency/outcome stats per agent and model.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Any]] = None):
+        self.rules = rules or load_rules()
+        self._pool = ThreadPoolExecutor(max_workers=ROUTER_WORKERS + HEDGE_WORKERS, thread_name_prefix="llm-route")
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max(1, HEDGE_WORKERS), thread_name_prefix="llm-hedge")
+        self._hedge_slots = threading.BoundedSemaphore(max(1, HEDGE_WORKERS))
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str], Deque[float]] = {}
+        self._counts: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def route(self, agent: str, task: Optional[str], default_model: str) -> Route:
+        return resolve_route(self.rules, current_policy(self.rules), agent, task, default_model)
+
+    def hedge_delay(self, agent: str, route: Route) -> Optional[float]:
+        """Seconds to wait for the primary before hedging, or None when this route never hedges."""
+        if route.hedge is None or route.hedge_after_s is None:
+            return None
+        if route.hedge_after_s != "p95":
+            return float(route.hedge_after_s)
+        with self._lock:
+            samples = list(self._latency.get((agent, route.primary), ()))
+        if len(samples) < route.min_samples:
+            return route.hedge_cold_s
+        return max(route.hedge_min_s, percentile(samples, 95))
+
+    def _record(self, agent: str, model: str, outcome: str, elapsed: Optional[float] = None) -> None:
+        with self._lock:
+            counts = self._counts.setdefault((agent, model), {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if elapsed is not None:
+                self._latency.setdefault((agent, model), deque(maxlen=LATENCY_WINDOW)).append(elapsed)
+        get_telemetry().llm_route.add(1, {"agent": agent, "model": model, "outcome": outcome})
+
+    def _submit(self, agent: str, llm: BaseLLM, kwargs: Dict[str, Any], pool: Optional[ThreadPoolExecutor] = None) -> Future:
+        ctx = contextvars.copy_context()
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                result = ctx.run(llm.call, **kwargs)
+            except Exception:
+                self._record(agent, llm.model, "error")
+                raise
+            self._record(agent, llm.model, "ok", time.perf_counter() - start)
+            return result
+
+        return (pool or self._pool).submit(timed)
+
+    def call(self, agent: str, route: Route, llm_for, **kwargs) -> Any:
+        primary = self._submit(agent, llm_for(route.primary, route.timeout_s), kwargs)
+        delay = self.hedge_delay(agent, route)
+        if route.hedge is None:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=delay)
+        if done and primary.exception() is None:
+            return primary.result()
+        if done:
+            print(f"[ModelRouter] {agent}: {route.primary} failed ({primary.exception()}); falling back to {route.hedge}")
+            self._record(agent, route.hedge, "fallback")
+            return self._submit(agent, llm_for(route.hedge, route.timeout_s), kwargs).result()
+
+        if not self._hedge_slots.acquire(blocking=False):
+            # Every hedge slot is held by a race still running; wait on the primary alone.
+            self._record(agent, route.hedge, "hedge_skipped")
+            return primary.result()
+        self._record(agent, route.hedge, "hedged")
+        hedged = self._submit(agent, llm_for(route.hedge, route.timeout_s), kwargs, self._hedge_pool)
+        self._release_when_done(primary, hedged)
+        pending = {primary, hedged}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self._record(agent, route.hedge, "hedge_win")
+                    # Not waited for: cancelled if it has not started, else left to finish.
+                    for loser in pending:
+                        loser.cancel()
+                        self._record(agent, route.primary if loser is primary else route.hedge, "abandoned")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _release_when_done(self, *futures: Future) -> None:
+        """Free a hedge slot once both sides of the race have finished (or were cancelled)."""
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._hedge_slots.release()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per 'agent/model': outcome counts and latency percentiles, for tuning the policy file."""
+        with self._lock:
+            keys = set(self._counts) | set(self._latency)
+            rows = {}
+            for agent, model in sorted(keys):
+                samples = list(self._latency.get((agent, model), ()))
+                rows[f"{agent}/{model}"] = {
+                    **self._counts.get((agent, model), {}),
+                    "p50_s": round(percentile(samples, 50), 2),
+                    "p95_s": round(percentile(samples, 95), 2),
+                    "p99_s": round(percentile(samples, 99), 2),
+                }
+        return rows
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+class RoutedLLM(BaseLLM):
+    """
+    An agent's LLM: each call is routed by the agent and the calling task under the current
+    policy. Delegates are plain crewai LLMs, one per (model, timeout, stop words), owned by
+    this agent and never modified after creation, so concurrent calls can share them.
+    Direct litellm users (output converters) see `model`, the agents.yaml default.
+    """
+
+    def __init__(self, agent: str, default_model: str, router: Optional[ModelRouter] = None):
+        super().__init__(model=default_model)
+        self.agent = agent
+        self.router = router or get_model_router()
+        self._delegates: Dict[Tuple[str, Optional[float], Tuple[str, ...]], LLM] = {}
+        self._delegates_lock = threading.Lock()
+
+    def _llm(self, model: str, timeout: Optional[float] = None) -> LLM:
+        # crewai may change this agent's stop words between tasks; each set gets its own delegate.
+        key = (model, timeout, tuple(self.stop or ()))
+        with self._delegates_lock:
+            llm = self._delegates.get(key)
+            if llm is None:
+                llm = self._delegates[key] = LLM(model=model, timeout=timeout, stop=list(key[2]))
+        return llm
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        route = self.router.route(self.agent, getattr(from_task, "name", None), self.model)
+        return self.router.call(
+            self.agent,
+            route,
+            self._llm,
+            messages=messages,
+            tools=tools,
+            callbacks=callbacks,
+            available_functions=available_functions,
+            from_task=from_task,
+            from_agent=from_agent,
+        )
+
+    def supports_function_calling(self) -> bool:
+        return self._llm(self.model).supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self._llm(self.model).supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self._llm(self.model).get_context_window_size()
+
+
+def routed_llm(agent: str, config: Dict[str, Any]) -> RoutedLLM:
+    """RoutedLLM for an agents.yaml entry; its `llm` is the default when no policy applies."""
+    return RoutedLLM(agent, str(config.get("llm") or "gpt-4.1-mini"))
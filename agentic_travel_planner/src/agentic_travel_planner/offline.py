@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+import litellm
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from agentic_travel_planner.tools import async_http
+from agentic_travel_planner.tools.response_cache import make_cache_key
+
+# A cassette holds every upstream exchange of one crew run: HTTP responses from the tools
+# (RapidAPI, Geoapify, Serper) and LLM completions. Recording wraps the real calls;
+# replaying serves them back so a full kickoff runs without network or API keys.
+CASSETTE_VERSION = 1
+
+_KEPT_HEADERS = ("Content-Type",)
+
+LLMObserver = Callable[[float, Dict[str, int]], None]
+
+
+class ReplayMissError(requests.ConnectionError):
+    """A replayed run asked for an exchange the cassette does not contain."""
+
+
+def http_key(method: str, url: str, params: Any = None, body: Any = None) -> str:
+    """Method + endpoint + non-auth params (same normalization as the response cache) + body."""
+    base = make_cache_key(url, params if isinstance(params, dict) else None)
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    if body is not None and not isinstance(body, str):
+        body = json.dumps(body, sort_keys=True, default=str)
+    raw = json.dumps([method.upper(), base, body or ""], separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def llm_key(params: Dict[str, Any]) -> str:
+    """Model + prompt + tool/format schema; sampling knobs that don't change the prompt are ignored."""
+    relevant = {k: params.get(k) for k in ("model", "messages", "tools", "response_format", "stop")}
+    raw = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Recorded exchanges keyed by request. Identical requests made more than once
+    (retries, repeated prompts) are stored in order and replayed in the same order.
+    """
+
+    def __init__(self, http: Optional[Dict[str, List[dict]]] = None, llm: Optional[Dict[str, List[dict]]] = None):
+        self.http = http or {}
+        self.llm = llm or {}
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> "Cassette":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version in {path}: {data.get('version')}")
+        return cls(data.get("http"), data.get("llm"))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": CASSETTE_VERSION, "http": self.http, "llm": self.llm}, f, indent=1, default=str)
+
+    def add(self, kind: str, key: str, entry: dict) -> None:
+        with self._lock:
+            getattr(self, kind).setdefault(key, []).append(entry)
+
+    def next(self, kind: str, key: str) -> Optional[dict]:
+        """Next entry for key; once exhausted, the last one keeps being served."""
+        with self._lock:
+            entries = getattr(self, kind).get(key)
+            if not entries:
+                return None
+            cursor_key = f"{kind}:{key}"
+            index = self._cursor.get(cursor_key, 0)
+            self._cursor[cursor_key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._cursor.clear()
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.http.values()) + sum(len(v) for v in self.llm.values())
+
+
+class OfflineSession:
+    """
+    Patches requests.Session.request, the async tools' transport (async_http.send) and
+    litellm.completion for the duration of a record or replay block. In replay mode, latency_scale=1.0 sleeps for the recorded
+    upstream latency and 0.0 (default) returns immediately.
+    """
+
+    def __init__(self, cassette: Cassette, mode: str, latency_scale: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown offline mode: {mode}")
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.misses: List[str] = []
+        self.on_llm_call: Optional[LLMObserver] = None
+
+    # --- HTTP ---
+
+    def _http(self, original, session, method, url, **kwargs) -> requests.Response:
+        body = kwargs.get("json") if kwargs.get("json") is not None else kwargs.get("data")
+        key = http_key(method, url, kwargs.get("params"), body)
+
+        if self.mode == "replay":
+            entry = self.cassette.next("http", key)
+            if entry is None:
+                self.misses.append(f"HTTP {method} {url.split('?', 1)[0]}")
+                print(f"[Offline] Replay miss: {method} {url.split('?', 1)[0]}")
+                raise ReplayMissError(f"No recorded response for {method} {url}")
+            self._sleep(entry.get("elapsed", 0.0))
+            return _build_response(entry, method, url)
+
+        start = time.perf_counter()
+        resp = original(session, method, url, **kwargs)
+        self.cassette.add("http", key, {
+            "method": method.upper(),
+            "url": url.split("?", 1)[0],
+            "status": resp.status_code,
+            "headers": {h: resp.headers[h] for h in _KEPT_HEADERS if h in resp.headers},
+            "body": resp.content.decode("utf-8", errors="replace"),
+            "elapsed": round(time.perf_counter() - start, 4),
+        })
+        return resp
+
+    async def _ahttp(self, original, client, request: httpx.Request, timeout) -> httpx.Response:
+        """Async twin of _http; keys match, so cassettes recorded on either path replay on both."""
+        url = str(request.url.copy_with(query=None))
+        key = http_key(request.method, url, dict(request.url.params), request.content or None)
+
+        if self.mode == "replay":
+            entry = self.cassette.next("http", key)
+            if entry is None:
+                self.misses.append(f"HTTP {request.method} {url}")
+                print(f"[Offline] Replay miss: {request.method} {url}")
+                raise ReplayMissError(f"No recorded response for {request.method} {url}")
+            if self.latency_scale > 0 and entry.get("elapsed", 0.0) > 0:
+                await asyncio.sleep(entry["elapsed"] * self.latency_scale)
+            return httpx.Response(
+                entry["status"],
+                headers=entry.get("headers") or {},
+                content=entry["body"].encode("utf-8"),
+                request=request,
+            )
+
+        start = time.perf_counter()
+        resp = await original(client, request, timeout)
+        self.cassette.add("http", key, {
+            "method": request.method,
+            "url": url,
+            "status": resp.status_code,
+            "headers": {h: resp.headers[h] for h in _KEPT_HEADERS if h in resp.headers},
+            "body": resp.content.decode("utf-8", errors="replace"),
+            "elapsed": round(time.perf_counter() - start, 4),
+        })
+        return resp
+
+    # --- LLM ---
+
+    def _completion(self, original, **params) -> Any:
+        if params.get("stream"):
+            # Streaming responses are not captured; crews here run with stream=False.
+            return original(**params)
+
+        key = llm_key(params)
+        if self.mode == "replay":
+            entry = self.cassette.next("llm", key)
+            if entry is None:
+                self.misses.append(f"LLM {params.get('model')}")
+                print(f"[Offline] Replay miss: LLM call to {params.get('model')}")
+                raise ReplayMissError(f"No recorded completion for model {params.get('model')}")
+            self._sleep(entry.get("elapsed", 0.0))
+            response = litellm.ModelResponse(**entry["response"])
+            elapsed = entry.get("elapsed", 0.0) * self.latency_scale
+        else:
+            start = time.perf_counter()
+            response = original(**params)
+            elapsed = time.perf_counter() - start
+            self.cassette.add("llm", key, {
+                "model": params.get("model"),
+                "response": response.model_dump(),
+                "elapsed": round(elapsed, 4),
+            })
+
+        if self.on_llm_call is not None:
+            self.on_llm_call(elapsed, _usage(response))
+        return response
+
+    def _sleep(self, recorded: float) -> None:
+        if self.latency_scale > 0 and recorded > 0:
+            time.sleep(recorded * self.latency_scale)
+
+    @contextmanager
+    def activate(self) -> Iterator["OfflineSession"]:
+        original_request = requests.Session.request
+        original_send = async_http.send
+        original_completion = litellm.completion
+        session = self
+
+        def request(self_, method, url, **kwargs):
+            return session._http(original_request, self_, method, url, **kwargs)
+
+        async def send(client, request_, timeout):
+            return await session._ahttp(original_send, client, request_, timeout)
+
+        def completion(**params):
+            return session._completion(original_completion, **params)
+
+        requests.Session.request = request
+        async_http.send = send
+        litellm.completion = completion
+        try:
+            yield self
+        finally:
+            requests.Session.request = original_request
+            async_http.send = original_send
+            litellm.completion = original_completion
+
+
+def _build_response(entry: dict, method: str, url: str) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp.headers = CaseInsensitiveDict(entry.get("headers") or {})
+    resp._content = entry["body"].encode("utf-8")
+    resp.encoding = "utf-8"
+    resp.url = url
+    resp.reason = "Replayed"
+    resp.request = requests.Request(method.upper(), url).prepare()
+    return resp
+
+
+def _usage(response: Any) -> Dict[str, int]:
+    usage = getattr(response, "usage", None)
+    return {
+        "prompt_tokens": int(getattr(usage, "prompt_tokens", 0) or 0),
+        "completion_tokens": int(getattr(usage, "completion_tokens", 0) or 0),
+    }
+
+
+def fixtures_dir() -> Path:
+    return Path(os.getenv("BENCHMARK_FIXTURES_DIR", "benchmarks/fixtures"))
+
+
+@contextmanager
+def recording(path: Path) -> Iterator[OfflineSession]:
+    """Run real calls and save every exchange to path when the block exits."""
+    session = OfflineSession(Cassette(), "record")
+    try:
+        with session.activate():
+            yield session
+    finally:
+        session.cassette.save(path)
+        print(f"[Offline] Recorded {len(session.cassette)} exchanges to {path}")
+
+
+@contextmanager
+def replaying(path: Path, latency_scale: float = 0.0) -> Iterator[OfflineSession]:
+    """Serve every HTTP and LLM call from the cassette at path; nothing leaves the process."""
+    session = OfflineSession(Cassette.load(path), "replay", latency_scale)
+    with session.activate():
+        yield session
+    if session.misses:
+        print(f"[Offline] {len(session.misses)} replay misses for {path}")
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+import redis
+
+# Completed plans embed live prices, so keep them for hours, not days.
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", str(6 * 3600)))
+# Upper bound for one crew run; a crashed worker's claim expires after this.
+PLAN_INFLIGHT_TTL = int(os.getenv("PLAN_INFLIGHT_TTL", "900"))
+
+CACHED_TASK_PREFIX = "cached-"
+
+# Delete the in-flight claim only if it still names this task: after a refresh has taken
+# the claim over, the old task finishing must not drop the new task's claim.
+_RELEASE_IF_OWNER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _norm(value: Any) -> str:
+    return " ".join(str(value).split()).lower()
+
+
+def fingerprint(inputs: Dict[str, Any]) -> str:
+    """
+    Stable hash of a TravelPlanRequest: strings are case/whitespace normalized and
+    interests are treated as an unordered set, so trivially different submissions match.
+    """
+    interests = sorted({_norm(i) for i in str(inputs.get("interests", "")).split(",") if i.strip()})
+    normalized = {
+        "source": _norm(inputs.get("source", "")),
+        "destination": _norm(inputs.get("destination", "")),
+        "start_date": _norm(inputs.get("start_date", "")),
+        "end_date": _norm(inputs.get("end_date", "")),
+        "num_travelers": int(inputs.get("num_travelers") or 0),
+        "budget": float(inputs.get("budget") or 0),
+        "interests": interests,
+        "group_category": _norm(inputs.get("group_category", "")),
+        "currency": _norm(inputs.get("currency", "")),
+    }
+    raw = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def is_cacheable(result: Any) -> bool:
+    """Only fully structured plans are reused; raw text and failures are not."""
+    return (
+        isinstance(result, dict)
+        and "error" not in result
+        and "raw_output" not in result
+        and not result.get("failures")
+    )
+
+
+class PlanCache:
+    """
+    Redis-backed plan deduplication:
+    - plan:result:<fp>   completed FinalItineraryOutput (JSON) for PLAN_CACHE_TTL
+    - plan:inflight:<fp> Celery task id currently generating that plan
+    - plan:batch:<id>    member list of a /plan/batch submission (task id per request)
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._release_if_owner = client.register_script(_RELEASE_IF_OWNER)
+
+    def get_result(self, fp: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self.client.get(f"plan:result:{fp}")
+        except redis.RedisError as e:
+            print(f"[PlanCache] Result lookup failed: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    def set_result(self, fp: str, result: Dict[str, Any]) -> None:
+        try:
+            self.client.set(f"plan:result:{fp}", json.dumps(result), ex=PLAN_CACHE_TTL)
+        except redis.RedisError as e:
+            print(f"[PlanCache] Result store failed: {e}")
+
+    def claim_inflight(self, fp: str, task_id: str, force: bool = False) -> Optional[str]:
+        """
+        Atomically register task_id as the generator for fp.
+        Returns None if the claim succeeded, or the task id already generating this plan.
+        force (a refresh) takes the claim over from any task still running.
+        """
+        key = f"plan:inflight:{fp}"
+        try:
+            if self.client.set(key, task_id, nx=not force, ex=PLAN_INFLIGHT_TTL):
+                return None
+            existing = self.client.get(key)
+        except redis.RedisError as e:
+            print(f"[PlanCache] In-flight claim failed: {e}")
+            return None
+        return existing.decode("utf-8") if existing else None
+
+    def release_inflight(self, fp: str, task_id: str) -> None:
+        """Drop fp's claim if task_id still holds it."""
+        try:
+            self._release_if_owner(keys=[f"plan:inflight:{fp}"], args=[task_id])
+        except redis.RedisError as e:
+            print(f"[PlanCache] In-flight release failed: {e}")
+
+    def set_batch(self, batch_id: str, members: List[Dict[str, Any]]) -> bool:
+        """Kept as long as the member plans themselves (PLAN_CACHE_TTL). False if not stored."""
+        try:
+            self.client.set(f"plan:batch:{batch_id}", json.dumps(members), ex=PLAN_CACHE_TTL)
+        except redis.RedisError as e:
+            print(f"[PlanCache] Batch store failed: {e}")
+            return False
+        return True
+
+    def get_batch(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            raw = self.client.get(f"plan:batch:{batch_id}")
+        except redis.RedisError as e:
+            print(f"[PlanCache] Batch lookup failed: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+
+def cached_task_id(fp: str) -> str:
+    return f"{CACHED_TASK_PREFIX}{fp}"
+
+
+def fingerprint_from_task_id(task_id: str) -> Optional[str]:
+    if task_id.startswith(CACHED_TASK_PREFIX):
+        return task_id[len(CACHED_TASK_PREFIX):]
+    return None
@@ -0,0 +1,127 @@
+import json
+import time
+from typing import Any, AsyncIterator, Dict
+
+import redis
+import redis.asyncio as aioredis
+
+# Events are published on a pub/sub channel for live listeners and appended to a
+# short-lived log so clients that connect late (or reconnect) can replay what they missed.
+EVENT_LOG_TTL = 3600
+HEARTBEAT_SECONDS = 15
+STREAM_TIMEOUT_SECONDS = 20 * 60
+
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+def _channel(task_id: str) -> str:
+    return f"plan:events:{task_id}"
+
+
+def _log_key(task_id: str) -> str:
+    return f"plan:events:log:{task_id}"
+
+
+class ProgressPublisher:
+    """Worker-side publisher for one task's state transitions and per-step outputs."""
+
+    def __init__(self, client: redis.Redis, task_id: str, last_seq: int = 0):
+        self.client = client
+        self.task_id = task_id
+        self._seq = last_seq
+
+    def publish(self, event: str, **data: Any) -> None:
+        self._seq += 1
+        payload = json.dumps({"seq": self._seq, "event": event, "task_id": self.task_id, "ts": time.time(), **data}, default=str)
+        try:
+            pipe = self.client.pipeline()
+            pipe.rpush(_log_key(self.task_id), payload)
+            pipe.expire(_log_key(self.task_id), EVENT_LOG_TTL)
+            pipe.publish(_channel(self.task_id), payload)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Progress is best effort; never fail the plan because of it.
+            print(f"[Progress] Publish failed for {self.task_id}: {e}")
+
+    def step(self, name: str, output: Any) -> None:
+        self.publish("step", step=name, output=output)
+
+
+def mark_queued(client: redis.Redis, task_id: str) -> None:
+    """
+    Start a submitted task's event log with a 'queued' event (seq 0, so the worker's own
+    events still count from 1). A task id with no log is then unknown or expired.
+    """
+    payload = json.dumps({"seq": 0, "event": "queued", "task_id": task_id, "ts": time.time()})
+    try:
+        pipe = client.pipeline()
+        pipe.rpush(_log_key(task_id), payload)
+        pipe.expire(_log_key(task_id), EVENT_LOG_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Progress] Queued event failed for {task_id}: {e}")
+
+
+def mark_failed(client: redis.Redis, task_id: str, error: str) -> None:
+    """
+    Publish 'failed' for a task whose process died before it could (hard time limit, crash),
+    numbered after the events it already logged so open streams don't skip it.
+    """
+    try:
+        last = client.lindex(_log_key(task_id), -1)
+    except redis.RedisError as e:
+        print(f"[Progress] Failed event failed for {task_id}: {e}")
+        return
+    if last is not None and json.loads(last)["event"] in TERMINAL_EVENTS:
+        return
+    ProgressPublisher(client, task_id, json.loads(last)["seq"] if last else 0).publish("failed", error=error)
+
+
+async def has_events(client: aioredis.Redis, task_id: str) -> bool:
+    return bool(await client.exists(_log_key(task_id)))
+
+
+async def stream_events(client: aioredis.Redis, task_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield a task's events in order: first the replayed log, then live pub/sub messages,
+    until a terminal event arrives. Yields {"event": "heartbeat"} while idle.
+    Runs on the event loop, so an open stream holds no server thread.
+    """
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    # Subscribe before reading the log so nothing published in between is lost.
+    await pubsub.subscribe(_channel(task_id))
+    last_seq = -1
+    try:
+        for raw in await client.lrange(_log_key(task_id), 0, -1):
+            event = json.loads(raw)
+            last_seq = event["seq"]
+            yield event
+            if event["event"] in TERMINAL_EVENTS:
+                return
+
+        deadline = time.time() + STREAM_TIMEOUT_SECONDS
+        idle_since = time.time()
+        while time.time() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None:
+                if time.time() - idle_since >= HEARTBEAT_SECONDS:
+                    idle_since = time.time()
+                    yield {"event": "heartbeat", "task_id": task_id}
+                continue
+            event = json.loads(message["data"])
+            if event["seq"] <= last_seq:
+                continue
+            last_seq = event["seq"]
+            idle_since = time.time()
+            yield event
+            if event["event"] in TERMINAL_EVENTS:
+                return
+    finally:
+        await pubsub.aclose()
+
+
+def to_sse(event: Dict[str, Any]) -> str:
+    """Format one event as a Server-Sent Events frame."""
+    if event.get("event") == "heartbeat":
+        return ": heartbeat\n\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,363 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from opentelemetry import context as otel_context
+from opentelemetry import metrics, propagate, trace
+from opentelemetry.trace import Status, StatusCode
+
+# Spans and metrics for the plan pipeline: crew tasks, tool invocations, upstream HTTP
+# (host, status, bytes, cache hit), LLM calls (model, tokens, latency) and Celery queue wait.
+# Export is OTLP/HTTP when OTEL_EXPORTER_OTLP_ENDPOINT is set. With PROMETHEUS_PORT set, every
+# metric is also kept as a prometheus_client series; the scrape endpoint is started once per
+# service (API process, Celery parent) and, with PROMETHEUS_MULTIPROC_DIR set, aggregates the
+# series of all prefork children. With neither configured every instrument is a no-op.
+INSTRUMENTATION_NAME = "agentic_travel_planner"
+
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+
+class _Instrument:
+    """An OTel instrument plus its prometheus_client twin (None when Prometheus is off)."""
+
+    def __init__(self, otel, prom=None, labels: tuple = ()):
+        self._otel = otel
+        self._prom = prom
+        self._labels = labels
+
+    def _series(self, attributes: Optional[Dict[str, Any]]):
+        if not self._labels:
+            return self._prom
+        attributes = attributes or {}
+        return self._prom.labels(*(str(attributes.get(name, "")) for name in self._labels))
+
+    def add(self, amount: float, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self._otel.add(amount, attributes)
+        if self._prom is not None:
+            self._series(attributes).inc(amount)
+
+    def record(self, amount: float, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self._otel.record(amount, attributes)
+        if self._prom is not None:
+            self._series(attributes).observe(amount)
+
+
+_prom_metrics: Dict[str, Any] = {}
+_prom_lock = threading.Lock()
+
+
+def _prometheus_metric(kind: str, name: str, unit: str, description: str, labels: tuple):
+    """
+    prometheus_client series for an instrument, created once per process (a registry
+    rejects duplicates, and Telemetry may be rebuilt). None when PROMETHEUS_PORT is unset.
+    """
+    if not os.getenv("PROMETHEUS_PORT"):
+        return None
+    try:
+        from prometheus_client import Counter, Histogram
+    except ImportError:
+        return None
+    prom_name = name.replace(".", "_") + {"s": "_seconds", "By": "_bytes"}.get(unit, "")
+    with _prom_lock:
+        if prom_name not in _prom_metrics:
+            if kind == "counter":
+                _prom_metrics[prom_name] = Counter(prom_name, description, labels)
+            else:
+                buckets = DURATION_BUCKETS if unit == "s" else SIZE_BUCKETS
+                _prom_metrics[prom_name] = Histogram(prom_name, description, labels, buckets=buckets)
+        return _prom_metrics[prom_name]
+
+
+_prometheus_started = False
+
+
+def start_prometheus_server() -> None:
+    """
+    Serve /metrics on PROMETHEUS_PORT, once per process. Call it from the process that owns
+    the port (API startup, Celery parent), never from prefork children. With
+    PROMETHEUS_MULTIPROC_DIR set, the endpoint sums the series written by every child.
+    Failures only disable the scrape endpoint.
+    """
+    global _prometheus_started
+    port = os.getenv("PROMETHEUS_PORT")
+    if not port or _prometheus_started:
+        return
+    _prometheus_started = True
+    try:
+        from prometheus_client import REGISTRY, CollectorRegistry, start_http_server
+        from prometheus_client import multiprocess
+
+        registry = REGISTRY
+        multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        if multiproc_dir:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+        start_http_server(int(port), registry=registry)
+        print(f"[Telemetry] Prometheus metrics on :{port}/metrics" + (" (multiprocess)" if multiproc_dir else ""))
+    except Exception as e:
+        print(f"[Telemetry] Prometheus endpoint disabled: {e}")
+
+
+def reset_prometheus_multiproc_dir() -> None:
+    """Drop series files left by earlier runs; call in the parent before children start."""
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not multiproc_dir:
+        return
+    os.makedirs(multiproc_dir, exist_ok=True)
+    for name in os.listdir(multiproc_dir):
+        if name.endswith(".db"):
+            os.remove(os.path.join(multiproc_dir, name))
+
+
+def mark_prometheus_process_dead(pid: int) -> None:
+    if os.getenv("PROMETHEUS_PORT") and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(pid)
+
+
+class Telemetry:
+    def __init__(self, service_name: str = "agentic-travel-planner"):
+        self.service_name = service_name
+        self.enabled = False
+        self._tracer_provider = None
+        self._meter_provider = None
+        tracer: trace.Tracer = trace.NoOpTracer()
+        meter: metrics.Meter = metrics.NoOpMeter(INSTRUMENTATION_NAME)
+
+        otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+        if otlp_endpoint:
+            try:
+                tracer, meter = self._build_providers(otlp_endpoint)
+                self.enabled = True
+            except Exception as e:
+                print(f"[Telemetry] OTLP export disabled: {e}")
+
+        self.tracer = tracer
+        self._meter = meter
+        self.task_duration = self._histogram("atp.task.duration", "s", "Crew task wall time", ("task", "ok"))
+        self.tool_duration = self._histogram("atp.tool.duration", "s", "Tool invocation time", ("tool", "ok"))
+        self.tool_output_tokens = self._histogram("atp.tool.output_tokens", "{token}", "Tokens per tool result", ("tool", "format"))
+        self.http_duration = self._histogram("atp.http.duration", "s", "Upstream HTTP time (0 on cache hits)", ("host", "status", "cache"))
+        self.http_bytes = self._histogram("atp.http.response.size", "By", "Upstream response body size", ("host", "status", "cache"))
+        self.llm_duration = self._histogram("atp.llm.duration", "s", "LLM completion latency", ("model",))
+        self.llm_tokens = self._counter("atp.llm.tokens", "{token}", "LLM tokens by model and type", ("model", "type"))
+        self.llm_cache = self._counter("atp.llm.cache", "", "Agent LLM cache lookups by agent and result", ("agent", "model", "result"))
+        self.llm_route = self._counter("atp.llm.route", "", "Routed agent LLM calls by agent, model and outcome", ("agent", "model", "outcome"))
+        self.queue_wait = self._histogram("atp.plan.queue_wait", "s", "Celery enqueue to start", ())
+        self.plan_duration = self._histogram("atp.plan.duration", "s", "Worker time per plan", ("status",))
+        self.plan_requests = self._counter("atp.plan.requests", "", "POST /plan outcomes", ("outcome",))
+
+    def _histogram(self, name: str, unit: str, description: str, labels: tuple) -> _Instrument:
+        otel = self._meter.create_histogram(name, unit=unit, description=description)
+        return _Instrument(otel, _prometheus_metric("histogram", name, unit, description, labels), labels)
+
+    def _counter(self, name: str, unit: str, description: str, labels: tuple) -> _Instrument:
+        otel = self._meter.create_counter(name, unit=unit, description=description)
+        return _Instrument(otel, _prometheus_metric("counter", name, unit, description, labels), labels)
+
+    def _build_providers(self, otlp_endpoint: str):
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        resource = Resource.create({"service.name": self.service_name})
+        # Own providers rather than the global ones: crewai installs its own global
+        # tracer provider for its telemetry, and the two must not collide.
+        self._tracer_provider = TracerProvider(resource=resource)
+        self._tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._meter_provider = MeterProvider(
+            resource=resource, metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())]
+        )
+        return (
+            self._tracer_provider.get_tracer(INSTRUMENTATION_NAME),
+            self._meter_provider.get_meter(INSTRUMENTATION_NAME),
+        )
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[trace.Span]:
+        with self.tracer.start_as_current_span(name, attributes=_clean(attributes)) as span:
+            yield span
+
+    def record_http(self, url: str, status: Optional[int], nbytes: int, cache: str, elapsed: float) -> None:
+        attrs = {"host": urlparse(url).hostname or "", "status": status or 0, "cache": cache}
+        self.http_duration.record(elapsed, attrs)
+        if cache == "miss":
+            self.http_bytes.record(nbytes, attrs)
+
+    def shutdown(self) -> None:
+        for provider in (self._tracer_provider, self._meter_provider):
+            if provider is not None:
+                provider.shutdown()
+
+
+def _clean(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """OTel attributes must be primitives; drop None and stringify everything else."""
+    return {k: v if isinstance(v, (str, bool, int, float)) else str(v) for k, v in attributes.items() if v is not None}
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def setup_telemetry(service_name: str) -> Telemetry:
+    """Configure this process's telemetry (call after fork in workers) and hook the crew and LLM."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None or _telemetry.service_name != service_name:
+            if _telemetry is not None:
+                _telemetry.shutdown()
+            _telemetry = Telemetry(service_name)
+    instrument_crew()
+    instrument_llm()
+    return _telemetry
+
+
+def get_telemetry() -> Telemetry:
+    """Process-wide telemetry, configured from the environment on first use."""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = Telemetry(os.getenv("OTEL_SERVICE_NAME", "agentic-travel-planner"))
+    return _telemetry
+
+
+# --- Trace context across the Celery hop ---
+
+def inject_context() -> Dict[str, str]:
+    """W3C trace headers for the current span, to send with apply_async."""
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+def extract_context(headers: Optional[Dict[str, Any]]):
+    return propagate.extract({k: v for k, v in (headers or {}).items() if isinstance(v, str)})
+
+
+# --- Crew task and tool spans (crewai event bus) ---
+
+class _SpanStack(threading.local):
+    def __init__(self):
+        self.items: List[tuple] = []
+
+
+_task_spans = _SpanStack()
+_tool_spans = _SpanStack()
+_crew_instrumented = False
+
+
+def _push(stack: _SpanStack, name: str, **attributes: Any) -> None:
+    span = get_telemetry().tracer.start_span(name, attributes=_clean(attributes))
+    token = otel_context.attach(trace.set_span_in_context(span))
+    stack.items.append((span, token, time.perf_counter()))
+
+
+def _pop(stack: _SpanStack, error: Optional[str] = None) -> Optional[float]:
+    if not stack.items:
+        return None
+    span, token, started = stack.items.pop()
+    if error:
+        span.set_status(Status(StatusCode.ERROR, error[:200]))
+    otel_context.detach(token)
+    span.end()
+    return time.perf_counter() - started
+
+
+def instrument_crew() -> None:
+    """Open a span per crew task and per tool invocation; events fire on the executing thread."""
+    global _crew_instrumented
+    if _crew_instrumented:
+        return
+    _crew_instrumented = True
+
+    from crewai.events import crewai_event_bus
+    from crewai.events.types.task_events import TaskCompletedEvent, TaskFailedEvent, TaskStartedEvent
+    from crewai.events.types.tool_usage_events import ToolUsageErrorEvent, ToolUsageFinishedEvent, ToolUsageStartedEvent
+
+    @crewai_event_bus.on(TaskStartedEvent)
+    def _task_started(source, event):
+        name = getattr(event.task, "name", None) or "task"
+        _push(_task_spans, f"task {name}", task=name, agent=getattr(getattr(event.task, "agent", None), "role", None))
+
+    def _task_ended(event, error=None):
+        name = getattr(event.task, "name", None) or "task"
+        elapsed = _pop(_task_spans, error)
+        if elapsed is not None:
+            get_telemetry().task_duration.record(elapsed, {"task": name, "ok": error is None})
+
+    @crewai_event_bus.on(TaskCompletedEvent)
+    def _task_completed(source, event):
+        _task_ended(event)
+
+    @crewai_event_bus.on(TaskFailedEvent)
+    def _task_failed(source, event):
+        _task_ended(event, event.error or "failed")
+
+    @crewai_event_bus.on(ToolUsageStartedEvent)
+    def _tool_started(source, event):
+        _push(_tool_spans, f"tool {event.tool_name}", tool=event.tool_name, agent=event.agent_role)
+
+    def _tool_ended(event, error=None):
+        elapsed = _pop(_tool_spans, error)
+        if elapsed is not None:
+            get_telemetry().tool_duration.record(elapsed, {"tool": event.tool_name, "ok": error is None})
+
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def _tool_finished(source, event):
+        _tool_ended(event)
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def _tool_failed(source, event):
+        _tool_ended(event, str(event.error))
+
+
+# --- LLM spans (litellm) ---
+
+_llm_instrumented = False
+
+
+def instrument_llm() -> None:
+    """
+    Wrap litellm.completion (what crewai's LLM calls) with a span carrying model and token
+    usage. litellm callbacks can't be used: crewai replaces litellm.callbacks on every call.
+    """
+    global _llm_instrumented
+    if _llm_instrumented:
+        return
+    _llm_instrumented = True
+
+    import litellm
+
+    original = litellm.completion
+
+    def completion(*args, **params):
+        telemetry = get_telemetry()
+        model = params.get("model") or "unknown"
+        with telemetry.span("llm completion", model=model, stream=bool(params.get("stream"))) as span:
+            start = time.perf_counter()
+            response = original(*args, **params)
+            elapsed = time.perf_counter() - start
+            telemetry.llm_duration.record(elapsed, {"model": model})
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+                completion_tokens = int(getattr(usage, "completion_tokens", 0) or 0)
+                span.set_attribute("llm.prompt_tokens", prompt)
+                span.set_attribute("llm.completion_tokens", completion_tokens)
+                telemetry.llm_tokens.add(prompt, {"model": model, "type": "prompt"})
+                telemetry.llm_tokens.add(completion_tokens, {"model": model, "type": "completion"})
+            return response
+
+    litellm.completion = completion
@@ -1,11 +1,17 @@
 from .flight_search_tool import FlightSearchTool
 from .hotel_search_tool import HotelSearchTool
 from .activity_search_tool import ActivitySearchTool
+from .response_cache import ResponseCache, get_response_cache
+from .geocode_store import GeocodeStore, get_geocode_store, geocode_text
+from .airport_index import Airport, AirportIndex, get_airport_index, resolve_airport
 
 
 __all__ = [
     "FlightSearchTool", "HotelSearchTool", "ActivitySearchTool",
     "search_flights", "search_hotels", "search_activities", 
+    "ResponseCache", "get_response_cache",
+    "GeocodeStore", "get_geocode_store", "geocode_text",
+    "Airport", "AirportIndex", "get_airport_index", "resolve_airport",
 ]
 
 
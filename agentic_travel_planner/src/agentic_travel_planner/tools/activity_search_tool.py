@@ -1,10 +1,14 @@
 import os
-import requests
-import json
-from crewai.tools import BaseTool
-from typing import Type
+import httpx
+from datetime import date
+from typing import Optional, Type
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from .async_tool import AsyncSearchTool
+from .response_cache import acached_get_json
+from .geocode_store import ageocode_text
+from .output_format import TABLE_HINT, render
+from agentic_travel_planner.geo import haversine_matrix, travel_minutes
 
 load_dotenv()
 
@@ -31,29 +35,43 @@ class ActivitySearchToolInput(BaseModel):
         ...,
         description="Name or address of the main hotel (e.g. 'Treebo Sunheads, Panaji, Goa, India')."
     )
+    start_date: Optional[str] = Field(
+        default=None,
+        description="Trip start date (YYYY-MM-DD). With end_date, returns a ready day-by-day schedule."
+    )
+    end_date: Optional[str] = Field(
+        default=None,
+        description="Trip end date (YYYY-MM-DD)."
+    )
 
 
-class ActivitySearchTool(BaseTool):
+class ActivitySearchTool(AsyncSearchTool):
     name: str = "search_activities"
     description: str = (
         "Search for activities, restaurants, and points of interest near the user's hotel "
-        "that match their interests and fit within the remaining budget. Uses Geoapify."
+        "that match their interests and fit within the remaining budget. Uses Geoapify. "
+        "Given start_date and end_date it also picks and schedules the best set within budget "
+        "(scheduled_time, travel minutes from the hotel and final_remaining_budget are computed)."
+        + TABLE_HINT
     )
     args_schema: Type[BaseModel] = ActivitySearchToolInput
 
-    def _run(
+    async def _arun(
         self,
         updated_remaining_budget: str,
         interests: str,
         num_travelers: int = 1,
         group_category: str = "mixed",
-        hotel_location: str = ""
+        hotel_location: str = "",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
     ) -> str:
         """
         Use Geoapify to:
         1. Geocode the hotel_location -> lat/lon.
         2. Search for nearby places that match the interests.
-        3. Return a SMALL JSON list of candidate activities.
+        3. Return a SMALL JSON list of candidate activities, or, when trip dates are
+           given, the optimizer's budget-feasible day-by-day schedule.
 
         NOTE: This implementation avoids hardcoded coordinates, so results are
         actually near the hotel (e.g. Panaji, Goa) instead of some demo city.
@@ -70,66 +88,64 @@ class ActivitySearchTool(BaseTool):
             or os.getenv("GEOAPIFY_TOKEN")
         )
         if not api_key:
-            return json.dumps(
+            return render(
                 {
                     "status": "error",
                     "error": "Missing GEOAPIFY_API_KEY in environment.",
                 },
-                indent=2,
+                self.name,
             )
 
         if not hotel_location:
-            return json.dumps(
+            return render(
                 {
                     "status": "error",
                     "error": "hotel_location is required but was empty.",
                 },
-                indent=2,
+                self.name,
+            )
+
+        # Bad trip dates are the caller's input error, not an upstream failure.
+        try:
+            trip_start = date.fromisoformat(start_date) if start_date else None
+            trip_end = date.fromisoformat(end_date) if end_date else None
+        except (ValueError, TypeError):
+            return render(
+                {
+                    "status": "error",
+                    "error": f"Invalid trip dates start_date={start_date!r}, end_date={end_date!r}; expected YYYY-MM-DD.",
+                },
+                self.name,
+            )
+        if trip_start and trip_end and trip_end < trip_start:
+            return render(
+                {
+                    "status": "error",
+                    "error": f"end_date {end_date} is before start_date {start_date}.",
+                },
+                self.name,
             )
 
         # --- 2. Geocode hotel_location to get lat/lon (NO HARDCODED CITY) ---
         try:
-            geocode_url = "https://api.geoapify.com/v1/geocode/search"
-            geocode_params = {
-                "text": hotel_location,
-                "apiKey": api_key,
-                "limit": 1,
-            }
-            geo_resp = requests.get(geocode_url, params=geocode_params, timeout=20)
-            geo_resp.raise_for_status()
-            geo_data = geo_resp.json()
-            features = geo_data.get("features") or []
+            lat, lon = await ageocode_text(hotel_location, api_key)
 
-            if not features:
-                return json.dumps(
+            if lat is None or lon is None:
+                return render(
                     {
                         "status": "no_results",
                         "message": f"Could not geocode hotel location '{hotel_location}'.",
                         "coordinates_used": None,
                     },
-                    indent=2,
-                )
-
-            # Geoapify returns coordinates as [lon, lat]
-            coords = features[0].get("geometry", {}).get("coordinates", [None, None])
-            lon, lat = coords[0], coords[1]
-
-            if lon is None or lat is None:
-                return json.dumps(
-                    {
-                        "status": "error",
-                        "message": f"Geocoding returned invalid coordinates for '{hotel_location}'.",
-                        "coordinates_used": None,
-                    },
-                    indent=2,
+                    self.name,
                 )
         except Exception as e:
-            return json.dumps(
+            return render(
                 {
                     "status": "error",
                     "error": f"Geoapify geocoding failed: {str(e)}",
                 },
-                indent=2,
+                self.name,
             )
 
         # --- 3. Build category filter from 'interests' ---
@@ -168,40 +184,43 @@ class ActivitySearchTool(BaseTool):
             places_params = {
                 "apiKey": api_key,
                 "categories": categories_str,
-                "limit": 10,  # keep it small
+                "limit": 20,  # only the optimizer's picks are returned when dates are given
                 # proximity bias ensures results are around the hotel
                 "filter": f"circle:{lon},{lat},60000",
                 "bias": f"proximity:{lon},{lat}",
             }
-            places_resp = requests.get(places_url, params=places_params, timeout=20)
-            if places_resp.status_code != 200:
-                return json.dumps(
+            try:
+                places_data = await acached_get_json(places_url, params=places_params)
+            except httpx.HTTPStatusError as http_err:
+                places_resp = http_err.response
+                return render(
                     {
                         "status": "error",
                         "error": f"Geoapify Places search failed with status {places_resp.status_code}",
                         "details": places_resp.text,
-                        "request_url": places_resp.url,
+                        "request_url": str(places_resp.url),
                     },
-                    indent=2,
+                    self.name,
                 )
 
-            places_data = places_resp.json()
-
             features = places_data.get("features", [])
 
             if not features:
-                return json.dumps(
+                return render(
                     {
                         "status": "no_results",
                         "message": f"No activities found matching {interests} near {hotel_location}",
                         "coordinates_used": f"{lat},{lon}",
                     },
-                    indent=2,
+                    self.name,
                 )
 
             # --- 5. Build a compact list of activity candidates ---
+            # Imported here: the optimizer imports the crew models, and crew.py imports this tool.
+            from agentic_travel_planner.itinerary_optimizer import estimate_cost, load_rules, plan_itinerary
+
+            rules = load_rules()
             activities = []
-            estimated_cost_per_activity = 50.0  # simple placeholder
             cumulative_cost = 0.0
 
             for feat in features:
@@ -233,14 +252,15 @@ class ActivitySearchTool(BaseTool):
                 else:
                     category = raw_cats or "poi"
 
-                cumulative_cost += estimated_cost_per_activity
+                cost = estimate_cost(category, num_travelers, rules)
+                cumulative_cost += cost
 
                 activities.append(
                     {
                         "name": name,
                         "description": description or formatted,
                         "category": category,
-                        "cost": estimated_cost_per_activity,
+                        "cost": cost,
                         "location": formatted or description,
                         "latitude": lat2,
                         "longitude": lon2,
@@ -251,21 +271,54 @@ class ActivitySearchTool(BaseTool):
                     }
                 )
 
-                # Optional: stop if we would obviously exceed the budget
-                if budget_value is not None and cumulative_cost >= budget_value:
+                # Without dates there is no optimizer: stop once the budget is obviously spent
+                if not (start_date and end_date) and budget_value is not None and cumulative_cost >= budget_value:
                     break
 
             if not activities:
-                return json.dumps(
+                return render(
                     {
                         "status": "no_results",
                         "message": f"No activities found matching {interests} near {hotel_location}",
                         "coordinates_used": f"{lat},{lon}",
                     },
-                    indent=2,
+                    self.name,
+                )
+
+            # Hotel-to-place travel estimates for every candidate in one vectorized pass
+            located = [a for a in activities if a["latitude"] is not None and a["longitude"] is not None]
+            if located:
+                km = haversine_matrix([lat], [lon], [a["latitude"] for a in located], [a["longitude"] for a in located])[0]
+                for activity, minutes in zip(located, travel_minutes(km)):
+                    activity["estimated_travel_time_minutes"] = int(minutes)
+
+            if trip_start and trip_end and budget_value is not None:
+                plan = plan_itinerary(
+                    activities,
+                    hotel_lat=lat,
+                    hotel_lon=lon,
+                    start_date=trip_start,
+                    end_date=trip_end,
+                    budget=budget_value,
+                    interests=[i for i in interests.split(",") if i.strip()],
+                    num_travelers=num_travelers,
+                    rules=rules,
+                )
+                return render(
+                    {
+                        "status": "success",
+                        "mode": "scheduled",
+                        "hotel_anchor": {"name": hotel_location, "address": hotel_location, "latitude": lat, "longitude": lon},
+                        "activities": [a.model_dump(mode="json") for a in plan.activities],
+                        "total_activity_cost": plan.total_cost,
+                        "previous_remaining_budget": budget_value,
+                        "final_remaining_budget": plan.remaining_budget,
+                        "not_selected": plan.skipped,
+                    },
+                    self.name,
                 )
 
-            return json.dumps(
+            return render(
                 {
                     "status": "success",
                     "budget_context": (
@@ -279,16 +332,17 @@ class ActivitySearchTool(BaseTool):
                         "the user's interests, timings, and budget."
                     ),
                 },
-                indent=2,
+                self.name,
+                verbose_only=("instructions",),
             )
 
         except Exception as e:
-            return json.dumps(
+            return render(
                 {
                     "status": "error",
                     "error": f"Geoapify Places search failed: {str(e)}",
                 },
-                indent=2,
+                self.name,
             )
 
 #If you want to test this tool, uncomment the following lines
@@ -0,0 +1,238 @@
+import os
+import re
+import csv
+import bisect
+import difflib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .geocode_store import geocode_text, normalize_text
+from agentic_travel_planner.geo import haversine_matrix
+
+DEFAULT_DATASET = Path(__file__).parent.parent / "config" / "airports.csv"
+# Farthest airport accepted for a place that is not in the index (resolved by its geocode).
+MAX_AIRPORT_KM = float(os.getenv("AIRPORT_MAX_DISTANCE_KM", "250"))
+FUZZY_CUTOFF = float(os.getenv("AIRPORT_FUZZY_CUTOFF", "0.85"))
+MIN_PREFIX = 4
+
+_IATA = re.compile(r"^[A-Za-z]{3}$")
+# Key kinds, best first: a city or alias beats an airport name, which beats a code.
+CITY, NAME, CODE = 0, 1, 2
+# Common short forms of the dataset's country names, as they appear after a comma.
+COUNTRY_ALIASES = {
+    "uk": "united kingdom", "great britain": "united kingdom", "britain": "united kingdom",
+    "england": "united kingdom", "scotland": "united kingdom",
+    "us": "united states", "usa": "united states", "united states of america": "united states",
+    "uae": "united arab emirates", "holland": "netherlands", "the netherlands": "netherlands",
+    "czechia": "czech republic", "korea": "south korea", "republic of korea": "south korea",
+}
+
+
+@dataclass(frozen=True)
+class Airport:
+    iata: str
+    name: str
+    city: str
+    country: str
+    latitude: float
+    longitude: float
+
+
+class AirportIndex:
+    """
+    In-memory airport/city index over a bundled CSV (iata, name, city, country, latitude,
+    longitude, aliases). Normalized names live in one sorted array, so exact and prefix
+    lookups are a bisect; fuzzy matching and nearest-by-coordinates cover the rest.
+    """
+
+    def __init__(self, path: Path = DEFAULT_DATASET):
+        self.airports: List[Airport] = []
+        entries = []  # (key, kind, row)
+        with open(path, newline="", encoding="utf-8") as f:
+            for rec in csv.DictReader(f):
+                try:
+                    airport = Airport(
+                        iata=rec["iata"].strip().upper(),
+                        name=rec["name"].strip(),
+                        city=rec["city"].strip(),
+                        country=rec["country"].strip(),
+                        latitude=float(rec["latitude"]),
+                        longitude=float(rec["longitude"]),
+                    )
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    continue
+                row = len(self.airports)
+                self.airports.append(airport)
+                aliases = [a for a in (rec.get("aliases") or "").split("|") if a.strip()]
+                for text, kind in [(airport.city, CITY), *((a, CITY) for a in aliases), (airport.name, NAME), (airport.iata, CODE)]:
+                    key = normalize_text(text)
+                    if key:
+                        entries.append((key, kind, row))
+        entries.sort()
+        self._keys = [e[0] for e in entries]
+        self._entries = entries
+        # Fuzzy and prefix matching never consider codes: "Cork" is not a typo of COK.
+        self._names = sorted({key for key, kind, _ in entries if kind != CODE})
+        self._countries = {normalize_text(a.country) for a in self.airports}
+        self._lat = np.array([a.latitude for a in self.airports])
+        self._lon = np.array([a.longitude for a in self.airports])
+
+    def __len__(self) -> int:
+        return len(self.airports)
+
+    def _rows(self, key: str) -> List[int]:
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_right(self._keys, key)
+        return [row for _, _, row in self._entries[lo:hi]]
+
+    def country_named(self, key: str) -> Optional[str]:
+        """The dataset country a normalized part names ("uk" -> "united kingdom"), or None."""
+        country = COUNTRY_ALIASES.get(key, key)
+        return country if country in self._countries else None
+
+    def consistent(self, row: int, qualifiers: List[str]) -> bool:
+        """
+        Whether the parts after the matched one ("…, India", "…, Bali") fit this airport.
+        A named country must be the airport's. Without one, every part must be another name
+        of the same airport; an unknown region ("Paris, Texas") rejects the match, so the
+        caller falls back to geocoding.
+        """
+        country = normalize_text(self.airports[row].country)
+        countries = [c for c in map(self.country_named, qualifiers) if c]
+        if countries:
+            return all(q == country for q in countries)
+        return all(row in self._rows(q) for q in qualifiers)
+
+    def _best(self, matches: List[Tuple[str, int, int]], qualifiers: List[str]) -> Optional[Airport]:
+        """The better key kind, then file order, among matches consistent with the qualifiers."""
+        matches = [e for e in matches if self.consistent(e[2], qualifiers)]
+        if not matches:
+            return None
+        _, _, row = min(matches, key=lambda e: (e[1], e[2]))
+        return self.airports[row]
+
+    def exact(self, key: str, qualifiers: List[str] = ()) -> Optional[Airport]:
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_right(self._keys, key)
+        return self._best(self._entries[lo:hi], list(qualifiers))
+
+    def code(self, iata: str) -> Optional[Airport]:
+        key = iata.lower()
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_right(self._keys, key)
+        codes = [e for e in self._entries[lo:hi] if e[1] == CODE]
+        return self.airports[codes[0][2]] if codes else None
+
+    def prefix(self, key: str, qualifiers: List[str] = ()) -> Optional[Airport]:
+        """Shortest indexed name (not code) starting with `key` ("new del" -> New Delhi)."""
+        if len(key) < MIN_PREFIX:
+            return None
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_left(self._keys, key + "\uffff")
+        names = [e for e in self._entries[lo:hi] if e[1] != CODE]
+        if not names:
+            return None
+        shortest = min(len(e[0]) for e in names)
+        return self._best([e for e in names if len(e[0]) == shortest], list(qualifiers))
+
+    def fuzzy(self, key: str, qualifiers: List[str] = ()) -> Optional[Airport]:
+        """Closest indexed name (not code) by edit similarity (typos such as "Banglore")."""
+        if len(key) < MIN_PREFIX:
+            return None
+        close = difflib.get_close_matches(key, self._names, n=1, cutoff=FUZZY_CUTOFF)
+        if not close:
+            return None
+        return self._best([e for e in self._entries if e[0] == close[0] and e[1] != CODE], list(qualifiers))
+
+    def nearest(self, lat: float, lon: float, max_km: float = MAX_AIRPORT_KM) -> Optional[Tuple[Airport, float]]:
+        """Closest airport to a coordinate and its distance in km, if within max_km."""
+        if not self.airports:
+            return None
+        dist = haversine_matrix([lat], [lon], self._lat, self._lon)[0]
+        row = int(np.argmin(dist))
+        return (self.airports[row], float(dist[row])) if dist[row] <= max_km else None
+
+    def lookup(self, text: str) -> Optional[Airport]:
+        """
+        Resolve free text ("New Delhi, India", "BOM", "Bangalore") from the index alone.
+        An upper-case three-letter code is taken as IATA; otherwise each comma part is tried
+        as a city, alias or airport name, then the first part by prefix and fuzzy match.
+        A match must be consistent with the parts after it (see `consistent`); None means
+        the caller should geocode instead.
+        """
+        text = (text or "").strip()
+        if _IATA.match(text) and text.isupper():
+            airport = self.code(text)
+            if airport:
+                return airport
+        parts = [p for p in (normalize_text(p) for p in text.split(",")) if p]
+        if not parts:
+            return None
+        airport = self.exact(normalize_text(text))
+        if airport:
+            return airport
+        for i, key in enumerate(parts):
+            airport = self.exact(key, parts[i + 1:])
+            if airport:
+                return airport
+        return self.prefix(parts[0], parts[1:]) or self.fuzzy(parts[0], parts[1:])
+
+
+_index: Optional[AirportIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_airport_index() -> AirportIndex:
+    """Process-wide index of AIRPORTS_CSV (default: the bundled config/airports.csv)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AirportIndex(Path(os.getenv("AIRPORTS_CSV") or DEFAULT_DATASET))
+    return _index
+
+
+def resolve_airport(text: str, api_key: Optional[str] = None) -> Optional[Airport]:
+    """
+    Airport serving a place: the local index first, then the nearest indexed airport to the
+    place's geocode (geocode store, then Geoapify). None if nothing is close enough.
+    """
+    index = get_airport_index()
+    airport = index.lookup(text)
+    if airport or not (text or "").strip():
+        return airport
+    try:
+        lat, lon = geocode_text(text, api_key)
+    except Exception as e:
+        print(f"[AirportIndex] Geocode failed for '{text}': {e}")
+        return None
+    if lat is None:
+        return None
+    found = index.nearest(lat, lon)
+    if found:
+        print(f"[AirportIndex] '{text}' -> {found[0].iata} ({found[1]:.0f} km)")
+        return found[0]
+    return None
+
+
+def airport_code(text: str) -> Optional[str]:
+    """
+    IATA code for a tool argument: codes pass through, place names go through the index.
+    None when the place does not resolve; it must not be sent upstream as a made-up code.
+    """
+    text = (text or "").strip()
+    if _IATA.match(text) and text.isupper():
+        return text
+    airport = get_airport_index().lookup(text)
+    return airport.iata if airport else None
+
+
+def city_name(text: str) -> str:
+    """City part of a destination; an airport code ("BOM") becomes its city ("Mumbai")."""
+    base = (text or "").split(",")[0].strip()
+    airport = get_airport_index().code(base) if _IATA.match(base) and base.isupper() else None
+    return airport.city if airport else base
@@ -0,0 +1,158 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+import httpx
+from dotenv import load_dotenv
+
+from . import http_client
+
+load_dotenv()
+
+T = TypeVar("T")
+
+# One event loop thread per process owns the shared AsyncClient: connections are bound
+# to the loop that opened them, so every coroutine that touches the client runs there.
+# The limits cap concurrent sockets across all tools and plans in this process.
+MAX_CONNECTIONS = int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_ASYNC_MAX_KEEPALIVE", "16"))
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def _loop_thread() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="tool-async-http", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _submit(coro: Awaitable[T]) -> Future:
+    """
+    Schedule coro on the shared loop as a task that runs in the caller's context
+    (so tracing spans opened by the caller parent the HTTP spans).
+    """
+    loop = _loop_thread()
+    ctx = contextvars.copy_context()
+    result: Future = Future()
+
+    def _start():
+        task = ctx.run(loop.create_task, coro)
+
+        def _done(t: asyncio.Task):
+            if t.cancelled():
+                result.cancel()
+            elif t.exception() is not None:
+                result.set_exception(t.exception())
+            else:
+                result.set_result(t.result())
+
+        task.add_done_callback(_done)
+
+    loop.call_soon_threadsafe(_start)
+    return result
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Sync shim: run a coroutine on the shared loop and block until it finishes."""
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None and running is _loop:
+        raise RuntimeError("run_sync() called from the shared HTTP loop; await the coroutine instead")
+    return _submit(coro).result()
+
+
+async def on_shared_loop(coro: Awaitable[T]) -> T:
+    """Await coro on the shared loop from any event loop (e.g. asyncio.run in CrewAI's tool path)."""
+    if asyncio.get_running_loop() is _loop:
+        return await coro
+    return await asyncio.wrap_future(_submit(coro))
+
+
+def _get_client() -> httpx.AsyncClient:
+    """The process-wide client; only call from the shared loop."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def send(client: httpx.AsyncClient, request: httpx.Request, timeout: httpx.Timeout) -> httpx.Response:
+    """Single network round-trip (the seam offline record/replay patches)."""
+    return await client.send(request, extensions={"timeout": timeout.as_dict()})
+
+
+def _retry_delay(attempt: int, resp: Optional[httpx.Response]) -> float:
+    """Retry-After when the server sends one, else urllib3-style jittered exponential backoff."""
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return http_client.BACKOFF_FACTOR * (2 ** attempt) + random.uniform(0, http_client.BACKOFF_JITTER)
+
+
+async def _get(url: str, params: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]], timeout) -> httpx.Response:
+    client = _get_client()
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    request = client.build_request("GET", url, params=params, headers=headers)
+    limits = httpx.Timeout(read, connect=connect)
+    for attempt in range(http_client.MAX_RETRIES + 1):
+        last = attempt == http_client.MAX_RETRIES
+        try:
+            resp = await send(client, request, limits)
+        except httpx.TransportError:
+            if last:
+                raise
+            await asyncio.sleep(_retry_delay(attempt, None))
+            continue
+        if resp.status_code not in http_client.RETRY_STATUSES or last:
+            return resp
+        await asyncio.sleep(_retry_delay(attempt, resp))
+    return resp
+
+
+async def get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[http_client.Timeout] = None,
+) -> httpx.Response:
+    """
+    Async counterpart of http_client.get: pooled GET with jittered retries on 429/5xx and the
+    host's default timeout. The final 429/5xx is returned, not raised, as in the sync client.
+    """
+    timeout = timeout if timeout is not None else http_client.timeout_for(url)
+    return await on_shared_loop(_get(url, params, headers, timeout))
+
+
+def close_all() -> None:
+    """Close the shared client (e.g. on worker shutdown)."""
+    global _client
+    if _client is not None and _loop is not None:
+        client, _client = _client, None
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), _loop).result(timeout=5)
+        except Exception as e:
+            print(f"[AsyncHTTP] Close failed: {e}")
@@ -0,0 +1,28 @@
+from abc import ABC, abstractmethod
+from typing import Any
+
+from crewai.tools import BaseTool
+from crewai.tools.structured_tool import CrewStructuredTool
+
+from .async_http import run_sync
+
+
+class AsyncSearchTool(BaseTool, ABC):
+    """
+    BaseTool implemented by the coroutine _arun. Agents get _arun itself through the
+    structured tool (CrewAI awaits it in ainvoke and runs it to completion in invoke);
+    _run is the sync shim for direct callers such as tool.run() and scripts.
+    A subclass without _arun can't be instantiated.
+    """
+
+    @abstractmethod
+    async def _arun(self, *args: Any, **kwargs: Any) -> Any:
+        """The tool's implementation."""
+
+    def _run(self, *args: Any, **kwargs: Any) -> Any:
+        return run_sync(self._arun(*args, **kwargs))
+
+    def to_structured_tool(self) -> CrewStructuredTool:
+        structured_tool = super().to_structured_tool()
+        structured_tool.func = self._arun
+        return structured_tool
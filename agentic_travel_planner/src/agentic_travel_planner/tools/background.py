@@ -0,0 +1,33 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared pool for speculative upstream fetches (prefetching legs/candidates into the
+# response cache). Results are never returned to agents directly; the cache is the handoff.
+_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PREFETCH_WORKERS", "4")),
+    thread_name_prefix="tool-prefetch",
+)
+
+
+def prefetch_enabled() -> bool:
+    return os.getenv("PLANNER_PREFETCH", "1").lower() not in ("0", "false", "no")
+
+
+def submit_background(fn: Callable[..., Any], *args, label: str = "", **kwargs) -> Optional[Future]:
+    """Run fn in the prefetch pool; failures are logged and swallowed."""
+    if not prefetch_enabled():
+        return None
+
+    def _safe():
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            print(f"[Prefetch] {label or fn.__name__} failed: {e}")
+            return None
+
+    return _pool.submit(_safe)
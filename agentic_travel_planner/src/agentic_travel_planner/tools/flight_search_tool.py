@@ -1,26 +1,60 @@
 import os
-import requests
-import json
+import asyncio
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from crewai.tools import BaseTool
-from typing import Type, Optional, Dict, List
+from typing import Type, Optional, Dict, List, Tuple
 from pydantic import BaseModel, Field
+from .async_tool import AsyncSearchTool
+from .response_cache import cached_get_json, acached_get_json
+from .background import submit_background
+from .output_format import TABLE_HINT, render
+from .airport_index import airport_code
 
 load_dotenv()
 
+SEARCH_FLIGHTS_URL = "https://booking-com15.p.rapidapi.com/api/v1/flights/searchFlights"
+
+# Round-trip ranking: a pair outside a preferred window costs this fraction of its price.
+EARLY_MORNING_START, EARLY_MORNING_END = 5, 11
+LATE_NIGHT_START = 20
+TIME_PREFERENCE_WEIGHT = 0.10
+STOP_PENALTY = 0.05
+
+# Flexible-date calendar: widest +/- window, and parallel day searches per call. Each day is
+# one cached searchFlights request, paced by the RapidAPI host limiter (RAPIDAPI_MAX_RPS).
+FLEX_MAX_DAYS = int(os.getenv("FLIGHT_FLEX_MAX_DAYS", "3"))
+CALENDAR_CONCURRENCY = int(os.getenv("FLIGHT_CALENDAR_CONCURRENCY", "4"))
+
 class FlightSearchToolInput(BaseModel):
     """Input schema for Flight Search Tool."""
-    source: str = Field(..., description="Origin airport IATA Code (e.g., 'DEL').")
-    destination: str = Field(..., description="Destination airport IATA Code (e.g., 'BOM').")
+    source: str = Field(..., description="Origin airport IATA Code (e.g., 'DEL'); a city name is mapped to its main airport.")
+    destination: str = Field(..., description="Destination airport IATA Code (e.g., 'BOM'); a city name is mapped to its main airport.")
     start_date: str = Field(..., description="Departure date in YYYY-MM-DD format.")
-    end_date: Optional[str] = Field(None, description="Return date (Ignored for one-way).")
+    end_date: Optional[str] = Field(None, description="Return date (YYYY-MM-DD). Required when round_trip is true.")
     num_travelers: int = Field(default=1, description="Number of travelers.")
+    round_trip: bool = Field(
+        default=False,
+        description="If true, search both legs at once and return ready-made outbound+return pairs with total_price.",
+    )
+    max_budget: Optional[float] = Field(None, description="Round trip only: maximum total price for a pair.")
+    top_k: int = Field(default=3, description="Round trip only: number of best pairs to return.")
+    flex_days: int = Field(
+        default=0,
+        description="If > 0, search every departure (and return) date within +/- this many days "
+                    "and return a price calendar with the cheapest date combinations instead of flights.",
+    )
 
-class FlightSearchTool(BaseTool):
+class FlightSearchTool(AsyncSearchTool):
     name: str = "search_flights"
     description: str = (
         "Searches for flights and extracts dynamic details directly from the API response: "
-        "Airline Names, Flight Numbers, Timings, Duration, and Price."
+        "Airline Names, Flight Numbers, Timings, Duration, and Price. "
+        "With round_trip=true it searches both legs and returns pre-paired round trips "
+        "(prices already summed, ranked by budget and preferred times). "
+        "With flex_days=N it searches all dates within +/-N days in one call and returns a "
+        "price calendar (cheapest fare per departure x return date) and the cheapest date "
+        "combinations within max_budget."
+        + TABLE_HINT
     )
     args_schema: Type[BaseModel] = FlightSearchToolInput
 
@@ -42,104 +76,469 @@ class FlightSearchTool(BaseTool):
 
         return airline_map
 
-    def _run(
+    def _offers_request(
+        self, source: str, destination: str, depart_date: str, num_travelers: int, api_key: str
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        (params, headers) of the searchFlights request for one leg; city names are resolved
+        locally. Raises ValueError for a place that is not a known airport or city.
+        """
+        codes = {}
+        for place in (source, destination):
+            codes[place] = airport_code(place)
+            if codes[place] is None:
+                raise ValueError(f"Unknown airport '{place}'; pass the 3-letter IATA code of the airport serving it")
+        params = {
+            "fromId": f"{codes[source]}.AIRPORT",
+            "toId": f"{codes[destination]}.AIRPORT",
+            "departDate": depart_date,
+            "adults": str(num_travelers),
+            "currency": "USD",
+            "sortOrder": "BEST",
+        }
+
+        headers = {
+            "X-RapidAPI-Key": api_key,
+            "X-RapidAPI-Host": "booking-com15.p.rapidapi.com",
+        }
+        return params, headers
+
+    def _fetch_offers(self, source: str, destination: str, depart_date: str, num_travelers: int, api_key: str) -> dict:
+        """Raw searchFlights response for one leg (served from the response cache when warm)."""
+        params, headers = self._offers_request(source, destination, depart_date, num_travelers, api_key)
+        return cached_get_json(SEARCH_FLIGHTS_URL, params=params, headers=headers)
+
+    async def _afetch_offers(
+        self, source: str, destination: str, depart_date: str, num_travelers: int, api_key: str
+    ) -> dict:
+        """_fetch_offers on the shared async client."""
+        params, headers = self._offers_request(source, destination, depart_date, num_travelers, api_key)
+        return await acached_get_json(SEARCH_FLIGHTS_URL, params=params, headers=headers)
+
+    def prefetch(self, source: str, destination: str, start_date: str, end_date: Optional[str], num_travelers: int):
+        """Fetch outbound and return legs concurrently in the background to warm the cache."""
+        api_key = os.getenv("RAPIDAPI_KEY")
+        if not api_key:
+            return []
+        futures = [
+            submit_background(
+                self._fetch_offers, source, destination, start_date, num_travelers, api_key,
+                label=f"flights {source}->{destination} {start_date}",
+            )
+        ]
+        if end_date:
+            futures.append(
+                submit_background(
+                    self._fetch_offers, destination, source, end_date, num_travelers, api_key,
+                    label=f"flights {destination}->{source} {end_date}",
+                )
+            )
+        return [f for f in futures if f is not None]
+
+    def _parse_offers(self, raw_data: dict, limit: int = 10) -> List[Dict]:
+        """
+        Normalize up to `limit` searchFlights offers into per-offer dicts:
+        times, duration, numeric price, airline/flight number per leg and stops.
+        """
+        airline_map = self._build_airline_map(raw_data)
+
+        flight_offers = raw_data.get("data", {}).get("flightOffers", [])
+        parsed = []
+        
+        for offer in flight_offers[:limit]:
+            segments = offer.get("segments", [])
+            if not segments:
+                continue
+            departure_time = segments[0].get("departureTime")
+            arrival_time = segments[-1].get("arrivalTime")
+            
+            legs_info = []
+            
+            for seg in segments:
+                legs = seg.get("legs", [])
+                for leg in legs:
+                    flight_info = leg.get("flightInfo", {})
+                    carrier_code = flight_info.get("carrierInfo", {}).get("operatingCarrier")
+                    flight_number = flight_info.get("flightNumber")
+                    airline_name = airline_map.get(carrier_code)
+                    
+                    if not airline_name:
+                        carriers_data = leg.get("carriersData", [])
+                        for carrier in carriers_data:
+                            if carrier.get("code") == carrier_code:
+                                airline_name = carrier.get("name")
+                                
+                                if airline_name:
+                                    airline_map[carrier_code] = airline_name
+                                break
+                    
+                    if not airline_name:
+                        airline_name = carrier_code if carrier_code else "Unknown Airline"
+
+                    legs_info.append({
+                        "airline": airline_name,
+                        "carrier_code": carrier_code,
+                        "flight_number": str(flight_number) if flight_number else "Unknown",
+                    })
+
+            price_data = offer.get("priceBreakdown", {}).get("total", {})
+            units = price_data.get("units")
+            price = None
+            if units is not None:
+                price = float(units) + float(price_data.get("nanos") or 0) / 1e9
+            if price is not None and price <= 0:
+                # A zero total is a placeholder for an unpriced offer, not a free flight.
+                price = None
+            parsed.append({
+                "departure_time": departure_time,
+                "arrival_time": arrival_time,
+                "duration": offer.get("duration", "Unknown"), # Often available at root of offer
+                "price": price,
+                "currency": price_data.get("currencyCode"),
+                "legs": legs_info,
+            })
+        return parsed
+
+    async def _arun(
         self,
         source: str,
         destination: str,
         start_date: str,
         end_date: Optional[str] = None,
-        num_travelers: int = 1
+        num_travelers: int = 1,
+        round_trip: bool = False,
+        max_budget: Optional[float] = None,
+        top_k: int = 3,
+        flex_days: int = 0,
     ) -> str:
         
-        url = "https://booking-com15.p.rapidapi.com/api/v1/flights/searchFlights"
         api_key = os.getenv("RAPIDAPI_KEY")
 
         if not api_key:
-            return json.dumps({"status": "error", "error": "Missing RAPIDAPI_KEY"})
+            return render({"status": "error", "error": "Missing RAPIDAPI_KEY"}, self.name)
 
-        params = {
-            "fromId": f"{source}.AIRPORT",
-            "toId": f"{destination}.AIRPORT",
-            "departDate": start_date,
-            "adults": str(num_travelers),
-            "currency": "USD",
-            "sortOrder": "BEST",
-        }
+        unknown = [place for place in (source, destination) if airport_code(place) is None]
+        if unknown:
+            return render({
+                "status": "error",
+                "error": f"Unknown airport {unknown[0]!r}; pass the 3-letter IATA code of the airport serving it.",
+            }, self.name)
 
-        headers = {
-            "X-RapidAPI-Key": api_key,
-            "X-RapidAPI-Host": "booking-com15.p.rapidapi.com",
-        }
+        if flex_days and flex_days > 0:
+            return await self._run_calendar(
+                source, destination, start_date, end_date, num_travelers, max_budget, top_k,
+                min(flex_days, FLEX_MAX_DAYS), api_key,
+            )
 
-        try:
-            response = requests.get(url, headers=headers, params=params, timeout=30)
-            response.raise_for_status()
-            raw_data = response.json()
-            
-            airline_map = self._build_airline_map(raw_data)
+        if round_trip:
+            if not end_date:
+                return render({"status": "error", "error": "round_trip requires end_date"}, self.name)
+            return await self._run_round_trip(
+                source, destination, start_date, end_date, num_travelers, max_budget, top_k, api_key
+            )
+
+        # The agent searches the return leg right after this one; start it now so
+        # both legs are on the wire together and the second call is a cache hit.
+        if end_date and end_date != start_date:
+            submit_background(
+                self._fetch_offers, destination, source, end_date, num_travelers, api_key,
+                label=f"flights {destination}->{source} {end_date}",
+            )
 
-            flight_offers = raw_data.get("data", {}).get("flightOffers", [])
+        try:
+            raw_data = await self._afetch_offers(source, destination, start_date, num_travelers, api_key)
             detailed_results = []
-            
-            for offer in flight_offers[:10]:
-                segments = offer.get("segments", [])
-                if not segments:
-                    continue
-                departure_time = segments[0].get("departureTime")
-                arrival_time = segments[-1].get("arrivalTime")
-                
-                flight_details = []
-                
-                for seg in segments:
-                    legs = seg.get("legs", [])
-                    for leg in legs:
-                        flight_info = leg.get("flightInfo", {})
-                        carrier_code = flight_info.get("carrierInfo", {}).get("operatingCarrier")
-                        flight_number = flight_info.get("flightNumber")
-                        airline_name = airline_map.get(carrier_code)
-                        
-                        if not airline_name:
-                            carriers_data = leg.get("carriersData", [])
-                            for carrier in carriers_data:
-                                if carrier.get("code") == carrier_code:
-                                    airline_name = carrier.get("name")
-                                    
-                                    if airline_name:
-                                        airline_map[carrier_code] = airline_name
-                                    break
-                        
-                        if not airline_name:
-                            airline_name = carrier_code if carrier_code else "Unknown Airline"
-
-                        if not flight_number:
-                            flight_number = extract_flight_number(str(leg))
-
-                        flight_str = f"{airline_name} {carrier_code} {flight_number}"
-                        flight_details.append(flight_str)
-
-                price_data = offer.get("priceBreakdown", {}).get("total", {})
-                total_price = price_data.get("units")
-                currency = price_data.get("currencyCode")
+
+            # Upstream order, with unpriced offers moved after every priced one.
+            for offer in sorted(self._parse_offers(raw_data), key=lambda o: not _priced(o)):
+                flight_details = [
+                    f"{leg['airline']} {leg['carrier_code']} {leg['flight_number']}" for leg in offer["legs"]
+                ]
                 detailed_results.append({
-                    "departure_time": departure_time,
-                    "arrival_time": arrival_time,
-                    "duration": offer.get("duration", "Unknown"), # Often available at root of offer
-                    "total_price": f"{total_price} {currency}",
+                    "departure_time": offer["departure_time"],
+                    "arrival_time": offer["arrival_time"],
+                    "duration": offer["duration"],
+                    "total_price": f"{int(offer['price'])} {offer['currency']}" if _priced(offer) else "price unavailable",
                     "flight_segments": flight_details,
                     "stops": len(flight_details) - 1
                 })
 
             if not detailed_results:
-                return json.dumps({"status": "success", "message": "No flights found.", "data": []})
+                return render({"status": "success", "message": "No flights found.", "data": []}, self.name)
 
-            return json.dumps({
+            return render({
                 "status": "success", 
                 "data": detailed_results,
                 "count": len(detailed_results)
-            }, separators=(",", ":"))
+            }, self.name)
 
         except Exception as e:
-            return json.dumps({"status": "error", "error": str(e)})
+            return render({"status": "error", "error": str(e)}, self.name)
+
+    async def _run_round_trip(
+        self,
+        source: str,
+        destination: str,
+        start_date: str,
+        end_date: str,
+        num_travelers: int,
+        max_budget: Optional[float],
+        top_k: int,
+        api_key: str,
+    ) -> str:
+        """Fetch both legs concurrently and return the top-K priced, preference-scored pairs."""
+        try:
+            out_raw, ret_raw = await asyncio.gather(
+                self._afetch_offers(source, destination, start_date, num_travelers, api_key),
+                self._afetch_offers(destination, source, end_date, num_travelers, api_key),
+            )
+            outbound, inbound = self._parse_offers(out_raw), self._parse_offers(ret_raw)
+        except Exception as e:
+            return render({"status": "error", "error": str(e)}, self.name)
+
+        pairs = pair_round_trips(outbound, inbound, max_budget=max_budget, top_k=top_k)
+        if not pairs:
+            priced_out = [o["price"] for o in outbound if _priced(o)]
+            priced_ret = [r["price"] for r in inbound if _priced(r)]
+            cheapest = round(min(priced_out) + min(priced_ret), 2) if priced_out and priced_ret else None
+            return render({
+                "status": "no_results",
+                "message": "No valid round trip found within budget.",
+                "max_budget": max_budget,
+                "cheapest_possible_total": cheapest,
+                "outbound_options": len(outbound),
+                "return_options": len(inbound),
+            }, self.name)
+
+        return render({
+            "status": "success",
+            "mode": "round_trip",
+            "currency": outbound[0]["currency"] if outbound else None,
+            "pairs": pairs,
+            "count": len(pairs),
+        }, self.name)
+
+    async def _cheapest_by_date(
+        self, source: str, destination: str, dates: List[str], num_travelers: int, api_key: str
+    ) -> Dict[str, Optional[Dict]]:
+        """
+        Cheapest priced offer per departure date, searched concurrently.
+        Dates whose search failed map to None; dates with no priced offer are omitted.
+        """
+        slots = asyncio.Semaphore(max(1, CALENDAR_CONCURRENCY))
+
+        async def _one(day: str) -> Optional[Dict]:
+            async with slots:
+                raw = await self._afetch_offers(source, destination, day, num_travelers, api_key)
+            priced = [o for o in self._parse_offers(raw) if _priced(o)]
+            return min(priced, key=lambda o: o["price"]) if priced else {}
+
+        results = await asyncio.gather(*(_one(day) for day in dates), return_exceptions=True)
+        cheapest: Dict[str, Optional[Dict]] = {}
+        for day, offer in zip(dates, results):
+            if isinstance(offer, Exception):
+                print(f"[FlightSearchTool] Calendar search {source}->{destination} {day} failed: {offer}")
+                offer = None
+            if offer != {}:
+                cheapest[day] = offer
+        return cheapest
+
+    async def _run_calendar(
+        self,
+        source: str,
+        destination: str,
+        start_date: str,
+        end_date: Optional[str],
+        num_travelers: int,
+        max_budget: Optional[float],
+        top_k: int,
+        flex_days: int,
+        api_key: str,
+    ) -> str:
+        """
+        Price calendar over start_date +/- flex_days (and end_date +/- flex_days for returns):
+        one cached search per leg and day, run in parallel, reduced to the cheapest fare per
+        date and the cheapest departure x return combinations within max_budget.
+        """
+        try:
+            departures = flex_dates(start_date, flex_days)
+            returns = flex_dates(end_date, flex_days) if end_date else []
+        except ValueError as e:
+            return render({"status": "error", "error": f"Invalid date: {e}"}, self.name)
+
+        outbound, inbound = await asyncio.gather(
+            self._cheapest_by_date(source, destination, departures, num_travelers, api_key),
+            self._cheapest_by_date(destination, source, returns, num_travelers, api_key),
+        )
+
+        failed = {
+            "outbound": [day for day, offer in outbound.items() if offer is None],
+            "return": [day for day, offer in inbound.items() if offer is None],
+        }
+        outbound = {day: o for day, o in outbound.items() if o}
+        inbound = {day: o for day, o in inbound.items() if o}
+        currency = next((o["currency"] for o in [*outbound.values(), *inbound.values()] if o["currency"]), None)
+
+        if not end_date:
+            combos = sorted(
+                ({"depart": day, "total_price": round(o["price"], 2), "flight": _flight_label(o)}
+                 for day, o in outbound.items() if max_budget is None or o["price"] <= max_budget),
+                key=lambda c: c["total_price"],
+            )
+            return render({
+                "status": "success" if combos else "no_results",
+                "mode": "calendar",
+                "currency": currency,
+                "calendar": {"dates": departures, "prices": [_price(outbound.get(d)) for d in departures]},
+                "cheapest": combos[:max(1, top_k)],
+                "failed_dates": failed["outbound"],
+            }, self.name)
+
+        requested = (date.fromisoformat(start_date), date.fromisoformat(end_date))
+        min_nights = 0 if start_date == end_date else 1
+        matrix, combos = [], []
+        for dep in departures:
+            row = []
+            for ret in returns:
+                out, back = outbound.get(dep), inbound.get(ret)
+                nights = (date.fromisoformat(ret) - date.fromisoformat(dep)).days
+                if out is None or back is None or nights < min_nights:
+                    row.append(None)
+                    continue
+                total = round(out["price"] + back["price"], 2)
+                row.append(total)
+                if max_budget is None or total <= max_budget:
+                    combos.append({
+                        "depart": dep,
+                        "return": ret,
+                        "nights": nights,
+                        "total_price": total,
+                        "outbound_flight": _flight_label(out),
+                        "return_flight": _flight_label(back),
+                        "shift_days": [
+                            (date.fromisoformat(dep) - requested[0]).days,
+                            (date.fromisoformat(ret) - requested[1]).days,
+                        ],
+                    })
+            matrix.append(row)
+
+        combos.sort(key=lambda c: (c["total_price"], abs(c["shift_days"][0]) + abs(c["shift_days"][1])))
+        requested_total = matrix[departures.index(start_date)][returns.index(end_date)] \
+            if start_date in departures and end_date in returns else None
+        return render({
+            "status": "success" if combos else "no_results",
+            "mode": "calendar",
+            "currency": currency,
+            "requested_dates_total": requested_total,
+            # prices[i][j]: cheapest outbound on departure_dates[i] + cheapest return on return_dates[j]
+            "calendar": {"departure_dates": departures, "return_dates": returns, "prices": matrix},
+            "cheapest": combos[:max(1, top_k)],
+            "failed_dates": failed,
+        }, self.name)
+
+
+def flex_dates(center: str, flex_days: int) -> List[str]:
+    """ISO dates within +/- flex_days of center, skipping dates already in the past."""
+    middle = date.fromisoformat(center)
+    today = date.today()
+    days = (middle + timedelta(days=offset) for offset in range(-flex_days, flex_days + 1))
+    return [d.isoformat() for d in days if d >= today]
+
+
+def _priced(offer: Dict) -> bool:
+    return (offer.get("price") or 0) > 0
+
+
+def _price(offer: Optional[Dict]) -> Optional[float]:
+    return round(offer["price"], 2) if offer else None
+
+
+def _flight_label(offer: Dict) -> str:
+    """'IndiGo 6E123 06:05' style summary of an offer."""
+    legs = offer["legs"]
+    airline = legs[0]["airline"] if legs else "Unknown"
+    numbers = "/".join(f"{leg['carrier_code'] or ''}{leg['flight_number']}" for leg in legs) or "Unknown"
+    departs = _parse_time(offer["departure_time"])
+    return f"{airline} {numbers}" + (f" {departs:%H:%M}" if departs else "")
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _preference_penalty(out_departure: datetime, ret_departure: datetime, stops: int) -> float:
+    """
+    Relative penalty for the timing preferences in flight_research_task:
+    outbound departing early morning, return departing late night. Fewer stops preferred.
+    """
+    penalty = 0.0
+    if not (EARLY_MORNING_START <= out_departure.hour < EARLY_MORNING_END):
+        penalty += TIME_PREFERENCE_WEIGHT
+    if ret_departure.hour < LATE_NIGHT_START:
+        penalty += TIME_PREFERENCE_WEIGHT
+    return penalty + STOP_PENALTY * stops
+
+
+def _to_offer(out: Dict, ret: Dict, score: float) -> Dict:
+    """Shape an outbound x return pair like crew.FlightOffer."""
+    def _airline(legs):
+        return legs[0]["airline"] if legs else "Unknown"
+
+    def _numbers(legs):
+        return "/".join(f"{leg['carrier_code'] or ''}{leg['flight_number']}" for leg in legs) or "Unknown"
+
+    return {
+        "outbound_airline": _airline(out["legs"]),
+        "outbound_flight_number": _numbers(out["legs"]),
+        "outbound_departure_time": out["departure_time"],
+        "outbound_arrival_time": out["arrival_time"],
+        "outbound_price": round(out["price"], 2),
+        "outbound_stops": max(0, len(out["legs"]) - 1),
+        "return_airline": _airline(ret["legs"]),
+        "return_flight_number": _numbers(ret["legs"]),
+        "return_departure_time": ret["departure_time"],
+        "return_arrival_time": ret["arrival_time"],
+        "return_price": round(ret["price"], 2),
+        "return_stops": max(0, len(ret["legs"]) - 1),
+        "total_price": round(out["price"] + ret["price"], 2),
+        "score": round(score, 2),
+    }
+
+
+def pair_round_trips(
+    outbound: List[Dict],
+    inbound: List[Dict],
+    max_budget: Optional[float] = None,
+    top_k: int = 3,
+) -> List[Dict]:
+    """
+    Pair every outbound with every return offer, drop pairs over max_budget or where the
+    return departs before the outbound lands, and rank by price weighted by preferences.
+    """
+    scored = []
+    for out in outbound:
+        out_dep, out_arr = _parse_time(out["departure_time"]), _parse_time(out["arrival_time"])
+        if not _priced(out) or out_dep is None:
+            continue
+        for ret in inbound:
+            ret_dep = _parse_time(ret["departure_time"])
+            if not _priced(ret) or ret_dep is None:
+                continue
+            if out_arr is not None and ret_dep <= out_arr:
+                continue
+            total = out["price"] + ret["price"]
+            if max_budget is not None and total > max_budget:
+                continue
+            stops = max(0, len(out["legs"]) - 1) + max(0, len(ret["legs"]) - 1)
+            score = total * (1 + _preference_penalty(out_dep, ret_dep, stops))
+            scored.append((score, total, out, ret))
+
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [_to_offer(out, ret, score) for score, _, out, ret in scored[:max(1, top_k)]]
+
 
 # --- TEST EXECUTION ---
 # Modify the input parameters as needed
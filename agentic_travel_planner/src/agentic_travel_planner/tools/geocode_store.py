@@ -0,0 +1,253 @@
+import os
+import re
+import asyncio
+import csv
+import sys
+import time
+import sqlite3
+import difflib
+import threading
+import unicodedata
+from typing import Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from .response_cache import cached_get_json, acached_get_json
+
+load_dotenv()
+
+GEOCODE_URL = "https://api.geoapify.com/v1/geocode/search"
+DEFAULT_DB_PATH = os.path.join(".cache", "geocodes.sqlite3")
+# Similarity needed for a nearest-name hit. It only absorbs spelling and spacing
+# differences: names that differ in any number ("OYO 1234" / "OYO 1284",
+# "Residency" / "Residency 2") never match, however similar the rest is.
+FUZZY_CUTOFF = float(os.getenv("GEOCODE_FUZZY_CUTOFF", "0.95"))
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+LatLon = Tuple[Optional[float], Optional[float]]
+
+
+def _numbers(key: str) -> list:
+    """Tokens containing a digit (branch numbers, street numbers, postcodes)."""
+    return [t for t in key.split() if any(c.isdigit() for c in t)]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _NON_WORD.sub(" ", text.lower())
+    return " ".join(text.split())
+
+
+class GeocodeStore:
+    """
+    Persistent SQLite index of geocoded text -> (lat, lon), plus learned Booking.com
+    destinations (city text -> dest_id, search_type).
+    Keys are normalized query strings, so the same hotel/city text always resolves locally
+    after the first successful network lookup.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                " key TEXT PRIMARY KEY,"
+                " query TEXT NOT NULL,"
+                " lat REAL NOT NULL,"
+                " lon REAL NOT NULL,"
+                " source TEXT,"
+                " updated_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS destinations ("
+                " key TEXT PRIMARY KEY,"
+                " query TEXT NOT NULL,"
+                " dest_id TEXT NOT NULL,"
+                " search_type TEXT NOT NULL,"
+                " updated_at REAL)"
+            )
+            self._conn.commit()
+
+    def lookup(self, text: str, fuzzy: bool = True) -> LatLon:
+        """
+        Exact normalized match first, then the nearest stored name sharing the first word
+        and exactly the same numbers.
+        """
+        key = normalize_text(text)
+        if not key:
+            return None, None
+        with self._lock:
+            row = self._conn.execute("SELECT lat, lon FROM geocodes WHERE key = ?", (key,)).fetchone()
+            if row:
+                return row[0], row[1]
+            if not fuzzy:
+                return None, None
+            first = key.split(" ", 1)[0]
+            candidates = self._conn.execute(
+                "SELECT key, lat, lon FROM geocodes WHERE key >= ? AND key < ? LIMIT 500",
+                (first, first + "\uffff"),
+            ).fetchall()
+        numbers = _numbers(key)
+        best, best_ratio = None, FUZZY_CUTOFF
+        for cand_key, lat, lon in candidates:
+            if _numbers(cand_key) != numbers:
+                continue
+            ratio = difflib.SequenceMatcher(None, key, cand_key).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = (lat, lon), ratio
+        return best if best else (None, None)
+
+    def put(self, text: str, lat: float, lon: float, source: str = "geoapify") -> None:
+        key = normalize_text(text)
+        if not key or lat is None or lon is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocodes (key, query, lat, lon, source, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, float(lat), float(lon), source, time.time()),
+            )
+            self._conn.commit()
+
+    def put_many(self, rows: Iterable[Tuple[str, float, float]], source: str = "csv") -> int:
+        now = time.time()
+        batch = [
+            (normalize_text(text), text, float(lat), float(lon), source, now)
+            for text, lat, lon in rows
+            if normalize_text(text)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO geocodes (key, query, lat, lon, source, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            self._conn.commit()
+        return len(batch)
+
+    def lookup_destination(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """(dest_id, search_type) learned for this city text, or (None, None)."""
+        key = normalize_text(text)
+        with self._lock:
+            row = self._conn.execute("SELECT dest_id, search_type FROM destinations WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def put_destination(self, text: str, dest_id: str, search_type: str) -> None:
+        key = normalize_text(text)
+        if not key or not dest_id:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO destinations (key, query, dest_id, search_type, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (key, text, str(dest_id), search_type or "CITY", time.time()),
+            )
+            self._conn.commit()
+
+    def warm_from_csv(self, csv_path: str) -> int:
+        """
+        Bulk-load known properties. Expected columns: name, latitude, longitude and
+        optionally address and city; the key text is built the same way HotelSearchTool
+        builds its geocode query ("name, address, city").
+        """
+        rows = []
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for rec in csv.DictReader(f):
+                parts = [rec.get("name"), rec.get("address"), rec.get("city")]
+                text = ", ".join(p.strip() for p in parts if p and p.strip())
+                try:
+                    rows.append((text, float(rec["latitude"]), float(rec["longitude"])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return self.put_many(rows)
+
+    def clear(self) -> None:
+        """Drop every stored geocode and destination."""
+        with self._lock:
+            self._conn.execute("DELETE FROM geocodes")
+            self._conn.execute("DELETE FROM destinations")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+
+_store: Optional[GeocodeStore] = None
+_store_lock = threading.Lock()
+
+
+def get_geocode_store() -> GeocodeStore:
+    """Process-wide store at GEOCODE_DB_PATH (default .cache/geocodes.sqlite3)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = GeocodeStore(os.getenv("GEOCODE_DB_PATH", DEFAULT_DB_PATH))
+    return _store
+
+
+def geocode_text(text: str, api_key: Optional[str]) -> LatLon:
+    """
+    Shared geocode lookup for all tools: local store first, then Geoapify.
+    Successful network results are written back to the store.
+    Returns (lat, lon) or (None, None); network errors propagate to the caller.
+    """
+    store = get_geocode_store()
+    lat, lon = store.lookup(text)
+    if lat is not None:
+        return lat, lon
+    if not api_key:
+        return None, None
+
+    data = cached_get_json(GEOCODE_URL, params={"text": text, "limit": 1, "apiKey": api_key})
+    return _store_result(store, text, data)
+
+
+async def ageocode_text(text: str, api_key: Optional[str]) -> LatLon:
+    """
+    geocode_text for the async tool path. The store is synchronous SQLite behind a lock,
+    so its reads and writes run in a thread instead of stalling the shared event loop.
+    """
+    store = get_geocode_store()
+    lat, lon = await asyncio.to_thread(store.lookup, text)
+    if lat is not None:
+        return lat, lon
+    if not api_key:
+        return None, None
+
+    data = await acached_get_json(GEOCODE_URL, params={"text": text, "limit": 1, "apiKey": api_key})
+    return await asyncio.to_thread(_store_result, store, text, data)
+
+
+def _store_result(store: GeocodeStore, text: str, data: dict) -> LatLon:
+    """First Geoapify feature as (lat, lon), written back to the store."""
+    features = data.get("features") or []
+    if not features:
+        return None, None
+
+    # Geoapify returns coordinates as [lon, lat]
+    coords = features[0].get("geometry", {}).get("coordinates", [None, None])
+    lon, lat = coords[0], coords[1]
+    if lon is None or lat is None:
+        return None, None
+    store.put(text, lat, lon)
+    return lat, lon
+
+
+def main():
+    """Pre-warm the geocode store: python -m agentic_travel_planner.tools.geocode_store <file.csv>"""
+    if len(sys.argv) < 2:
+        print("Usage: warm_geocodes <properties.csv>")
+        sys.exit(1)
+    store = get_geocode_store()
+    count = store.warm_from_csv(sys.argv[1])
+    print(f"Loaded {count} geocodes into {store.path} ({len(store)} total).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 import os
-import json
-import time
-import requests
-from typing import Type, Dict, Any, List, Optional
+import asyncio
+from typing import Type, Dict, Any, AsyncIterator, List, Optional, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, validator
-from crewai.tools import BaseTool
+from .async_tool import AsyncSearchTool
+from .async_http import run_sync
+from .response_cache import acached_get_json
+from .geocode_store import ageocode_text, get_geocode_store
+from .airport_index import city_name
+from .background import submit_background
+from .output_format import TABLE_HINT, render
+from agentic_travel_planner.geo import haversine_matrix, mean_nearest_km
 
 load_dotenv()
 
@@ -17,6 +22,41 @@ DEFAULT_HEADERS = {
     "X-RapidAPI-Host": RAPID_HOST,
     "Content-Type": "application/json"
 }
+MAX_HOTELS = 5
+# With interests given, a few more candidates are geocoded and the MAX_HOTELS closest
+# to interest-matching places are returned.
+PROXIMITY_CANDIDATES = int(os.getenv("HOTEL_PROXIMITY_CANDIDATES", "8"))
+PROXIMITY_NEAREST_POIS = 5
+PROXIMITY_RADIUS_M = 20000
+PLACES_URL = "https://api.geoapify.com/v2/places"
+# Parallel Geoapify lookups per search; pacing is handled by the per-host rate limiter.
+GEOCODE_CONCURRENCY = int(os.getenv("HOTEL_GEOCODE_CONCURRENCY", "4"))
+
+# searchHotels pages (cheapest first) are read lazily, up to HOTEL_MAX_PAGES, and only
+# until the top candidates can no longer change. HOTEL_RANKING=value ranks by review score
+# per 100 currency units (discounted by distance to interest places); =price keeps the
+# cheapest-first order.
+MAX_PAGES = int(os.getenv("HOTEL_MAX_PAGES", "3"))
+RANKING = os.getenv("HOTEL_RANKING", "value").strip().lower()
+MIN_RATING = float(os.getenv("HOTEL_MIN_RATING", "0"))
+MIN_REVIEWS = int(os.getenv("HOTEL_MIN_REVIEWS", "0"))
+DISTANCE_SCALE_KM = float(os.getenv("HOTEL_DISTANCE_SCALE_KM", "5"))
+MAX_REVIEW_SCORE = 10.0
+UNRATED_SCORE = 6.0  # assumed for value ranking when Booking.com has no review score
+
+
+def value_score(hotel: Dict) -> float:
+    """Review score per 100 currency units of total price."""
+    rating = float(hotel.get("review_score") or UNRATED_SCORE)
+    return rating / max(hotel["price_total"], 0.01) * 100
+
+def _value_key(hotel: Dict) -> Tuple[bool, float]:
+    """Sort key for value ranking: located hotels first, then by distance-discounted value."""
+    km = hotel.get("distance_to_interest_km")
+    if km is None:
+        return True, -hotel["value_score"]
+    return False, -hotel["value_score"] / (1 + km / DISTANCE_SCALE_KM)
+
 
 class HotelSearchToolInput(BaseModel):
     destination: str = Field(..., description="Destination city (e.g., 'London', 'New York').")
@@ -24,13 +64,15 @@ class HotelSearchToolInput(BaseModel):
     end_date: str = Field(..., description="Check-out date YYYY-MM-DD.")
     num_travelers: int = Field(2, description="Number of travelers.")
     group_category: str = Field("Family", description="Group type.")
-    interests: str = Field("", description="Interests (metadata only).")
+    interests: str = Field("", description="Interests; hotels closest to matching places are ranked first.")
     updated_remaining_budget: Optional[float] = Field(None, description="Max total budget for hotel.")
     currency: str = Field(..., description="Currency.")
+    min_rating: Optional[float] = Field(None, description="Minimum review score (0-10).")
+    min_reviews: Optional[int] = Field(None, description="Minimum number of reviews.")
 
-class HotelSearchTool(BaseTool):
+class HotelSearchTool(AsyncSearchTool):
     name: str = "search_hotels"
-    description: str = "Search for hotels on Booking.com. Returns valid prices and details."
+    description: str = "Search for hotels on Booking.com. Returns valid prices and details." + TABLE_HINT
     args_schema: Type[BaseModel] = HotelSearchToolInput
 
     def _get_nested(self, d: Dict, *keys):
@@ -83,12 +125,13 @@ class HotelSearchTool(BaseTool):
             "price_total": float(price),
             "currency": currency,
             "review_score": score,
+            "review_count": prop.get("reviewCount") or prop.get("review_nr") or 0,
             "address": self._get_nested(prop, "location", "displayLocation") or "Address unavailable",
             "url": url,
         }
-    def _geocode_hotel(self, name: str, address: str, destination: str, api_key: str):
+    async def _geocode_hotel(self, name: str, address: str, destination: str, api_key: str):
         """
-        Use Geoapify Geocoding API to get lat/lon for a hotel.
+        Get lat/lon for a hotel from the local geocode store, falling back to Geoapify.
         Tries: full address → name + destination → destination as last fallback.
         Returns (lat, lon) or (None, None) if it fails.
         """
@@ -106,123 +149,288 @@ class HotelSearchTool(BaseTool):
         if not query_text:
             return None, None
 
-        url = "https://api.geoapify.com/v1/geocode/search"
-        params = {
-            "text": query_text,
-            "limit": 1,
-            "apiKey": api_key,
-        }
-
         try:
-            resp = requests.get(url, params=params, timeout=20)
-            resp.raise_for_status()
-            data = resp.json()
-            features = data.get("features") or []
-            if not features:
-                return None, None
-
-            coords = features[0].get("geometry", {}).get("coordinates", [None, None])
-            lon, lat = coords[0], coords[1]
-            if lon is None or lat is None:
-                return None, None
-            return lat, lon
+            return await ageocode_text(query_text, api_key)
         except Exception as e:
             print(f"[HotelSearchTool] Geocoding failed for '{query_text}': {e}")
             return None, None
 
-    def _run(self, **kwargs) -> str:
+    async def _interest_pois(self, destination: str, interests: str, api_key: Optional[str]) -> List[tuple]:
+        """(lat, lon) of places around the destination that match the traveller's interests."""
+        # Imported here: the optimizer imports the crew models, and crew.py imports this tool.
+        from agentic_travel_planner.itinerary_optimizer import categories_for_interests
+
+        categories = categories_for_interests(interests)
+        if not categories or not api_key:
+            return []
+        lat, lon = await ageocode_text(destination, api_key)
+        if lat is None or lon is None:
+            return []
+        data = await acached_get_json(PLACES_URL, params={
+            "apiKey": api_key,
+            "categories": ",".join(categories),
+            "filter": f"circle:{lon},{lat},{PROXIMITY_RADIUS_M}",
+            "bias": f"proximity:{lon},{lat}",
+            "limit": 50,
+        })
+        points = []
+        for feat in data.get("features", []):
+            coords = (feat.get("geometry") or {}).get("coordinates") or [None, None]
+            if coords[0] is not None and coords[1] is not None:
+                points.append((coords[1], coords[0]))
+        return points
+
+    def _fill_distances(self, hotels: List[Dict], pois: List[tuple]) -> None:
+        """
+        Fill distance_to_interest_km: mean distance to the nearest interest places, in one
+        vectorized hotel x POI haversine pass.
+        """
+        located = [h for h in hotels if h.get("latitude") is not None and h.get("longitude") is not None]
+        if not located or not pois:
+            return
+        dist = haversine_matrix(
+            [h["latitude"] for h in located], [h["longitude"] for h in located],
+            [p[0] for p in pois], [p[1] for p in pois],
+        )
+        for hotel, km in zip(located, mean_nearest_km(dist, PROXIMITY_NEAREST_POIS)):
+            hotel["distance_to_interest_km"] = round(float(km), 2)
+
+    def _rank(self, hotels: List[Dict]) -> List[Dict]:
+        """
+        value: value_score discounted by distance to interest places; when some hotels have
+        a distance, the ones that could not be located rank after all of them.
+        price: cheapest first.
+        """
+        if RANKING == "price":
+            return sorted(hotels, key=lambda h: h["price_total"])
+        return sorted(hotels, key=_value_key)
+
+    async def _geocode_hotels(self, hotels: List[Dict], destination: str, api_key: Optional[str]) -> None:
+        """Fill latitude/longitude on each hotel in place, geocoding them concurrently."""
+        if not hotels:
+            return
+
+        slots = asyncio.Semaphore(max(1, GEOCODE_CONCURRENCY))
+
+        async def _one(hotel: Dict):
+            async with slots:
+                return await self._geocode_hotel(
+                    name=hotel["name"],
+                    address=hotel["address"],
+                    destination=destination,
+                    api_key=api_key,
+                )
+
+        results = await asyncio.gather(*(_one(h) for h in hotels))
+        for hotel, (lat, lon) in zip(hotels, results):
+            hotel["latitude"] = lat
+            hotel["longitude"] = lon
+
+    async def _resolve_destination(self, base_city: str, headers: Dict[str, str]):
+        """
+        (dest_id, search_type) for a city, or (None, None) if unknown. A city is looked up
+        with Booking.com searchDestination once; the answer is kept in the geocode store
+        (SQLite, so it is read and written off the event loop).
+        """
+        store = get_geocode_store()
+        dest_id, search_type = await asyncio.to_thread(store.lookup_destination, base_city)
+        if dest_id:
+            return dest_id, search_type
+
+        dest_url = f"https://{RAPID_HOST}/api/v1/hotels/searchDestination"
+        dest_data = await acached_get_json(
+            dest_url,
+            headers=headers, 
+            params={"query": base_city}
+        )
+        
+        dest_list = dest_data.get("data") or dest_data.get("results") or []
+        if not dest_list:
+            return None, None
+        dest_id, search_type = dest_list[0].get("dest_id"), dest_list[0].get("search_type", "CITY")
+        await asyncio.to_thread(store.put_destination, base_city, dest_id, search_type)
+        return dest_id, search_type
+
+    async def _search_hotels(
+        self,
+        dest_id: str,
+        search_type: str,
+        start_date: str,
+        end_date: str,
+        num_travelers: int,
+        currency: str,
+        headers: Dict[str, str],
+        page: int = 1,
+    ) -> List[Dict]:
+        """One page of the raw searchHotels candidate list, cheapest first."""
+        search_url = f"https://{RAPID_HOST}/api/v1/hotels/searchHotels"
+        params = {
+            "dest_id": dest_id,
+            "search_type": search_type,
+            "arrival_date": start_date,
+            "departure_date": end_date,
+            "adults": str(num_travelers),
+            "currency_code": currency,
+            "sort": "price_low_to_high", # Get cheapest first to fit budget
+            "page_number": str(page),
+        }
+        
+        data = await acached_get_json(search_url, headers=headers, params=params)
+        
+        # Handle different root structures (data.hotels, or just results)
+        return data.get("data", {}).get("hotels") or data.get("result") or []
+
+    async def _hotel_pages(
+        self,
+        dest_id: str,
+        search_type: str,
+        inp: HotelSearchToolInput,
+        headers: Dict[str, str],
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Lazily fetch searchHotels pages; a page is only requested when the consumer asks for it.
+        A failed later page ends the stream; the first page's errors propagate.
+        """
+        for page in range(1, max(1, MAX_PAGES) + 1):
+            try:
+                items = await self._search_hotels(
+                    dest_id, search_type, inp.start_date, inp.end_date, inp.num_travelers, inp.currency, headers, page
+                )
+            except Exception as e:
+                if page == 1:
+                    raise
+                print(f"[HotelSearchTool] Page {page} failed, using earlier pages: {e}")
+                return
+            if not items:
+                return
+            yield items
+
+    async def _select_candidates(
+        self, pages: AsyncIterator[List[Dict]], inp: HotelSearchToolInput, pool_size: int, proximity: bool = False
+    ) -> Tuple[List[Dict], Dict[str, int]]:
+        """
+        Extract and cheap-filter (price, rating, review count) page by page and keep the
+        pool_size best by the configured ranking. Pages arrive cheapest first, so every later
+        hotel costs at least this page's highest price: reading stops once that is over budget,
+        or once no later hotel could enter the pool (its value is at most MAX_REVIEW_SCORE / that price).
+        With proximity value ranking the final order depends on distances not known yet, so
+        only the budget stops reading early.
+        """
+        budget = float(inp.updated_remaining_budget) if inp.updated_remaining_budget else None
+        min_rating = inp.min_rating if inp.min_rating is not None else MIN_RATING
+        min_reviews = inp.min_reviews if inp.min_reviews is not None else MIN_REVIEWS
+        kept: List[Dict] = []
+        stats = {"pages": 0, "scanned": 0}
+
+        async for items in pages:
+            stats["pages"] += 1
+            prices = []
+            for raw_item in items:
+                stats["scanned"] += 1
+                hotel = self._extract_hotel_data(raw_item, inp.currency)
+                if hotel is None:
+                    continue
+                prices.append(hotel["price_total"])
+                if budget is not None and hotel["price_total"] > budget:
+                    continue
+                if min_rating and float(hotel["review_score"] or 0) < min_rating:
+                    continue
+                if min_reviews and int(hotel["review_count"] or 0) < min_reviews:
+                    continue
+                hotel["value_score"] = round(value_score(hotel), 3)
+                kept.append(hotel)
+
+            if RANKING != "price":
+                kept.sort(key=lambda h: -h["value_score"])
+            if not prices:
+                break
+            floor = max(prices)
+            if budget is not None and floor > budget:
+                break
+            if len(kept) >= pool_size and (
+                RANKING == "price"
+                or (not proximity and kept[pool_size - 1]["value_score"] >= MAX_REVIEW_SCORE / max(floor, 0.01) * 100)
+            ):
+                break
+
+        return kept[:pool_size], stats
+
+    def prefetch(self, destination: str, start_date: str, end_date: str, num_travelers: int, currency: str):
+        """
+        Warm the response cache with the hotel candidate list in the background.
+        No budget is needed: the budget filter runs when the agent calls the tool.
+        """
+        api_key = os.getenv("RAPIDAPI_KEY")
+        if not api_key or not destination:
+            return None
+        headers = {**DEFAULT_HEADERS, "X-RapidAPI-Key": api_key}
+        base_city = city_name(destination)
+
+        async def _fetch():
+            dest_id, search_type = await self._resolve_destination(base_city, headers)
+            if dest_id:
+                await self._search_hotels(dest_id, search_type, start_date, end_date, num_travelers, currency, headers)
+
+        return submit_background(lambda: run_sync(_fetch()), label=f"hotels {base_city}")
+
+    async def _arun(self, **kwargs) -> str:
         inp = HotelSearchToolInput(**kwargs)
         api_key = os.getenv("RAPIDAPI_KEY")
         
         if not api_key:
-            return json.dumps({"error": "Missing RAPIDAPI_KEY"}, indent=2)
+            return render({"error": "Missing RAPIDAPI_KEY"}, self.name)
 
         headers = {**DEFAULT_HEADERS, "X-RapidAPI-Key": api_key}
         geoapify_key = os.getenv("GEOAPIFY_KEY") or os.getenv("GEOAPIFY_API_KEY")
         # --- Step 1: Get Destination ID ---
         try:
-            dest_url = f"https://{RAPID_HOST}/api/v1/hotels/searchDestination"
             raw_dest = inp.destination or ""
-            base_city = raw_dest.split(",")[0].strip() if raw_dest else raw_dest
-            dest_resp = requests.get(
-                dest_url,
-                headers=headers, 
-                params={"query": base_city},
-                timeout=20
-            )
-            dest_resp.raise_for_status()
-            dest_data = dest_resp.json()
-            
-            dest_list = dest_data.get("data") or dest_data.get("results") or []
-            if not dest_list:
-                return json.dumps({"error": f"City '{inp.destination}' not found."}, indent=2)
-            
-            dest_id = dest_list[0].get("dest_id")
-            search_type = dest_list[0].get("search_type", "CITY")
+            base_city = city_name(raw_dest) if raw_dest else raw_dest
+            dest_id, search_type = await self._resolve_destination(base_city, headers)
+            if not dest_id:
+                return render({"error": f"City '{inp.destination}' not found."}, self.name)
             
         except Exception as e:
-            return json.dumps(
-                {"error": f"Destination search failed for '{base_city}': {str(e)}"},
-                indent=2
-            )
+            return render({"error": f"Destination search failed for '{base_city}': {str(e)}"}, self.name)
 
         # --- Step 2: Search Hotels ---
         try:
-            search_url = f"https://{RAPID_HOST}/api/v1/hotels/searchHotels"
-            params = {
-                "dest_id": dest_id,
-                "search_type": search_type,
-                "arrival_date": inp.start_date,
-                "departure_date": inp.end_date,
-                "adults": str(inp.num_travelers),
-                "currency_code": inp.currency,
-                "sort": "price_low_to_high" # Get cheapest first to fit budget
-            }
-            
-            hotel_resp = requests.get(search_url, headers=headers, params=params)
-            hotel_resp.raise_for_status()
-            data = hotel_resp.json()
-            
-            # Handle different root structures (data.hotels, or just results)
-            raw_list = data.get("data", {}).get("hotels") or data.get("result") or []
-            time.sleep(1.1)
-            valid_hotels = []
-            for raw_item in raw_list:
-                clean_hotel = self._extract_hotel_data(raw_item, inp.currency)
-    
-                if clean_hotel:
-                    # 🔹 NEW: geocode hotel to get coordinates
-                    if geoapify_key:
-                        lat, lon = self._geocode_hotel(
-                            name=clean_hotel["name"],
-                            address=clean_hotel["address"],
-                            destination=inp.destination,
-                            api_key=geoapify_key,
-                        )
-                    else:
-                        lat, lon = None, None
-                    clean_hotel["latitude"] = lat
-                    clean_hotel["longitude"] = lon
-
-                    # Apply Budget Filter
-                    if inp.updated_remaining_budget:
-                        if clean_hotel["price_total"] > float(inp.updated_remaining_budget):
-                            continue  # Skip expensive hotels
-
-                    valid_hotels.append(clean_hotel)
-
-                if len(valid_hotels) >= 5:
-                    break
+            # Cheap work first: extract + filters over lazily fetched pages, so only the
+            # surviving top-N hotels ever cost a geocode round-trip.
+            rank = bool(inp.interests.strip() and geoapify_key)
+            limit = max(MAX_HOTELS, PROXIMITY_CANDIDATES) if rank else MAX_HOTELS
+            valid_hotels, stats = await self._select_candidates(
+                self._hotel_pages(dest_id, search_type, inp, headers), inp, limit, proximity=rank
+            )
+            print(
+                f"[HotelSearchTool] {stats['pages']} page(s), {stats['scanned']} scanned, "
+                f"{len(valid_hotels)} to geocode ({RANKING} ranking)"
+            )
+
+            if rank:
+                # Interest places are fetched while the hotels are being geocoded.
+                pois, _ = await asyncio.gather(
+                    self._interest_pois(inp.destination, inp.interests, geoapify_key),
+                    self._geocode_hotels(valid_hotels, inp.destination, geoapify_key),
+                    return_exceptions=True,
+                )
+                if isinstance(pois, Exception):
+                    print(f"[HotelSearchTool] Interest places lookup failed: {pois}")
+                    pois = []
+                self._fill_distances(valid_hotels, pois)
+            else:
+                await self._geocode_hotels(valid_hotels, inp.destination, geoapify_key)
+            valid_hotels = self._rank(valid_hotels)[:MAX_HOTELS]
 
             if not valid_hotels:
-                return json.dumps({
+                return render({
                     "status": "no_results",
                     "message": (
                         f"No hotels found in {inp.destination} "
                         f"under {inp.updated_remaining_budget} {inp.currency}"
                     ),
                     "debug_budget": inp.updated_remaining_budget
-                }, indent=2)
+                }, self.name)
 
             # --- Compute new remaining budget after choosing a hotel ---
             # We assume the *cheapest* returned hotel is the one that will be booked.
@@ -240,14 +448,14 @@ class HotelSearchTool(BaseTool):
                     # If anything weird happens, just fall back to the original value
                     new_remaining_budget = inp.updated_remaining_budget
 
-            return json.dumps({
+            return render({
                 "status": "success",
                 "hotels": valid_hotels,
                 "updated_remaining_budget": new_remaining_budget
-            }, indent=2)
+            }, self.name)
 
         except Exception as e:
-            return json.dumps({"error": f"Hotel search failed: {str(e)}"}, indent=2)
+            return render({"error": f"Hotel search failed: {str(e)}"}, self.name)
 
 #uncomment the code below to test the tool
 #run "python hotel_search_tool.py" in the terminal
@@ -0,0 +1,93 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+Timeout = Union[float, Tuple[float, float]]
+
+# (connect, read) timeouts per upstream host.
+HOST_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "booking-com15.p.rapidapi.com": (5.0, 30.0),
+    "api.geoapify.com": (5.0, 20.0),
+}
+DEFAULT_TIMEOUT: Tuple[float, float] = (5.0, 20.0)
+
+# Pool sizing: size HTTP_POOL_MAXSIZE to at least the number of threads that can
+# hit one host at once (Celery --concurrency x per-tool fan-out, e.g. hotel geocodes).
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+BACKOFF_JITTER = float(os.getenv("HTTP_BACKOFF_JITTER", "0.3"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_jitter=BACKOFF_JITTER,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        # Hand the final 429/5xx back to the caller so raise_for_status() reports it.
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session_for(url: str) -> requests.Session:
+    """Return the keep-alive session dedicated to the URL's host (created on first use)."""
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _build_session()
+            _sessions[host] = session
+    return session
+
+
+def timeout_for(url: str) -> Tuple[float, float]:
+    return HOST_TIMEOUTS.get(urlparse(url).netloc, DEFAULT_TIMEOUT)
+
+
+def get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[Timeout] = None,
+) -> requests.Response:
+    """Pooled GET with jittered retries on 429/5xx and the host's default timeout."""
+    return session_for(url).get(
+        url,
+        params=params,
+        headers=headers,
+        timeout=timeout if timeout is not None else timeout_for(url),
+    )
+
+
+def close_all() -> None:
+    """Close every pooled session (e.g. on worker shutdown)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,111 @@
+import os
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from agentic_travel_planner.telemetry import get_telemetry
+
+load_dotenv()
+
+# Tool results go straight back into the agent's prompt, so their size is paid on every
+# later LLM turn. The compact form drops nulls, rounds coordinates/prices and encodes
+# lists of records as a column table; TOOL_OUTPUT_FORMAT=verbose restores indented JSON.
+COORD_KEYS = {"lat", "lon", "latitude", "longitude"}
+COORD_DECIMALS = 4  # ~11 m, plenty for "near the hotel"
+NUMBER_DECIMALS = 2
+
+# Appended to tool descriptions so agents can read the table encoding.
+TABLE_HINT = (
+    " Lists in the result may be tables: 'cols' names the fields of each row in 'rows', "
+    "and 'shared' holds values common to every row."
+)
+
+_encoding = None
+
+
+def output_format() -> str:
+    return os.getenv("TOOL_OUTPUT_FORMAT", "compact").strip().lower()
+
+
+def count_tokens(text: str) -> int:
+    """Tokens as the agents' model counts them (cl100k/o200k via tiktoken), else ~4 chars/token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            model = os.getenv("MODEL", "gpt-4o").split("/")[-1]
+            try:
+                _encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text))
+
+
+def _round(key: Optional[str], value: float) -> float:
+    return round(value, COORD_DECIMALS if key in COORD_KEYS else NUMBER_DECIMALS)
+
+
+def compact(value: Any, key: Optional[str] = None) -> Any:
+    """Drop None/empty values, round floats and turn lists of dicts into tables."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            v = compact(v, k)
+            if v is None or v == "" or v == [] or v == {}:
+                continue
+            out[k] = v
+        return out
+    if isinstance(value, (list, tuple)):
+        if len(value) > 1 and all(isinstance(v, dict) for v in value):
+            return _table([compact(v) for v in value])
+        return [compact(v, key) for v in value]
+    if isinstance(value, float):
+        return _round(key, value)
+    return value
+
+
+def _table(rows: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    {"cols": [...], "rows": [[...], ...]} with columns that hold one value in every row
+    hoisted into "shared" (e.g. currency), so per-row keys and repeats are paid once.
+    """
+    cols: List[str] = []
+    for row in rows:
+        for k in row:
+            if k not in cols:
+                cols.append(k)
+
+    shared = {}
+    for col in list(cols):
+        values = [row.get(col) for row in rows]
+        if all(col in row for row in rows) and all(v == values[0] for v in values):
+            shared[col] = values[0]
+            cols.remove(col)
+
+    table: Dict[str, Any] = {"cols": cols, "rows": [[row.get(c) for c in cols] for row in rows]}
+    if shared:
+        table["shared"] = shared
+    return table
+
+
+def render(payload: Dict[str, Any], tool: str, verbose_only: Sequence[str] = ()) -> str:
+    """
+    Serialize a tool result in the configured format and log its token count.
+    Keys in verbose_only (e.g. restated instructions) are omitted from the compact form.
+    """
+    if output_format() == "verbose":
+        text = json.dumps(payload, indent=2, default=str)
+    else:
+        trimmed = {k: v for k, v in payload.items() if k not in verbose_only}
+        text = json.dumps(compact(trimmed), separators=(",", ":"), ensure_ascii=False, default=str)
+
+    tokens = count_tokens(text)
+    get_telemetry().tool_output_tokens.record(tokens, {"tool": tool, "format": output_format()})
+    print(f"[{tool}] Result: {tokens} tokens ({output_format()})")
+    return text
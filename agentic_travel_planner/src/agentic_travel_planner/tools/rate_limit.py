@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class RateLimiter:
+    """
+    Minimal thread-safe pacing limiter: callers are spaced at least 1/rate seconds apart.
+    A rate of 0 (or less) disables limiting.
+    """
+
+    def __init__(self, rate_per_sec: float):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Claim the next slot; returns how long the caller must wait for it."""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+    def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self) -> None:
+        """Like acquire, but waits without blocking the event loop. Shares slots with acquire."""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Host -> env var holding its requests-per-second budget, and the default budget.
+_HOST_LIMITS = {
+    "api.geoapify.com": ("GEOAPIFY_MAX_RPS", 5.0),
+    "booking-com15.p.rapidapi.com": ("RAPIDAPI_MAX_RPS", 0.0),
+}
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(url: str) -> Optional[RateLimiter]:
+    """Return the shared limiter for the URL's host, or None if the host is unlimited."""
+    host = urlparse(url).netloc
+    if host not in _HOST_LIMITS:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            env_var, default = _HOST_LIMITS[host]
+            limiter = RateLimiter(float(os.getenv(env_var, default)))
+            _limiters[host] = limiter
+    return limiter
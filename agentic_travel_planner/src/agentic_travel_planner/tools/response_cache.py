@@ -0,0 +1,376 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from . import http_client, async_http
+from .rate_limit import limiter_for
+from agentic_travel_planner.telemetry import get_telemetry
+
+load_dotenv()
+
+# Params that only authenticate the caller and must never become part of a cache key.
+_AUTH_PARAMS = {"apikey", "api_key", "key", "token"}
+
+# Per-endpoint TTLs (seconds), matched on the URL path suffix.
+# Prices move quickly, place/geocode data barely moves at all.
+DEFAULT_TTLS: Dict[str, int] = {
+    "/flights/searchFlights": 10 * 60,
+    "/hotels/searchHotels": 15 * 60,
+    "/hotels/searchDestination": 7 * 24 * 3600,
+    "/geocode/search": 30 * 24 * 3600,
+    "/v2/places": 24 * 3600,
+}
+FALLBACK_TTL = 5 * 60
+
+
+def ttl_for(url: str) -> int:
+    """Return the configured TTL for an endpoint URL."""
+    path = url.split("?", 1)[0]
+    for suffix, ttl in DEFAULT_TTLS.items():
+        if path.endswith(suffix):
+            return ttl
+    return FALLBACK_TTL
+
+
+def _normalize_value(value: Any) -> str:
+    text = " ".join(str(value).split())
+    return text.lower()
+
+
+def make_cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a stable key from endpoint + params.
+    Auth params are dropped, params are sorted and text is whitespace/case normalized,
+    so 'Goa ' and 'goa' hit the same entry.
+    """
+    endpoint = url.split("?", 1)[0].rstrip("/")
+    items = sorted(
+        (k, _normalize_value(v))
+        for k, v in (params or {}).items()
+        if v is not None and k.lower() not in _AUTH_PARAMS
+    )
+    raw = json.dumps([endpoint, items], separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCacheBackend:
+    """Thread-safe, size-bounded in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCacheBackend:
+    """
+    Shared tier on the same Redis the Celery worker uses, so cached responses
+    survive worker restarts and are shared between worker processes.
+    Redis failures are treated as misses; the cache must never break a tool call.
+    """
+
+    def __init__(self, redis_url: str, namespace: str = "atp:http"):
+        import redis
+
+        self.namespace = namespace
+        self._client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """The cached value and its remaining lifetime in seconds (None if it never expires)."""
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.get(self._key(key))
+            pipe.pttl(self._key(key))
+            raw, pttl = pipe.execute()
+        except Exception as e:
+            print(f"[ResponseCache] Redis get failed: {e}")
+            return None, None
+        if not raw:
+            return None, None
+        return json.loads(raw), (pttl / 1000 if pttl >= 0 else None)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        try:
+            self._client.set(self._key(key), json.dumps(value), ex=ttl)
+        except Exception as e:
+            print(f"[ResponseCache] Redis set failed: {e}")
+
+    def clear(self) -> None:
+        try:
+            for k in self._client.scan_iter(f"{self.namespace}:*"):
+                self._client.delete(k)
+        except Exception as e:
+            print(f"[ResponseCache] Redis clear failed: {e}")
+
+
+class ResponseCache:
+    """
+    Two-tier JSON response cache: local LRU first, then the optional shared tier.
+    Shared-tier hits are promoted into the local LRU for the entry's remaining Redis
+    lifetime, capped by the endpoint's TTL.
+    """
+
+    def __init__(self, local: LRUCacheBackend, shared: Optional[RedisCacheBackend] = None, enabled: bool = True):
+        self.local = local
+        self.shared = shared
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, key: str, max_ttl: int = FALLBACK_TTL) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        value = self.local.get(key)
+        if value is not None:
+            self._count(hit=True)
+            return value
+        if self.shared is not None:
+            value, remaining = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value, max_ttl if remaining is None else min(remaining, max_ttl))
+                self._count(hit=True, shared=True)
+                return value
+        self._count(hit=False)
+        return None
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        if not self.enabled or ttl <= 0:
+            return
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def clear(self) -> None:
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def _count(self, hit: bool, shared: bool = False) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+                if shared:
+                    self.shared_hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "local_entries": len(self.local),
+            "evictions": self.local.evictions,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Process-wide cache configured from the environment:
+    - TOOL_CACHE_ENABLED (default "1")
+    - TOOL_CACHE_MAX_ENTRIES (default 1024)
+    - TOOL_CACHE_REDIS_URL (defaults to REDIS_URL; set it empty to disable the shared tier)
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                enabled = os.getenv("TOOL_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+                local = LRUCacheBackend(int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024")))
+                redis_url = os.getenv("TOOL_CACHE_REDIS_URL", os.getenv("REDIS_URL", ""))
+                shared = None
+                if enabled and redis_url:
+                    try:
+                        shared = RedisCacheBackend(redis_url)
+                    except Exception as e:
+                        print(f"[ResponseCache] Redis tier disabled: {e}")
+                _cache = ResponseCache(local, shared, enabled=enabled)
+    return _cache
+
+
+class _Flight:
+    """One upstream call in progress; followers get its result directly, cached or not."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Any] = None
+
+
+_inflight: Dict[str, _Flight] = {}
+_inflight_lock = threading.Lock()
+INFLIGHT_WAIT_SECONDS = 60
+
+
+def cached_get_json(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[http_client.Timeout] = None,
+    ttl: Optional[int] = None,
+) -> Any:
+    """
+    GET a JSON endpoint through the response cache.
+    Only successful responses are cached; HTTP errors raise requests.HTTPError as before.
+    Concurrent identical misses are coalesced onto one upstream call.
+    Cache misses are paced by the per-host rate limiter and go through the pooled
+    http_client session (per-host timeout unless one is given); hits are never throttled.
+    """
+    telemetry = get_telemetry()
+    cache = get_response_cache()
+    key = make_cache_key(url, params)
+    cached = cache.get(key, ttl if ttl is not None else ttl_for(url))
+    if cached is not None:
+        telemetry.record_http(url, None, 0, "hit", 0.0)
+        return cached
+
+    # Single-flight: if the same request is already on the wire (e.g. a background
+    # prefetch), wait for it and take its result instead of issuing a duplicate upstream
+    # call. The result is handed over directly, so this holds even with the cache off.
+    flight, leader = _join_inflight(key)
+    if not leader:
+        start = time.perf_counter()
+        flight.done.wait(timeout=INFLIGHT_WAIT_SECONDS)
+        cached = flight.result
+        if cached is not None:
+            telemetry.record_http(url, None, 0, "coalesced", time.perf_counter() - start)
+            return cached
+
+    try:
+        with telemetry.span("http GET", **{"http.url": url.split("?", 1)[0], "cache": "miss"}) as span:
+            limiter = limiter_for(url)
+            if limiter is not None:
+                limiter.acquire()
+            start = time.perf_counter()
+            resp = http_client.get(url, params=params, headers=headers, timeout=timeout)
+            elapsed = time.perf_counter() - start
+            span.set_attribute("http.status_code", resp.status_code)
+            span.set_attribute("http.response_bytes", len(resp.content))
+            telemetry.record_http(url, resp.status_code, len(resp.content), "miss", elapsed)
+            resp.raise_for_status()
+            data = resp.json()
+            cache.set(key, data, ttl if ttl is not None else ttl_for(url))
+            if leader:
+                flight.result = data
+            return data
+    finally:
+        if leader:
+            _leave_inflight(key, flight)
+
+
+def _join_inflight(key: str) -> Tuple[_Flight, bool]:
+    """The in-flight call for key, and whether this caller leads (makes the upstream call)."""
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    return flight, leader
+
+
+def _leave_inflight(key: str, flight: _Flight) -> None:
+    with _inflight_lock:
+        _inflight.pop(key, None)
+    flight.done.set()
+
+
+async def _cache_call(cache: ResponseCache, fn, *args) -> Any:
+    """Calls that may reach the Redis tier block on the network, so they run off the event loop."""
+    if cache.shared is None or not cache.enabled:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+async def acached_get_json(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[http_client.Timeout] = None,
+    ttl: Optional[int] = None,
+) -> Any:
+    """
+    Async cached_get_json over the shared httpx client (async_http). Same cache, keys,
+    single-flight table and rate limiters as the sync path, so sync prefetches and async
+    tool calls coalesce with each other. HTTP errors raise httpx.HTTPStatusError.
+    """
+    telemetry = get_telemetry()
+    cache = get_response_cache()
+    key = make_cache_key(url, params)
+    cached = await _cache_call(cache, cache.get, key, ttl if ttl is not None else ttl_for(url))
+    if cached is not None:
+        telemetry.record_http(url, None, 0, "hit", 0.0)
+        return cached
+
+    flight, leader = _join_inflight(key)
+    if not leader:
+        start = time.perf_counter()
+        await asyncio.to_thread(flight.done.wait, INFLIGHT_WAIT_SECONDS)
+        cached = flight.result
+        if cached is not None:
+            telemetry.record_http(url, None, 0, "coalesced", time.perf_counter() - start)
+            return cached
+
+    try:
+        with telemetry.span("http GET", **{"http.url": url.split("?", 1)[0], "cache": "miss"}) as span:
+            limiter = limiter_for(url)
+            if limiter is not None:
+                await limiter.aacquire()
+            start = time.perf_counter()
+            resp = await async_http.get(url, params=params, headers=headers, timeout=timeout)
+            elapsed = time.perf_counter() - start
+            span.set_attribute("http.status_code", resp.status_code)
+            span.set_attribute("http.response_bytes", len(resp.content))
+            telemetry.record_http(url, resp.status_code, len(resp.content), "miss", elapsed)
+            resp.raise_for_status()
+            data = resp.json()
+            await _cache_call(cache, cache.set, key, data, ttl if ttl is not None else ttl_for(url))
+            if leader:
+                flight.result = data
+            return data
+    finally:
+        if leader:
+            _leave_inflight(key, flight)
@@ -1,12 +1,33 @@
 import os
+import threading
+import time
+from concurrent.futures import wait
+import redis
 from celery import Celery
-from agentic_travel_planner.crew import AgenticTravelPlanner
+from billiard.einfo import ExceptionWithTraceback
+from billiard.exceptions import WorkerLostError
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from celery.worker.request import Request
+from kombu import Queue
+from agentic_travel_planner.crew import AgenticTravelPlanner, find_task, prefetch_upstream
+from agentic_travel_planner.tools import http_client, async_http
+from agentic_travel_planner.llm_cache import bypassed
+from agentic_travel_planner.model_router import get_model_router, model_policy as routing_policy
+from agentic_travel_planner.plan_cache import PlanCache, is_cacheable
+from agentic_travel_planner.progress import ProgressPublisher, mark_failed
+from agentic_travel_planner.telemetry import (
+    extract_context, mark_prometheus_process_dead, reset_prometheus_multiproc_dir, setup_telemetry, start_prometheus_server,
+)
+
+WORKER_SERVICE_NAME = "atp-worker"
+# Longest a batch waits for its shared upstream warm-up before the member plans start.
+BATCH_WARM_TIMEOUT = float(os.getenv("BATCH_WARM_TIMEOUT", "60"))
 
 # 1. Setup Celery to talk to Redis
 # We use 'redis' as the default hostname because that is the standard Docker service name.
 # Use 'localhost' only if running manually without Docker.
-# redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
-redis_url = "redis://redis:6379/0"
+redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
 celery_app = Celery(
     "travel_tasks",
@@ -14,25 +35,265 @@ celery_app = Celery(
     backend=redis_url 
 )
 
+# --- Queues, priorities and limits ---
+# Interactive POST /plan requests and /plan/batch members go to separate queues. Workers
+# read the interactive queue first, so a batch burst never sits in front of a user; within
+# a queue, lower priority numbers run first (Redis transport: 0 is highest).
+INTERACTIVE_QUEUE = os.getenv("PLAN_QUEUE_INTERACTIVE", "plans.interactive")
+BATCH_QUEUE = os.getenv("PLAN_QUEUE_BATCH", "plans.batch")
+INTERACTIVE_PRIORITY = 0
+BATCH_PRIORITY = 6
+# A plan normally takes 60-90 s. The soft limit fails the run cleanly (progress 'failed',
+# in-flight claim released); the hard limit kills a stuck process and frees its slot.
+PLAN_SOFT_TIME_LIMIT = int(os.getenv("PLAN_SOFT_TIME_LIMIT", "240"))
+PLAN_TIME_LIMIT = int(os.getenv("PLAN_TIME_LIMIT", "300"))
+# Each task holds a process for minutes, so a worker reserves only the task it is running:
+# extra prefetched tasks would wait behind it while other workers sit idle.
+WORKER_PREFETCH_MULTIPLIER = int(os.getenv("WORKER_PREFETCH_MULTIPLIER", "1"))
+WORKER_CONCURRENCY = os.getenv("WORKER_CONCURRENCY")
+
 # 2. Force Update Configuration 
 # This ensures the backend is definitely enabled and handles startup timing
 celery_app.conf.update(
     result_backend=redis_url,
     task_track_started=True,
-    broker_connection_retry_on_startup=True
+    broker_connection_retry_on_startup=True,
+    task_queues=(Queue(INTERACTIVE_QUEUE), Queue(BATCH_QUEUE)),
+    task_default_queue=INTERACTIVE_QUEUE,
+    task_default_priority=INTERACTIVE_PRIORITY,
+    task_routes={"warm_batch_task": {"queue": BATCH_QUEUE}},
+    worker_prefetch_multiplier=WORKER_PREFETCH_MULTIPLIER,
+    # Acknowledge after the run, so a task whose whole worker dies (deploy, lost node) is
+    # redelivered after the visibility timeout. A prefork child killed by the hard time
+    # limit or a crash is acknowledged and failed instead (PlanRequest), not retried.
+    task_acks_late=True,
+    broker_transport_options={
+        "queue_order_strategy": "priority",
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        # Unacked tasks are redelivered after this; it must outlast the longest run.
+        "visibility_timeout": PLAN_TIME_LIMIT + 60,
+    },
 )
+if WORKER_CONCURRENCY:
+    celery_app.conf.worker_concurrency = int(WORKER_CONCURRENCY)
+
+redis_client = redis.Redis.from_url(redis_url)
+
+# Completed-plan cache and in-flight dedup, shared with the API
+plan_cache = PlanCache(redis_client)
+
+# --- Crew template (built once per worker process) ---
+# Parsing agents.yaml/tasks.yaml and building agents, tools and LLM clients is done once;
+# every task then runs on a cheap clone (AgenticTravelPlanner.fresh_crew).
+_planner = None
+_planner_lock = threading.Lock()
+_overhead = {"template_build_ms": None, "runs": 0, "clone_ms_total": 0.0}
+
+def get_planner() -> AgenticTravelPlanner:
+    global _planner
+    if _planner is None:
+        with _planner_lock:
+            if _planner is None:
+                start = time.perf_counter()
+                planner = AgenticTravelPlanner()
+                planner.crew()
+                _overhead["template_build_ms"] = (time.perf_counter() - start) * 1000
+                print(f"[Worker] Crew template built in {_overhead['template_build_ms']:.0f} ms")
+                _planner = planner
+    return _planner
+
+def crew_overhead_report() -> dict:
+    """Startup vs per-task crew construction cost for this process."""
+    runs = _overhead["runs"]
+    return {
+        "template_build_ms": _overhead["template_build_ms"],
+        "runs": runs,
+        "avg_clone_ms": round(_overhead["clone_ms_total"] / runs, 1) if runs else None,
+    }
+
+@worker_init.connect
+def serve_worker_metrics(**kwargs):
+    """
+    The Celery parent owns PROMETHEUS_PORT; prefork children only write their series to
+    PROMETHEUS_MULTIPROC_DIR, which the parent's endpoint aggregates.
+    """
+    if os.getenv("PROMETHEUS_PORT") and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        print("[Worker] PROMETHEUS_PORT is set without PROMETHEUS_MULTIPROC_DIR; prefork children's metrics won't be scraped")
+    reset_prometheus_multiproc_dir()
+    start_prometheus_server()
+
+@worker_process_init.connect
+def build_crew_template(**kwargs):
+    """Set up telemetry and build the crew template when a prefork child starts, before it takes tasks."""
+    setup_telemetry(WORKER_SERVICE_NAME)
+    get_planner()
 
-@celery_app.task(bind=True, name="generate_plan_task")
-def generate_plan_task(self, inputs: dict):
+@worker_process_shutdown.connect
+def close_http_sessions(**kwargs):
+    """Release pooled upstream connections when a worker process exits."""
+    http_client.close_all()
+    async_http.close_all()
+    mark_prometheus_process_dead(os.getpid())
+
+class PlanRequest(Request):
+    """
+    Worker-parent side of a plan task. When the pool kills the child (hard time limit) or
+    the child dies, the task's own finally never runs, so the parent publishes 'failed'
+    and releases the in-flight claim instead.
+    """
+
+    def on_timeout(self, soft, timeout):
+        super().on_timeout(soft, timeout)
+        if not soft:
+            self._abandon(f"Plan generation exceeded the {timeout}s hard time limit")
+
+    def on_failure(self, exc_info, send_failed_event=True, return_ok=False):
+        super().on_failure(exc_info, send_failed_event=send_failed_event, return_ok=return_ok)
+        exc = exc_info.exception
+        exc = exc.exc if isinstance(exc, ExceptionWithTraceback) else exc
+        if isinstance(exc, WorkerLostError):
+            self._abandon(f"Worker process lost: {exc}")
+
+    def _abandon(self, error: str):
+        print(f"[Worker] Task {self.id} abandoned: {error}")
+        mark_failed(redis_client, self.id, error)
+        fingerprint = (self.kwargs or {}).get("fingerprint")
+        if fingerprint:
+            plan_cache.release_inflight(fingerprint, self.id)
+
+@celery_app.task(
+    bind=True,
+    name="generate_plan_task",
+    soft_time_limit=PLAN_SOFT_TIME_LIMIT,
+    time_limit=PLAN_TIME_LIMIT,
+    Request=PlanRequest,
+)
+def generate_plan_task(self, inputs: dict, fingerprint: str = None, refresh: bool = False, model_policy: str = None):
     """
     Background task that runs the CrewAI logic.
+    When submitted with a request fingerprint, the finished plan is cached and the
+    in-flight claim released so identical requests stop coalescing onto this task.
+    A refresh run skips the agent LLM cache, so it really produces a new plan.
+    model_policy overrides PLANNER_MODEL_POLICY for this run's agent model routing.
     """
+    telemetry = setup_telemetry(WORKER_SERVICE_NAME)
+    enqueued_at = _request_header(self.request, "enqueued_at")
+    queue_wait = max(0.0, time.time() - float(enqueued_at)) if enqueued_at else None
+    if queue_wait is not None:
+        telemetry.queue_wait.record(queue_wait)
+
+    progress = ProgressPublisher(redis_client, self.request.id)
+    progress.publish("started")
+    start = time.perf_counter()
+    status = "failed"
+    # Continue the trace started by POST /plan so API and worker spans line up.
+    with telemetry.tracer.start_as_current_span(
+        "plan generate",
+        context=extract_context(self.request.headers),
+        attributes={"task_id": self.request.id, "queue_wait_s": queue_wait or 0.0},
+    ) as span:
+        try:
+            with bypassed(refresh), routing_policy(model_policy):
+                result = _run_crew(self, inputs, progress)
+            print(f"[Worker] Model routing: {get_model_router().stats()}")
+            if fingerprint and is_cacheable(result):
+                plan_cache.set_result(fingerprint, result)
+            if isinstance(result, dict) and result.get("status") == "failed":
+                progress.publish("failed", error=result.get("error"))
+            else:
+                status = "completed"
+                progress.publish("completed", plan=result)
+            return result
+        finally:
+            span.set_attribute("status", status)
+            telemetry.plan_duration.record(time.perf_counter() - start, {"status": status})
+            if fingerprint:
+                plan_cache.release_inflight(fingerprint, self.request.id)
+
+@celery_app.task(
+    name="warm_batch_task",
+    soft_time_limit=BATCH_WARM_TIMEOUT + 30,
+    time_limit=BATCH_WARM_TIMEOUT + 60,
+)
+def warm_batch_task(inputs_list: list) -> dict:
+    """
+    First link of a /plan/batch chain: fetch the upstream data its members share
+    (destination geocodes, hotel candidate lists, flight legs) once, into the shared
+    response cache, so the member crews that follow read it instead of refetching.
+    Never raises: a failed warm-up must not stop the member plans from running.
+    """
+    start = time.perf_counter()
+    try:
+        unique = {}
+        for inputs in inputs_list:
+            key = tuple(
+                " ".join(str(inputs.get(k, "")).split()).lower()
+                for k in ("source", "destination", "start_date", "end_date", "num_travelers", "currency")
+            )
+            unique.setdefault(key, inputs)
+        futures = [f for inputs in unique.values() for f in prefetch_upstream(inputs)]
+        done, pending = wait(futures, timeout=BATCH_WARM_TIMEOUT)
+        report = {
+            "members": len(inputs_list),
+            "unique_trips": len(unique),
+            "fetches": len(futures),
+            "timed_out": len(pending),
+            "elapsed_s": round(time.perf_counter() - start, 2),
+        }
+    except Exception as e:
+        report = {"error": str(e), "elapsed_s": round(time.perf_counter() - start, 2)}
+    print(f"[Worker] Batch warm-up: {report}")
+    return report
+
+@celery_app.task(bind=True, name="loadtest_probe_task")
+def loadtest_probe_task(self, seconds: float) -> dict:
+    """Stand-in for a plan run (loadtest.py): reports its queue wait, then holds the slot."""
+    enqueued_at = _request_header(self.request, "enqueued_at")
+    queue_wait = max(0.0, time.time() - float(enqueued_at)) if enqueued_at else None
+    time.sleep(seconds)
+    return {"queue": (self.request.delivery_info or {}).get("routing_key"), "queue_wait_s": queue_wait}
+
+def _request_header(request, name: str):
+    """Custom apply_async header; Celery exposes these as request attributes and in request.headers."""
+    value = getattr(request, name, None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get(name)
+    return value
+
+def _step_payload(output) -> object:
+    """JSON-friendly body of a TaskOutput for progress events."""
+    if getattr(output, "pydantic", None) is not None:
+        return output.pydantic.model_dump(mode='json')
+    return output.raw
+
+def _attach_progress(crew_instance, progress: ProgressPublisher):
+    """Publish each finished step, including the initial plan injected before kickoff."""
+    def on_task_done(output):
+        progress.step(output.name or "step", _step_payload(output))
+
+    def on_kickoff(inputs):
+        planning_task = find_task(crew_instance, "i_planning_task")
+        if planning_task is not None and planning_task.output is not None:
+            on_task_done(planning_task.output)
+        return inputs
+
+    crew_instance.task_callback = on_task_done
+    crew_instance.before_kickoff_callbacks.append(on_kickoff)
+
+def _run_crew(self, inputs: dict, progress: ProgressPublisher) -> dict:
     try:
         print(f"[Worker] Starting task {self.request.id} with inputs: {inputs}")
         
-        # Initialize the Crew
-        planner = AgenticTravelPlanner()
-        crew_instance = planner.crew()
+        # Clone a per-run crew from the process-wide template
+        planner = get_planner()
+        start = time.perf_counter()
+        crew_instance = planner.fresh_crew()
+        clone_ms = (time.perf_counter() - start) * 1000
+        _overhead["runs"] += 1
+        _overhead["clone_ms_total"] += clone_ms
+        print(f"[Worker] Crew ready in {clone_ms:.0f} ms; overhead: {crew_overhead_report()}")
+        _attach_progress(crew_instance, progress)
         
         # Run the Crew (Blocking call: 60-90 seconds)
         result = crew_instance.kickoff(inputs=inputs)
@@ -48,6 +309,10 @@ def generate_plan_task(self, inputs: dict):
         # Fallback to raw string
         print(f"[Worker] Task {self.request.id} completed (Raw).")
         return {"raw_output": result.raw}
+
+    except SoftTimeLimitExceeded:
+        print(f"[Worker] Task {self.request.id} hit the {PLAN_SOFT_TIME_LIMIT}s soft time limit")
+        return {"status": "failed", "error": f"Plan generation exceeded {PLAN_SOFT_TIME_LIMIT}s"}
         
     except Exception as e:
         print(f"[Worker] Task {self.request.id} FAILED: {str(e)}")
@@ -10,6 +10,16 @@ interface PollResponse {
   error?: string;
 }
 
+// Events pushed by /plan/stream/{task_id} as each crew step finishes
+export interface PlanProgressEvent {
+  event: 'queued' | 'started' | 'step' | 'completed' | 'failed';
+  task_id: string;
+  step?: string;
+  output?: unknown;
+  plan?: TripPlan;
+  error?: string;
+}
+
 // Set this to true to use fake data and avoid API calls
 const USE_MOCK = false;
 
@@ -103,7 +113,72 @@ const MOCK_TRIP_PLAN: TripPlan = {
   }
 };
 
-export const generateItinerary = async (request: TripRequest): Promise<TripPlan> => {
+// Fallback for environments where the SSE stream is unavailable
+const pollForPlan = (task_id: string): Promise<TripPlan> =>
+  new Promise((resolve, reject) => {
+    const interval = setInterval(async () => {
+      try {
+        const statusRes = await fetch(`${API_URL}/plan/status/${task_id}`);
+        if (!statusRes.ok) return;
+
+        const data: PollResponse = await statusRes.json();
+        console.log(`Polling status: ${data.status}`);
+
+        if (data.status === 'completed' && data.plan) {
+          clearInterval(interval);
+
+          const finalPlan = data.plan;
+          resolve(finalPlan);
+        }
+        else if (data.status === 'failed') {
+          clearInterval(interval);
+          reject(new Error(data.error || "Agents failed to generate plan"));
+        }
+      } catch (e) {
+        console.warn("Polling error...", e);
+      }
+    }, 5000);
+  });
+
+const streamPlan = (
+  task_id: string,
+  onProgress?: (event: PlanProgressEvent) => void
+): Promise<TripPlan> =>
+  new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_URL}/plan/stream/${task_id}`);
+    let settled = false;
+
+    const handle = (message: MessageEvent) => {
+      const event: PlanProgressEvent = JSON.parse(message.data);
+      onProgress?.(event);
+
+      if (event.event === 'completed' && event.plan) {
+        settled = true;
+        source.close();
+        resolve(event.plan);
+      } else if (event.event === 'failed') {
+        settled = true;
+        source.close();
+        reject(new Error(event.error || "Agents failed to generate plan"));
+      }
+    };
+
+    ['queued', 'started', 'step', 'completed', 'failed'].forEach((name) =>
+      source.addEventListener(name, handle as EventListener)
+    );
+
+    source.onerror = () => {
+      if (settled) return;
+      console.warn("Progress stream unavailable, falling back to polling");
+      source.close();
+      pollForPlan(task_id).then(resolve, reject);
+    };
+  });
+
+export const generateItinerary = async (
+  request: TripRequest,
+  onProgress?: (event: PlanProgressEvent) => void
+): Promise<TripPlan> => {
   if (USE_MOCK) {
     console.log("⚠️ USING MOCK DATA - NO API CALLS MADE ⚠️");
     // Simulate network delay
@@ -137,34 +212,17 @@ export const generateItinerary = async (request: TripRequest): Promise<TripPlan>
       throw new Error(`Failed to start planning: ${startRes.statusText}`);
     }
 
-    const { task_id } = await startRes.json();
+    const started: PollResponse = await startRes.json();
+    const { task_id } = started;
     console.log(`✅ Task Started: ${task_id}`);
 
-    // 2. Poll for Results
-    return new Promise((resolve, reject) => {
-      const interval = setInterval(async () => {
-        try {
-          const statusRes = await fetch(`${API_URL}/plan/status/${task_id}`);
-          if (!statusRes.ok) return;
-
-          const data: PollResponse = await statusRes.json();
-          console.log(`Polling status: ${data.status}`);
-
-          if (data.status === 'completed' && data.plan) {
-            clearInterval(interval);
-
-            const finalPlan = data.plan;
-            resolve(finalPlan);
-          }
-          else if (data.status === 'failed') {
-            clearInterval(interval);
-            reject(new Error(data.error || "Agents failed to generate plan"));
-          }
-        } catch (e) {
-          console.warn("Polling error...", e);
-        }
-      }, 5000);
-    });
+    // Identical trips are served straight from the backend's plan cache
+    if (started.status === 'completed' && started.plan) {
+      return started.plan;
+    }
+
+    // 2. Stream progress (falls back to polling if the stream fails)
+    return await streamPlan(task_id, onProgress);
 
   } catch (error) {
     console.error("API Service Error:", error);